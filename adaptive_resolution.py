@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Adaptive input resolution for the realtime loop
+ResolutionController moves the YOLO imgsz between candidate sizes to hold a target
+FPS. The offline tool measures latency and agreement per resolution on a video so
+the candidate list can be chosen from our own footage.
+
+Usage: python adaptive_resolution.py <video_path> [model_path] [sizes, e.g. 320,416,512,640] [max_frames]
+"""
+
+from detection_results import DetectionResult, match_detections
+import time
+import csv
+import sys
+import os
+
+DEFAULT_SIZES = (320, 416, 512, 640)
+
+
+class ResolutionController:
+    """
+    Picks the input size for the next frame from measured frame times
+
+    Hysteresis comes from three places: a dead band of +/- `margin` around
+    the frame-time budget, asymmetric patience (stepping down reacts within
+    a few slow frames, stepping up needs a long run of fast ones) and a
+    cooldown after every change while the new size settles.
+    """
+
+    def __init__(self, target_fps=15.0, sizes=DEFAULT_SIZES, start_size=None, margin=0.15,
+                 down_patience=5, up_patience=45, cooldown=30, alpha=0.2):
+        self.sizes = sorted(sizes)
+        self.budget = 1.0 / target_fps
+        self.target_fps = target_fps
+        self.margin = margin
+        self.down_patience = down_patience
+        self.up_patience = up_patience
+        self.cooldown = cooldown
+        self.alpha = alpha
+
+        start_size = start_size if start_size in self.sizes else self.sizes[-1]
+        self._index = self.sizes.index(start_size)
+        self._ema = None
+        self._slow = 0
+        self._fast = 0
+        self._settle = 0
+        self._frames = 0
+        self._start = time.time()
+        # (seconds since start, frame number, imgsz, smoothed fps) for every change
+        self.log = [(0.0, 0, self.imgsz, None)]
+
+    @property
+    def imgsz(self):
+        return self.sizes[self._index]
+
+    @property
+    def fps(self):
+        return 1.0 / self._ema if self._ema else None
+
+    def update(self, frame_time):
+        """
+        Feed the wall time of the last frame; returns the imgsz for the next one
+        """
+        self._frames += 1
+        self._ema = frame_time if self._ema is None else (1 - self.alpha) * self._ema + self.alpha * frame_time
+
+        if self._settle > 0:
+            self._settle -= 1
+            return self.imgsz
+
+        if self._ema > self.budget * (1 + self.margin):
+            self._slow += 1
+            self._fast = 0
+        elif self._index + 1 < len(self.sizes):
+            # Only step up if the next size should still fit inside the band;
+            # inference cost grows roughly with pixel count
+            ratio = (self.sizes[self._index + 1] / self.imgsz) ** 2
+            if self._ema * ratio < self.budget * (1 - self.margin):
+                self._fast += 1
+            else:
+                self._fast = 0
+            self._slow = 0
+        else:
+            self._slow = self._fast = 0
+
+        if self._slow >= self.down_patience and self._index > 0:
+            self._change(-1)
+        elif self._fast >= self.up_patience:
+            self._change(+1)
+        return self.imgsz
+
+    def _change(self, step):
+        old = self.imgsz
+        self._index += step
+        # Re-seed the estimate at the new size so the band test is meaningful
+        self._ema *= (self.imgsz / old) ** 2
+        self._slow = self._fast = 0
+        self._settle = self.cooldown
+        self.log.append((time.time() - self._start, self._frames, self.imgsz, self.fps))
+        print(f"🎚️  imgsz {old} → {self.imgsz} (≈{1.0 / self._ema:.1f} FPS, target {self.target_fps})")
+
+    def save_log(self, path="results/resolution_log.csv"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['seconds', 'frame', 'imgsz', 'fps'])
+            for seconds, frame, imgsz, fps in self.log:
+                writer.writerow([f"{seconds:.2f}", frame, imgsz, f"{fps:.2f}" if fps else ""])
+        return path
+
+
+def measure_resolution_curve(video_path, model_path='yolov8n.pt', sizes=DEFAULT_SIZES,
+                             max_frames=200, stride=5, confidence=0.25):
+    """
+    Latency and accuracy per input size on sampled frames of a video
+
+    Accuracy is measured as agreement with the largest size: precision and
+    recall of each size's detections against the largest size's detections
+    (same class, IoU >= 0.5).
+
+    Args:
+        video_path (str): Video to sample frames from
+        model_path (str): Path to the YOLO model file
+        sizes (tuple): Input sizes to compare
+        max_frames (int): Number of frames to evaluate
+        stride (int): Use every `stride`-th frame
+        confidence (float): Minimum confidence for detections
+
+    Returns:
+        list: One dict per size with ms/frame, FPS, precision and recall
+    """
+    import cv2
+    from model_loader import load_model
+
+    print("📏 Resolution vs. Latency/Accuracy")
+    print("=" * 40)
+    print(f"🎬 Video: {video_path}")
+    print(f"🤖 Model: {model_path}")
+    print(f"📐 Sizes: {', '.join(str(s) for s in sizes)}")
+    print("=" * 40)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"❌ Error: Could not open video file: {video_path}")
+        return []
+    frames = []
+    index = 0
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % stride == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    if not frames:
+        print(f"❌ Error: No frames could be read from {video_path}")
+        return []
+    print(f"📸 Sampled {len(frames)} frames")
+
+    sizes = sorted(sizes)
+    model = load_model(model_path, imgsz=sizes[-1], optimize=False)  # runs every size in `sizes`
+    per_size = {}
+    timings = {}
+    for imgsz in sizes:
+        model(frames[0], imgsz=imgsz, verbose=False)  # warm this shape up
+        detections = []
+        start = time.perf_counter()
+        for frame in frames:
+            results = model(frame, imgsz=imgsz, conf=confidence, verbose=False)
+            detections.append(DetectionResult.from_ultralytics(results[0], model.names))
+        timings[imgsz] = (time.perf_counter() - start) / max(1, len(frames))
+        per_size[imgsz] = detections
+
+    reference = per_size[sizes[-1]]
+    report = []
+    print(f"{'imgsz':>6} {'ms':>8} {'FPS':>7} {'precision':>10} {'recall':>8}")
+    for imgsz in sizes:
+        tp = sum(match_detections(p, r) for p, r in zip(per_size[imgsz], reference))
+        n_pred = sum(len(p) for p in per_size[imgsz])
+        n_ref = sum(len(r) for r in reference)
+        row = {
+            'imgsz': imgsz,
+            'ms': timings[imgsz] * 1000,
+            'fps': 1.0 / timings[imgsz] if timings[imgsz] else 0.0,
+            'precision': tp / n_pred if n_pred else 1.0,
+            'recall': tp / n_ref if n_ref else 1.0,
+        }
+        report.append(row)
+        print(f"{imgsz:>6} {row['ms']:>8.1f} {row['fps']:>7.1f} {row['precision']:>10.3f} {row['recall']:>8.3f}")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python adaptive_resolution.py <video_path> [model_path] [sizes] [max_frames]")
+        sys.exit(1)
+
+    video_path = sys.argv[1]
+    model_path = sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt'
+    sizes = tuple(int(s) for s in sys.argv[3].split(',')) if len(sys.argv) > 3 else DEFAULT_SIZES
+    max_frames = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    measure_resolution_curve(video_path, model_path, sizes, max_frames)
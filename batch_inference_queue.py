@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Deadline-aware micro-batching queue for YOLO inference
+Coalesces concurrent single-image requests into one batched forward pass.
+Usage: python batch_inference_queue.py [model_path] [max_batch_size] [max_wait_ms] [rate] [requests]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import asyncio
+import random
+import time
+import sys
+
+
+class MicroBatcher:
+    """
+    Async request queue in front of a YOLO model.
+
+    Requests are collected until either `max_batch_size` images are waiting or
+    the oldest request has waited `max_wait_ms`. A request may also carry its
+    own deadline; the batch is then flushed early enough for the estimated
+    forward-pass time to still fit before it.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10, confidence=0.5, imgsz=640):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.confidence = confidence
+        self.imgsz = imgsz
+
+        self._queue = None
+        self._worker = None
+        self._executor = None
+        self._batch_latency = None  # EMA of forward-pass time (seconds)
+
+        self.stats = {'requests': 0, 'batches': 0, 'images': 0, 'deadline_misses': 0}
+
+    async def start(self):
+        """Start the background batching task (must be called inside a running loop)"""
+        if self._worker is None:
+            # A single inference thread: the model is never called concurrently
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-batch")
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._batch_loop())
+        return self
+
+    async def stop(self):
+        """
+        Cancel the batching task and release the inference thread
+
+        Requests still waiting (queued, or in the batch being collected) fail
+        with RuntimeError instead of waiting forever. The batcher can be
+        started again afterwards.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            stopped = RuntimeError("MicroBatcher stopped before the request was served")
+            while not self._queue.empty():
+                _, future, _, _ = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(stopped)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def submit(self, image, deadline_ms=None):
+        """
+        Queue one image and wait for its detection result
+
+        Args:
+            image (np.ndarray): BGR image
+            deadline_ms (float): Optional latency budget for this request
+
+        Returns:
+            ultralytics Results object for the image
+        """
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher is not running (call start() first)")
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        deadline = now + deadline_ms / 1000.0 if deadline_ms is not None else None
+        future = loop.create_future()
+        self.stats['requests'] += 1
+        await self._queue.put((image, future, now, deadline))
+        return await future
+
+    def _flush_time(self, batch):
+        """Latest moment the current batch may be held before running"""
+        flush_at = batch[0][2] + self.max_wait
+        deadlines = [item[3] for item in batch if item[3] is not None]
+        if deadlines:
+            expected = self._batch_latency or 0.0
+            flush_at = min(flush_at, min(deadlines) - expected)
+        return flush_at
+
+    async def _batch_loop(self):
+        batch = []
+        try:
+            await self._collect_and_run(batch)
+        except asyncio.CancelledError:
+            # Fail the batch being collected or run; stop() fails the still-queued ones
+            stopped = RuntimeError("MicroBatcher stopped before the request was served")
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(stopped)
+            raise
+
+    async def _collect_and_run(self, batch):
+        """Batching loop; `batch` is filled in place so a cancelled loop can fail it"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch.clear()
+            batch.append(await self._queue.get())
+
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = self._flush_time(batch) - time.perf_counter()
+                if remaining <= 0 or not await self._next_within(batch, remaining):
+                    break
+
+            images = [item[0] for item in batch]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self._predict, images)
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            elapsed = time.perf_counter() - start
+            self._batch_latency = elapsed if self._batch_latency is None else 0.8 * self._batch_latency + 0.2 * elapsed
+            self.stats['batches'] += 1
+            self.stats['images'] += len(images)
+
+            done = time.perf_counter()
+            for (_, future, _, deadline), result in zip(batch, results):
+                if deadline is not None and done > deadline:
+                    self.stats['deadline_misses'] += 1
+                if not future.done():
+                    future.set_result(result)
+
+    async def _next_within(self, batch, timeout):
+        """
+        Move the next request into `batch` if one arrives within `timeout`
+
+        Unlike asyncio.wait_for(queue.get()), which can drop a request that
+        arrives as the timeout expires, a get() that has not finished when
+        it is cancelled has not taken anything off the queue.
+
+        Returns:
+            bool: True if a request was added
+        """
+        getter = asyncio.ensure_future(self._queue.get())
+        try:
+            await asyncio.wait({getter}, timeout=timeout)
+        finally:
+            if not getter.done():
+                getter.cancel()
+            elif not getter.cancelled():
+                # Also when this task is being cancelled: the batch is then failed, not lost
+                batch.append(getter.result())
+        return getter.done() and not getter.cancelled()
+
+    def _predict(self, images):
+        return self.model(images, conf=self.confidence, imgsz=self.imgsz, verbose=False)
+
+    @property
+    def mean_batch_size(self):
+        return self.stats['images'] / self.stats['batches'] if self.stats['batches'] else 0.0
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+async def _load_test(model, images, rate, n_requests, max_batch_size, max_wait_ms, deadline_ms, seed):
+    rng = random.Random(seed)
+    latencies = []
+
+    async def one_request(image):
+        start = time.perf_counter()
+        await batcher.submit(image, deadline_ms=deadline_ms)
+        latencies.append(time.perf_counter() - start)
+
+    async with MicroBatcher(model, max_batch_size, max_wait_ms) as batcher:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(n_requests):
+            tasks.append(asyncio.create_task(one_request(images[i % len(images)])))
+            # Open-loop Poisson arrivals, independent of how fast we answer
+            await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+        total = time.perf_counter() - start
+
+    return {
+        'max_batch_size': max_batch_size,
+        'max_wait_ms': max_wait_ms,
+        'throughput': n_requests / total,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'mean_batch': batcher.mean_batch_size,
+        'deadline_misses': batcher.stats['deadline_misses'],
+    }
+
+
+def run_load_test(model_path='yolov8n.pt', rate=50.0, n_requests=200, max_batch_size=8,
+                  max_wait_ms=10, deadline_ms=None, image_size=(480, 640), seed=0):
+    """
+    Measure throughput vs. p99 latency under a synthetic request load
+
+    Args:
+        model_path (str): Path to the YOLO model file
+        rate (float): Mean arrival rate in requests per second
+        n_requests (int): Number of requests to send per configuration
+        max_batch_size (int): Largest batch the queue may form
+        max_wait_ms (float): Longest time a request waits for companions
+        deadline_ms (float): Optional per-request latency budget
+        image_size (tuple): (height, width) of the synthetic images
+        seed (int): Seed for arrivals and image content
+
+    Returns:
+        list: One stats dict per configuration (unbatched baseline first)
+    """
+    from ultralytics import YOLO
+
+    print("📈 Micro-batching Load Test")
+    print("=" * 40)
+    print(f"🤖 Model: {model_path}")
+    print(f"🚦 Rate: {rate} req/s, {n_requests} requests")
+    print("=" * 40)
+
+    model = YOLO(model_path)
+    rs = np.random.RandomState(seed)
+    h, w = image_size
+    images = [rs.randint(0, 255, (h, w, 3), dtype=np.uint8) for _ in range(8)]
+
+    # Warm up once so the first configuration does not pay model setup
+    model(images[0], verbose=False)
+
+    configs = [(1, 0), (max_batch_size, max_wait_ms)]
+    reports = []
+    for batch_size, wait_ms in configs:
+        report = asyncio.run(_load_test(model, images, rate, n_requests, batch_size, wait_ms, deadline_ms, seed))
+        reports.append(report)
+
+    print(f"{'batch':>6} {'wait ms':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'avg bs':>7} {'missed':>7}")
+    for r in reports:
+        print(f"{r['max_batch_size']:>6} {r['max_wait_ms']:>8} {r['throughput']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['mean_batch']:>7.2f} {r['deadline_misses']:>7}")
+    return reports
+
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'yolov8n.pt'
+    max_batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    max_wait_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    rate = float(sys.argv[4]) if len(sys.argv) > 4 else 50.0
+    n_requests = int(sys.argv[5]) if len(sys.argv) > 5 else 200
+    run_load_test(model_path, rate, n_requests, max_batch_size, max_wait_ms)
@@ -1,11 +1,17 @@
-from ultralytics import YOLO
+from detection_daemon import detect, use_daemon
+from image_source import source_options
+from fast_image_loader import full_resolution
+from output_writer import OutputWriter, output_options
+from remote_io import ImageFetcher, open_image_source
 import cv2
 import numpy as np
+import sys
 import os
 import time
 from pathlib import Path
 
-def detect_objects_in_image(image_path, model_path='yolov8n.pt', confidence_threshold=0.5, save_results=True):
+def detect_objects_in_image(image_path, model_path='yolov8n.pt', confidence_threshold=0.5, save_results=True,
+                            writer=None, preloaded=None):
     """
     Detect objects in a single image using YOLO
     
@@ -14,6 +20,10 @@ def detect_objects_in_image(image_path, model_path='yolov8n.pt', confidence_thre
         model_path (str): Path to the YOLO model file
         confidence_threshold (float): Minimum confidence for detections
         save_results (bool): Whether to save the result image
+        writer (OutputWriter): Batch output; results are queued to it instead of
+                               written and displayed inline (see output_writer.py)
+        preloaded (Preloaded): Image already fetched and decoded for inference,
+                               e.g. from a remote source (see remote_io.py)
     
     Returns:
         list: List of detected objects with their properties
@@ -27,92 +37,74 @@ def detect_objects_in_image(image_path, model_path='yolov8n.pt', confidence_thre
     print("=" * 40)
     
     try:
-        # Load YOLO model
-        print("🔍 Loading YOLO model...")
-        model = YOLO(model_path)
-        print("✅ Model loaded successfully!")
-        
         # Check if image exists
-        if not os.path.exists(image_path):
+        if preloaded is None and not os.path.exists(image_path):
             print(f"❌ Error: Image not found at {image_path}")
             return []
         
-        # Load image
-        print("📸 Loading image...")
-        image = cv2.imread(image_path)
-        if image is None:
-            print(f"❌ Error: Could not load image from {image_path}")
-            return []
-        
-        print(f"✅ Image loaded! Size: {image.shape[1]}x{image.shape[0]}")
-        
-        # Run inference
+        # Run inference (on the warm daemon when it is running); the image is
+        # decoded at the smallest scale the model can use, boxes come back in
+        # original-image pixels
         print("🔍 Running YOLO inference...")
         start_time = time.time()
         
-        results = model(image, conf=confidence_threshold, verbose=False)
+        detection = detect(image_path, preloaded, model_path, confidence_threshold)
+        if detection is None:
+            print(f"❌ Error: Could not load image from {image_path}")
+            return []
         
         inference_time = time.time() - start_time
         print(f"⚡ Inference completed in {inference_time:.3f} seconds")
         
-        # Process results
-        detections = []
-        annotated_image = image.copy()
+        detections = detection.to_dicts()
+        # Annotations are drawn at full resolution, decoded only when they are
+        # saved or shown; detections-only output skips the decode and drawing
+        annotated_image = None
+        if writer is None or (writer.images and save_results):
+            annotated_image = full_resolution(image_path, preloaded)
+            if annotated_image is None:
+                print(f"❌ Error: Could not load image from {image_path}")
+                return detections
+        
+        print(f"🎯 Found {len(detection)} objects:")
+        
+        for i, (x1, y1, x2, y2, conf, class_name) in enumerate(detection):
+            # Print detection info
+            bbox = detections[i]['bbox']
+            print(f"  {i+1}. {class_name}: {conf:.3f} at ({bbox['x1']},{bbox['y1']})-({bbox['x2']},{bbox['y2']})")
+            if annotated_image is None:
+                continue
+            
+            # Choose color based on class
+            if class_name in ['bus', 'car', 'truck']:
+                color = (0, 255, 0)  # Green for vehicles
+            elif class_name == 'person':
+                color = (0, 0, 255)  # Red for person
+            else:
+                color = (255, 0, 0)  # Blue for others
+            
+            # Draw bounding box
+            cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 2)
+            
+            # Create label
+            label = f"{class_name} {conf:.2f}"
+            
+            # Calculate text size
+            (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+            
+            # Draw label background
+            cv2.rectangle(annotated_image, (x1, y1 - text_height - 10), (x1 + text_width, y1), color, -1)
+            
+            # Draw label text
+            cv2.putText(annotated_image, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         
-        for result in results:
-            if result.boxes is not None:
-                boxes = result.boxes
-                
-                print(f"🎯 Found {len(boxes)} objects:")
-                
-                for i, box in enumerate(boxes):
-                    # Get coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    
-                    # Get confidence
-                    conf = float(box.conf[0].cpu().numpy())
-                    
-                    # Get class name
-                    class_id = int(box.cls[0].cpu().numpy())
-                    class_name = model.names[class_id]
-                    
-                    # Store detection info
-                    detection = {
-                        'class': class_name,
-                        'confidence': conf,
-                        'bbox': {
-                            'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
-                            'width': x2 - x1, 'height': y2 - y1
-                        }
-                    }
-                    detections.append(detection)
-                    
-                    # Print detection info
-                    print(f"  {i+1}. {class_name}: {conf:.3f} at ({x1},{y1})-({x2},{y2})")
-                    
-                    # Choose color based on class
-                    if class_name in ['bus', 'car', 'truck']:
-                        color = (0, 255, 0)  # Green for vehicles
-                    elif class_name == 'person':
-                        color = (0, 0, 255)  # Red for person
-                    else:
-                        color = (255, 0, 0)  # Blue for others
-                    
-                    # Draw bounding box
-                    cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 2)
-                    
-                    # Create label
-                    label = f"{class_name} {conf:.2f}"
-                    
-                    # Calculate text size
-                    (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                    
-                    # Draw label background
-                    cv2.rectangle(annotated_image, (x1, y1 - text_height - 10), (x1 + text_width, y1), color, -1)
-                    
-                    # Draw label text
-                    cv2.putText(annotated_image, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        if writer is not None:
+            writer.add_detections(image_path, detection)
+            if save_results and annotated_image is not None:
+                output_path = writer.submit_image(writer.path(f"{Path(image_path).stem}_detected.jpg"),
+                                                  annotated_image)
+                print(f"💾 Result queued for: {output_path}")
+            return detections
         
         # Save result if requested
         if save_results:
@@ -142,55 +134,69 @@ def detect_objects_in_image(image_path, model_path='yolov8n.pt', confidence_thre
         traceback.print_exc()
         return []
 
-def detect_multiple_images(image_folder, model_path='yolov8n.pt', confidence_threshold=0.5):
+def detect_multiple_images(image_folder, model_path='yolov8n.pt', confidence_threshold=0.5,
+                           recursive=True, shard=None, manifest_path=None, output=None, in_flight=16):
     """
     Detect objects in multiple images from a folder
     
     Args:
-        image_folder (str): Path to folder containing images
+        image_folder (str): Path to folder containing images, or an http(s)://
+                            or s3:// URI (see remote_io.py)
         model_path (str): Path to the YOLO model file
         confidence_threshold (float): Minimum confidence for detections
+        recursive (bool): Include images in subfolders
+        shard (str): Only process shard 'i/N' of the images (stable across machines)
+        manifest_path (str): Resume manifest; finished images are skipped on rerun
+        output (dict): OutputWriter options (mode, detections_format, quality,
+                       thumbnail, workers, output_dir); annotated images by default
+        in_flight (int): Images fetched and decoded ahead of the detector
     """
     
     print("📁 Batch Image Detection")
     print("=" * 40)
     print(f"📂 Folder: {image_folder}")
     print(f"🤖 Model: {model_path}")
+    if shard:
+        print(f"🧩 Shard: {shard}")
     print("=" * 40)
     
-    # Supported image extensions
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']
-    
-    # Find all images in folder
-    image_files = []
-    for ext in image_extensions:
-        image_files.extend(Path(image_folder).glob(f"*{ext}"))
-        image_files.extend(Path(image_folder).glob(f"*{ext.upper()}"))
+    # Images are streamed from a single directory walk (or bucket listing),
+    # fetched and decoded ahead of the detector; encoding and writing happen
+    # on background writer threads
+    total_detections = 0
+    with open_image_source(image_folder, recursive, shard, manifest_path) as source, \
+            OutputWriter(**{'output_dir': "results/detect", 'shard': shard, 'source': source,
+                            **(output or {})}) as writer, \
+            ImageFetcher(in_flight) as fetcher:
+        # A running daemon reads local files itself: do not decode them here too
+        for i, (image_path, preloaded) in enumerate(fetcher.prefetch(source, decode_local=not use_daemon())):
+            print(f"\n🔄 Processing {i+1}: {source.relative(image_path)}")
+            if preloaded is None:
+                writer.commit(image_path, failed=True)
+                continue
+            
+            detections = detect_objects_in_image(
+                image_path, 
+                model_path, 
+                confidence_threshold, 
+                save_results=True,
+                writer=writer,
+                preloaded=preloaded
+            )
+            
+            total_detections += len(detections)
+            print(f"✅ Found {len(detections)} objects")
+            # The manifest advances once the writer has written this image's output
+            writer.commit(image_path)
     
-    if not image_files:
-        print(f"❌ No images found in {image_folder}")
+    if not source.yielded:
+        print(f"❌ No images to process in {image_folder} ({source.describe()})")
         return
     
-    print(f"📸 Found {len(image_files)} images")
-    
-    # Process each image
-    total_detections = 0
-    for i, image_path in enumerate(image_files):
-        print(f"\n🔄 Processing {i+1}/{len(image_files)}: {image_path.name}")
-        
-        detections = detect_objects_in_image(
-            str(image_path), 
-            model_path, 
-            confidence_threshold, 
-            save_results=True
-        )
-        
-        total_detections += len(detections)
-        print(f"✅ Found {len(detections)} objects")
-    
     print(f"\n📊 Batch Processing Complete!")
-    print(f"Total images processed: {len(image_files)}")
+    print(f"Total images processed: {source.describe()}")
     print(f"Total objects detected: {total_detections}")
+    print(f"Output: {writer.describe()}")
 
 def main():
     """
@@ -268,5 +274,20 @@ def main():
             print("❌ Invalid choice. Please enter 1, 2, 3, or 4.")
 
 if __name__ == "__main__":
-    main()
+    # Non-interactive batch mode for scripted/sharded runs:
+    #   python bus_detection.py --batch <folder> [model_path] [confidence] [--shard i/N] [--manifest path] [--no-recursive]
+    #                           [--output images|detections|both] [--format jsonl|npz] [--quality N] [--thumbnail N]
+    #                           [--dest <dir|uri>]    (<folder> may be an http(s):// or s3:// URI)
+    args, options = source_options(sys.argv[1:])
+    args, output = output_options(args)
+    if args and args[0] == "--batch" and len(args) > 1:
+        detect_multiple_images(
+            args[1],
+            args[2] if len(args) > 2 else 'yolov8n.pt',
+            float(args[3]) if len(args) > 3 else 0.5,
+            output=output,
+            **options
+        )
+    else:
+        main()
 
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Two-stage detection cascade
+yolov8n screens every frame; only candidates with uncertain scores (or classes
+that must always be confirmed) are sent, batched, to yolov8x. Results are merged
+into one detection set per frame and the escalation rate is reported.
+
+Usage: python cascade_detection.py <video_path> [small_model] [large_model] [crop|frame] [max_frames]
+"""
+
+from model_loader import load_model
+from detection_results import DetectionResult, box_iou, concat_detections, nms
+import numpy as np
+import time
+import sys
+
+
+class CascadeDetector:
+    """
+    Small model everywhere, large model only where it is needed
+
+    Args:
+        small_model (str): Screening model, run on every frame
+        large_model (str): Confirmation model
+        band (tuple): (low, high) small-model score band treated as uncertain;
+                      candidates below `low` are discarded, at or above `high`
+                      they are accepted without confirmation
+        classes (tuple): Class names the band applies to (None = all classes)
+        always_confirm (tuple): Class names confirmed by the large model at any score
+        mode (str): 'crop' sends padded crops around candidates,
+                    'frame' sends whole frames that contain a candidate
+        confidence (float): Final confidence threshold for reported detections
+        crop_padding (float): Padding around a candidate, relative to its size
+        min_crop (int): Minimum crop side in pixels
+        batch_size (int): Images per large-model forward pass
+    """
+
+    def __init__(self, small_model='yolov8n.pt', large_model='yolov8x.pt', band=(0.1, 0.6),
+                 classes=('bus', 'truck'), always_confirm=(), mode='crop', confidence=0.5,
+                 crop_padding=0.25, min_crop=160, batch_size=8, match_iou=0.3):
+        if mode not in ('crop', 'frame'):
+            raise ValueError(f"Unknown cascade mode: {mode}")
+        # Batched frames and crops of any size: the fixed-shape optimized graph does not fit
+        self.small = load_model(small_model, optimize=False)
+        self.large = load_model(large_model, optimize=False)
+        self.names = self.small.names
+        self.band = band
+        self.classes = set(classes) if classes else None
+        self.always_confirm = set(always_confirm)
+        self.mode = mode
+        self.confidence = confidence
+        self.crop_padding = crop_padding
+        self.min_crop = min_crop
+        self.batch_size = batch_size
+        self.match_iou = match_iou
+
+        self.stats = {'frames': 0, 'candidates': 0, 'escalated': 0, 'escalated_frames': 0,
+                      'large_images': 0, 'small_s': 0.0, 'large_s': 0.0}
+
+    def _escalation_mask(self, detection):
+        low, high = self.band
+        scores = detection.scores
+        names = np.array([self.names[int(c)] for c in detection.class_ids], dtype=object)
+        in_scope = np.ones(len(detection), dtype=bool) if self.classes is None \
+            else np.isin(names, list(self.classes))
+        uncertain = in_scope & (scores >= low) & (scores < high)
+        forced = np.isin(names, list(self.always_confirm)) & (scores >= low)
+        return uncertain | forced
+
+    def _crop_box(self, box, shape):
+        h, w = shape[:2]
+        x1, y1, x2, y2 = box
+        bw, bh = x2 - x1, y2 - y1
+        side_w = max(bw * (1 + 2 * self.crop_padding), self.min_crop)
+        side_h = max(bh * (1 + 2 * self.crop_padding), self.min_crop)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        cx1 = int(max(0, cx - side_w / 2))
+        cy1 = int(max(0, cy - side_h / 2))
+        cx2 = int(min(w, cx + side_w / 2))
+        cy2 = int(min(h, cy + side_h / 2))
+        return cx1, cy1, cx2, cy2
+
+    def _run_large(self, images):
+        """Large model over a list of images, in batches"""
+        outputs = []
+        start = time.perf_counter()
+        for i in range(0, len(images), self.batch_size):
+            results = self.large(images[i:i + self.batch_size], conf=self.confidence, verbose=False)
+            outputs.extend(DetectionResult.from_ultralytics(r, self.large.names) for r in results)
+        self.stats['large_s'] += time.perf_counter() - start
+        self.stats['large_images'] += len(images)
+        return outputs
+
+    def detect_batch(self, frames):
+        """
+        Run the cascade on a list of frames
+
+        Returns:
+            list: One merged DetectionResult per frame
+        """
+        start = time.perf_counter()
+        results = self.small(frames, conf=self.band[0], verbose=False)
+        self.stats['small_s'] += time.perf_counter() - start
+        screened = [DetectionResult.from_ultralytics(r, self.names) for r in results]
+        self.stats['frames'] += len(frames)
+
+        escalate = [self._escalation_mask(d) for d in screened]
+        for detection, mask in zip(screened, escalate):
+            self.stats['candidates'] += len(detection)
+            self.stats['escalated'] += int(mask.sum())
+            self.stats['escalated_frames'] += int(mask.any())
+
+        # Confident small-model detections are kept as they are
+        kept = [d.select(~mask & (d.scores >= self.confidence)) for d, mask in zip(screened, escalate)]
+
+        if self.mode == 'frame':
+            frame_ids = [i for i, mask in enumerate(escalate) if mask.any()]
+            confirmed = self._run_large([frames[i] for i in frame_ids])
+            for i, detection in zip(frame_ids, confirmed):
+                # The large model sees the whole frame: its result replaces the screen
+                kept[i] = detection
+            return kept
+
+        crops, owners = [], []
+        for i, (detection, mask) in enumerate(zip(screened, escalate)):
+            for box in detection.boxes[mask]:
+                x1, y1, x2, y2 = self._crop_box(box, frames[i].shape)
+                crops.append(frames[i][y1:y2, x1:x2])
+                owners.append((i, box, (x1, y1)))
+
+        merged = [[d] for d in kept]
+        for (i, box, (ox, oy)), detection in zip(owners, self._run_large(crops)):
+            if len(detection) == 0:
+                continue  # the large model rejected the candidate
+            boxes = detection.boxes + np.array([ox, oy, ox, oy], dtype=np.float32)
+            # The candidate is confirmed by the best-overlapping large-model box,
+            # which also supplies the class and score
+            iou = box_iou(box[None], boxes)[0]
+            best = int(np.argmax(iou))
+            if iou[best] < self.match_iou:
+                continue
+            merged[i].append(DetectionResult(boxes[best:best + 1], detection.scores[best:best + 1],
+                                             detection.class_ids[best:best + 1], self.names))
+
+        return [nms(concat_detections(parts, self.names, frames[i].shape[:2]))
+                for i, parts in enumerate(merged)]
+
+    def report(self):
+        s = self.stats
+        frames = max(1, s['frames'])
+        print(f"\n📊 Cascade ({self.mode} mode, band {self.band[0]:.2f}-{self.band[1]:.2f}):")
+        print(f"Frames: {s['frames']}")
+        print(f"Candidates escalated: {s['escalated']}/{s['candidates']} "
+              f"({s['escalated'] / max(1, s['candidates']):.1%})")
+        print(f"Frames escalated: {s['escalated_frames']}/{s['frames']} ({s['escalated_frames'] / frames:.1%})")
+        print(f"Large-model images: {s['large_images']}")
+        print(f"Time: small {s['small_s'] / frames * 1000:.1f} ms/frame, "
+              f"large {s['large_s'] / frames * 1000:.1f} ms/frame")
+
+
+def iter_frame_batches(cap, batch_size=8, max_frames=None):
+    """Yield lists of consecutive frames read from an opened cv2.VideoCapture"""
+    batch = []
+    count = 0
+    while max_frames is None or count < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        batch.append(frame)
+        count += 1
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def compare_with_large(video_path, small_model='yolov8n.pt', large_model='yolov8x.pt', mode='crop',
+                       max_frames=300, classes=('bus', 'truck')):
+    """
+    Run the cascade and the large model alone on the same frames and compare
+
+    Agreement is precision/recall of the cascade's bus/truck detections
+    against yolov8x's, plus the cost of both.
+    """
+    import cv2
+    from detection_results import match_detections
+
+    cascade = CascadeDetector(small_model, large_model, mode=mode, classes=classes)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"❌ Error: Could not open video file: {video_path}")
+        return None
+
+    tp = n_cascade = n_large = 0
+    cascade_s = large_s = 0.0
+    for frames in iter_frame_batches(cap, cascade.batch_size, max_frames):
+        start = time.perf_counter()
+        merged = cascade.detect_batch(frames)
+        cascade_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        reference = [DetectionResult.from_ultralytics(r, cascade.large.names)
+                     for r in cascade.large(frames, conf=cascade.confidence, verbose=False)]
+        large_s += time.perf_counter() - start
+
+        for ours, ref in zip(merged, reference):
+            ours, ref = ours.filter_classes(classes), ref.filter_classes(classes)
+            tp += match_detections(ours, ref)
+            n_cascade += len(ours)
+            n_large += len(ref)
+    cap.release()
+
+    cascade.report()
+    print(f"\n🎯 Agreement with {large_model} on {', '.join(classes)}:")
+    print(f"Precision: {tp / max(1, n_cascade):.3f}  Recall: {tp / max(1, n_large):.3f}")
+    print(f"Cost: cascade {cascade_s:.1f}s vs {large_model} {large_s:.1f}s "
+          f"({cascade_s / max(large_s, 1e-9):.0%})")
+    return cascade.stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python cascade_detection.py <video_path> [small_model] [large_model] [crop|frame] [max_frames]")
+        sys.exit(1)
+
+    compare_with_large(
+        sys.argv[1],
+        sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt',
+        sys.argv[3] if len(sys.argv) > 3 else 'yolov8x.pt',
+        sys.argv[4] if len(sys.argv) > 4 else 'crop',
+        int(sys.argv[5]) if len(sys.argv) > 5 else 300,
+    )
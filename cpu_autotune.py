@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+CPU thread and worker topology autotuner
+Sweeps torch intra-op / inter-op threads, OpenCV decode threads and worker process
+counts against a short sample workload, and records the fastest configuration per
+model and input type in cpu_tuning.json, together with the fastest single-process
+configuration. The detect entry points call apply_tuning() at startup to use the
+single-process one; worker pools apply the multi-worker one per worker, each
+pinned to its own block of cores.
+
+Usage:
+  python cpu_autotune.py <images_folder|video_path> [model_path] [image|video]
+  python cpu_autotune.py --show
+
+Each configuration runs in a fresh subprocess, because torch only accepts the
+inter-op thread count before its first parallel operation.
+"""
+
+from pathlib import Path
+import subprocess
+import itertools
+import json
+import time
+import sys
+import os
+
+TUNING_FILE = os.environ.get('BUS_DETECTION_TUNING', 'cpu_tuning.json')
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+_ACTIVE = None
+
+
+def available_cpus():
+    """CPUs this process may run on (respects cgroup/affinity limits)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Snapshot before any pinning, so forked workers can still claim their own block
+_HOST_CPUS = available_cpus()
+
+
+def candidate_configs(max_configs=24):
+    """
+    Thread/process splits worth trying on this host
+
+    Every candidate keeps workers * intra_threads <= available CPUs, so
+    workers never oversubscribe the cores they are pinned to.
+    """
+    n_cpus = len(available_cpus())
+    powers = sorted({1, 2, 4, 8, 16, n_cpus} & set(range(1, n_cpus + 1)))
+    configs = []
+    for workers, intra, inter, cv2_threads in itertools.product(powers, powers, (1, 2), (0, 1)):
+        if workers * intra > n_cpus:
+            continue
+        configs.append({'workers': workers, 'intra_threads': intra, 'interop_threads': inter,
+                        'cv2_threads': cv2_threads, 'pin': workers > 1})
+    # Favour the most promising splits first: use every core, few inter-op threads
+    configs.sort(key=lambda c: (-c['workers'] * c['intra_threads'], c['interop_threads'], c['cv2_threads']))
+    return configs[:max_configs]
+
+
+def _pin_to_cores(worker_index, workers, intra_threads):
+    """Give each worker its own contiguous block of cores"""
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    cpus = _HOST_CPUS
+    block = cpus[worker_index * intra_threads:(worker_index + 1) * intra_threads]
+    if block and workers * intra_threads <= len(cpus):
+        os.sched_setaffinity(0, block)
+
+
+def apply_config(config, worker_index=None):
+    """
+    Apply one thread configuration to the current process
+
+    Args:
+        config (dict): Configuration from candidate_configs / load_tuning
+        worker_index (int): Index of this process in a worker pool; only pool
+                            workers are pinned, a single process keeps every core
+    """
+    global _ACTIVE
+    import torch
+    import cv2
+
+    torch.set_num_threads(config['intra_threads'])
+    try:
+        torch.set_num_interop_threads(config['interop_threads'])
+    except RuntimeError:
+        pass  # inter-op pool already started in this process; keep its size
+    cv2.setNumThreads(config['cv2_threads'])
+    if config.get('pin') and worker_index is not None:
+        _pin_to_cores(worker_index, config['workers'], config['intra_threads'])
+    # Later apply_tuning() calls (e.g. from load_model) keep this configuration
+    _ACTIVE = config
+
+
+def _tuning_key(model_path, input_type):
+    return f"{Path(model_path).name}:{input_type}:{len(_HOST_CPUS)}cpu"
+
+
+def _single_process(config):
+    """Single-process counterpart of a multi-worker record (tuning files from before it was recorded)"""
+    threads = min(len(_HOST_CPUS), config['workers'] * config['intra_threads'])
+    return dict(config, workers=1, intra_threads=threads, pin=False)
+
+
+def load_tuning(model_path, input_type, single=False):
+    """
+    Recorded best configuration for this model, input type and CPU count, or None
+
+    Args:
+        single (bool): Return the best single-process configuration instead of
+                       the best worker-pool one
+    """
+    if not os.path.exists(TUNING_FILE):
+        return None
+    with open(TUNING_FILE) as f:
+        config = json.load(f).get(_tuning_key(model_path, input_type))
+    if config is None or not single:
+        return config
+    return config.get('single') or _single_process(config)
+
+
+def apply_tuning(model_path='yolov8n.pt', input_type='image', worker_index=None):
+    """
+    Apply the recorded configuration, if autotune has been run on this host
+
+    Safe to call from every entry point: it is a no-op without a tuning
+    file, and since thread pools are process-wide only the first tuned
+    model/input type applied in a process takes effect. Without a
+    worker_index the single-process configuration is applied and the
+    process is not pinned.
+
+    Returns:
+        dict: The active configuration, or None
+    """
+    global _ACTIVE
+    if _ACTIVE is not None:
+        return _ACTIVE
+    config = load_tuning(model_path, input_type, single=worker_index is None)
+    if config is not None:
+        apply_config(config, worker_index)
+        print(f"🧵 CPU tuning: {config['intra_threads']} intra / {config['interop_threads']} inter-op threads, "
+              f"{config['cv2_threads']} decode threads")
+        _ACTIVE = config
+    return config
+
+
+def _sample_workload(source, input_type, limit):
+    """Decoded frames or image paths for the probe workload"""
+    if input_type == 'video':
+        import cv2
+        cap = cv2.VideoCapture(source)
+        frames = []
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+    images = sorted(str(p) for p in Path(source).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return (images * (limit // max(1, len(images)) + 1))[:limit]
+
+
+def _probe_worker(worker_index, config, source, input_type, model_path, limit, queue, barrier):
+    apply_config(config, worker_index)
+    import cv2
+    from model_loader import load_model
+
+    model = load_model(model_path, input_type=input_type, tune=False)
+    items = _sample_workload(source, input_type, limit)[worker_index::config['workers']]
+    # Start timing together, so every worker is measured while all of them run
+    barrier.wait(timeout=600)
+    start = time.perf_counter()
+    for item in items:
+        image = cv2.imread(item) if isinstance(item, str) else item
+        model(image, verbose=False)
+    queue.put((len(items), time.perf_counter() - start))
+
+
+def probe(config, source, input_type, model_path, limit=32):
+    """
+    Measure images/s for one configuration (run inside a fresh subprocess)
+    """
+    import multiprocessing as mp
+
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    barrier = ctx.Barrier(config['workers'])
+    workers = [ctx.Process(target=_probe_worker, args=(i, config, source, input_type, model_path, limit, queue,
+                                                       barrier))
+               for i in range(config['workers'])]
+    for w in workers:
+        w.start()
+    results = [queue.get() for _ in workers]
+    for w in workers:
+        w.join()
+    items = sum(n for n, _ in results)
+    # Workers run concurrently: throughput is bounded by the slowest one
+    elapsed = max(t for _, t in results)
+    return items / elapsed if elapsed > 0 else 0.0
+
+
+def autotune(source, model_path='yolov8n.pt', input_type=None, limit=32, max_configs=24):
+    """
+    Sweep configurations and record the fastest one in TUNING_FILE
+
+    Returns:
+        dict: The best configuration with its measured throughput
+    """
+    input_type = input_type or ('image' if os.path.isdir(source) else 'video')
+    configs = candidate_configs(max_configs)
+
+    print("🧵 CPU Topology Autotune")
+    print("=" * 40)
+    print(f"📂 Workload: {source} ({input_type})")
+    print(f"🤖 Model: {model_path}")
+    print(f"🖥️  CPUs: {len(available_cpus())}")
+    print(f"🔬 Configurations: {len(configs)}")
+    print("=" * 40)
+
+    best = single = None
+    for config in configs:
+        cmd = [sys.executable, __file__, '--probe', json.dumps(config), source, model_path, input_type, str(limit)]
+        try:
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=900).stdout
+            throughput = float(out.strip().splitlines()[-1])
+        except (subprocess.SubprocessError, ValueError, IndexError) as e:
+            print(f"⚠️  {config}: failed ({e})")
+            continue
+        print(f"  workers {config['workers']:>2} | intra {config['intra_threads']:>2} | "
+              f"inter {config['interop_threads']} | cv2 {config['cv2_threads']} → {throughput:.2f} {input_type}s/s")
+        if best is None or throughput > best['throughput']:
+            best = dict(config, throughput=throughput)
+        if config['workers'] == 1 and (single is None or throughput > single['throughput']):
+            single = dict(config, pin=False, throughput=throughput)
+
+    if best is None:
+        print("❌ No configuration completed")
+        return None
+    if single is not None:
+        best['single'] = single
+
+    tuning = {}
+    if os.path.exists(TUNING_FILE):
+        with open(TUNING_FILE) as f:
+            tuning = json.load(f)
+    tuning[_tuning_key(model_path, input_type)] = best
+    with open(TUNING_FILE, 'w') as f:
+        json.dump(tuning, f, indent=2)
+
+    print(f"\n🏆 Best: {best['workers']} workers × {best['intra_threads']} threads, "
+          f"{best['interop_threads']} inter-op, {best['cv2_threads']} decode → {best['throughput']:.2f}/s")
+    if single is not None:
+        print(f"🥇 Best single process: {single['intra_threads']} threads, {single['interop_threads']} inter-op, "
+              f"{single['cv2_threads']} decode → {single['throughput']:.2f}/s")
+    print(f"💾 Saved to {TUNING_FILE}")
+    return best
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--probe':
+        config = json.loads(sys.argv[2])
+        print(probe(config, sys.argv[3], sys.argv[5], sys.argv[4], int(sys.argv[6])))
+    elif len(sys.argv) > 1 and sys.argv[1] == '--show':
+        if os.path.exists(TUNING_FILE):
+            with open(TUNING_FILE) as f:
+                print(json.dumps(json.load(f), indent=2))
+        else:
+            print(f"❌ No tuning recorded yet ({TUNING_FILE})")
+    elif len(sys.argv) > 1:
+        autotune(
+            sys.argv[1],
+            sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt',
+            sys.argv[3] if len(sys.argv) > 3 else None,
+        )
+    else:
+        print("Usage:")
+        print("  python cpu_autotune.py <images_folder|video_path> [model_path] [image|video]")
+        print("  python cpu_autotune.py --show")
+        sys.exit(1)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Optimized CPU inference mode
+Builds, once per model / input size / precision, a TorchScript graph with
+conv-bn fused, channels_last memory format and (on CPUs with AMX or AVX-512
+bf16) a bfloat16 backbone and neck, traced and frozen, and caches it on disk
+with the ultralytics metadata so YOLO() loads it like any exported model. The
+detection head (box regression, DFL and box decoding) stays float32: bf16 keeps
+8 significant bits, which would round box coordinates to 4 px steps at 512-1024.
+
+Opt-in for every detect entry point through the environment:
+  BUS_DETECTION_CPU_OPT=auto   bf16 when the CPU supports it natively, else fp32
+  BUS_DETECTION_CPU_OPT=bf16   force bfloat16
+  BUS_DETECTION_CPU_OPT=fp32   fused / channels_last / frozen, but float32
+
+Usage:
+  python cpu_optimized.py <images_folder|video_path> [model_path] [imgsz] [auto|bf16|fp32]
+
+Compares images/s against the default eager FP32 model and checks that both
+find the same detections. The traced graph has a fixed input size and batch 1:
+callers that run batches or several input sizes load the eager model instead
+(model_loader.load_model(..., optimize=False)); so do adaptive input sizes.
+"""
+
+from detection_results import DetectionResult, match_detections
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import uuid
+import time
+import sys
+import os
+
+CACHE_DIR = os.environ.get('BUS_DETECTION_CPU_CACHE', 'cpu_cache')
+MODES = ('auto', 'bf16', 'fp32')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+
+def cpu_supports_bf16():
+    """True when the CPU has native bf16 matmul (AMX or AVX-512 BF16)"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    flags = set(line.split(':', 1)[1].split())
+                    return bool(flags & {'amx_bf16', 'avx512_bf16'})
+    except OSError:
+        pass
+    return False
+
+
+def requested_mode():
+    """Optimized mode selected through BUS_DETECTION_CPU_OPT, or None when off"""
+    value = os.environ.get('BUS_DETECTION_CPU_OPT', '').strip().lower()
+    if value in ('', '0', 'off', 'false'):
+        return None
+    if value in ('1', 'on', 'true'):
+        value = 'auto'
+    if value not in MODES:
+        raise ValueError(f"BUS_DETECTION_CPU_OPT must be one of {', '.join(MODES)} (got '{value}')")
+    return value
+
+
+def resolve_precision(mode):
+    if mode == 'auto':
+        return 'bf16' if cpu_supports_bf16() else 'fp32'
+    return mode
+
+
+def _cache_path(model_path, imgsz, precision):
+    import torch
+
+    import ultralytics
+
+    version = torch.__version__.split('+')[0]
+    name = f"{Path(model_path).stem}_{imgsz}_{precision}_torch{version}_ultralytics{ultralytics.__version__}"
+    return os.path.join(CACHE_DIR, f"{name}.torchscript")
+
+
+def _metadata(model, model_path, imgsz, precision):
+    """Same fields ultralytics writes into exported models, read back by AutoBackend"""
+    import ultralytics
+
+    module = model.model
+    return {
+        'description': f"Ultralytics {Path(model_path).stem} optimized for CPU ({precision})",
+        'author': 'Ultralytics',
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'version': ultralytics.__version__,
+        'license': 'AGPL-3.0 License (https://ultralytics.com/license)',
+        'docs': 'https://docs.ultralytics.com',
+        'stride': int(max(module.stride)),
+        'task': model.task,
+        'batch': 1,
+        'imgsz': [imgsz, imgsz],
+        'names': model.names,
+        'args': {'batch': 1, 'half': False, 'int8': False, 'dynamic': False, 'nms': False},
+        'channels': 3,
+    }
+
+
+def _is_fresh(path, model_path):
+    return os.path.exists(path) and (
+        not os.path.exists(model_path) or os.path.getmtime(path) >= os.path.getmtime(model_path))
+
+
+@contextmanager
+def _build_lock(path):
+    """Exclusive lock on `<path>.lock`, so concurrent processes build the graph once"""
+    try:
+        import fcntl
+    except ImportError:
+        yield  # no flock (Windows): unique temp names still keep the cache file whole
+        return
+    with open(f"{path}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def build_optimized(model_path='yolov8n.pt', imgsz=640, mode='auto', force=False):
+    """
+    Trace, freeze and cache the optimized graph
+
+    Safe to call from several processes at once (e.g. worker pools): one
+    builds while the others wait for it and then load its result.
+
+    Returns:
+        str: Path of the cached .torchscript file
+    """
+    precision = resolve_precision(mode)
+    path = _cache_path(model_path, imgsz, precision)
+    if not force and _is_fresh(path, model_path):
+        return path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with _build_lock(path):
+        if not force and _is_fresh(path, model_path):
+            return path  # built by another process while this one waited
+        return _build(model_path, imgsz, precision, path)
+
+
+def _build(model_path, imgsz, precision, path):
+    import torch
+    from ultralytics import YOLO
+    from ultralytics.nn.modules import Detect
+
+    print(f"⚙️  Building optimized CPU graph ({precision}, imgsz {imgsz}) for {model_path}...")
+    start = time.perf_counter()
+    model = YOLO(model_path)
+    module = model.model.fuse().eval()
+    for m in module.modules():
+        if isinstance(m, Detect):
+            # Single output tensor, as in ultralytics' own TorchScript export
+            m.export = True
+            m.format = 'torchscript'
+            m.dynamic = False
+    for p in module.parameters():
+        p.requires_grad_(False)
+
+    dtype = torch.bfloat16 if precision == 'bf16' else torch.float32
+    module = module.to(dtype=dtype, memory_format=torch.channels_last)
+    if dtype != torch.float32:
+        # Keep the Detect head in fp32, fed fp32 copies of the feature maps
+        head = module.model[-1]
+        head.float()
+        head.register_forward_pre_hook(lambda m, args: ([t.float() for t in args[0]],))
+
+    class _CpuGraph(torch.nn.Module):
+        """Float32 in and out (what AutoBackend feeds and expects), `dtype` up to the head"""
+
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, x):
+            x = x.to(dtype).contiguous(memory_format=torch.channels_last)
+            y = self.inner(x)
+            return (y[0] if isinstance(y, (list, tuple)) else y).float()
+
+    example = torch.zeros(1, 3, imgsz, imgsz)
+    with torch.no_grad():
+        traced = torch.jit.trace(_CpuGraph(module).eval(), example, strict=False)
+        # Freezing inlines the weights as constants, so AutoBackend's
+        # model.float() cannot undo the bf16 conversion
+        frozen = torch.jit.freeze(traced)
+        for _ in range(2):
+            frozen(example)  # run the profiling passes before saving
+
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    torch.jit.save(frozen, tmp, _extra_files={'config.txt': json.dumps(_metadata(model, model_path, imgsz, precision))})
+    os.replace(tmp, path)
+    print(f"💾 Cached {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def optimized_model_path(model_path, imgsz=640, mode=None):
+    """
+    Model path to load: the cached optimized graph when the mode is on
+    (argument or BUS_DETECTION_CPU_OPT), else `model_path` unchanged
+    """
+    mode = mode or requested_mode()
+    if mode is None or not str(model_path).endswith('.pt'):
+        return model_path
+    return build_optimized(model_path, imgsz, mode)
+
+
+def _sample_images(source, limit):
+    import cv2
+
+    if os.path.isdir(source):
+        paths = sorted(str(p) for p in Path(source).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return [img for img in (cv2.imread(p) for p in paths[:limit]) if img is not None]
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def benchmark(source, model_path='yolov8n.pt', imgsz=640, mode='auto', limit=100, confidence=0.25):
+    """
+    Images/s of eager FP32 vs. the optimized graph, and how closely their detections agree
+    """
+    from ultralytics import YOLO
+
+    precision = resolve_precision(mode)
+    print("🏎️  Optimized CPU Mode Benchmark")
+    print("=" * 40)
+    print(f"📂 Source: {source}")
+    print(f"🤖 Model: {model_path} @ {imgsz}")
+    print(f"🧮 Precision: {precision} (native bf16: {'yes' if cpu_supports_bf16() else 'no'})")
+    print("=" * 40)
+
+    images = _sample_images(source, limit)
+    if not images:
+        print(f"❌ No images or frames found in {source}")
+        return None
+
+    models = {
+        'eager fp32': YOLO(model_path),
+        f'optimized {precision}': YOLO(build_optimized(model_path, imgsz, precision), task='detect'),
+    }
+    outputs = {}
+    for label, model in models.items():
+        model(images[0], imgsz=imgsz, conf=confidence, verbose=False)  # warm-up
+        detections = []
+        start = time.perf_counter()
+        for image in images:
+            results = model(image, imgsz=imgsz, conf=confidence, verbose=False)
+            detections.append(DetectionResult.from_ultralytics(results[0], model.names))
+        elapsed = time.perf_counter() - start
+        outputs[label] = (len(images) / elapsed, detections)
+        print(f"  {label:<16} {outputs[label][0]:7.2f} images/s")
+
+    (base_rate, base), (opt_rate, opt) = outputs.values()
+    matched = sum(match_detections(o, b, 0.5) for o, b in zip(opt, base))
+    n_base = sum(len(b) for b in base)
+    n_opt = sum(len(o) for o in opt)
+    recall = matched / n_base if n_base else 1.0
+    precision_vs_eager = matched / n_opt if n_opt else 1.0
+
+    print(f"\n🚀 Speed-up: {opt_rate / base_rate:.2f}x")
+    print(f"🎯 Agreement with eager FP32 (IoU ≥ 0.5, same class): "
+          f"recall {recall:.1%}, precision {precision_vs_eager:.1%} ({n_base} vs {n_opt} detections)")
+    if min(recall, precision_vs_eager) < 0.95:
+        print("⚠️  Optimized graph disagrees with eager FP32 on more than 5% of detections")
+    return {'speedup': opt_rate / base_rate, 'recall': recall, 'precision': precision_vs_eager}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python cpu_optimized.py <images_folder|video_path> [model_path] [imgsz] [auto|bf16|fp32]")
+        sys.exit(1)
+
+    benchmark(
+        sys.argv[1],
+        sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt',
+        int(sys.argv[3]) if len(sys.argv) > 3 else 640,
+        sys.argv[4] if len(sys.argv) > 4 else 'auto',
+    )
@@ -1,49 +1,217 @@
 from ultralytics import YOLO
+from detection_store import DetectionStoreWriter, frame_time
+from cpu_autotune import apply_tuning
+from cpu_optimized import optimized_model_path
+from detection_results import DetectionResult
+import cv2
+import sys
+import os
 
-def detect_buses_in_video():
+def detect_buses_in_video(video_path="videos/LOS SITP DE BOGOTÁ_correctly_trimmed.mp4",
+                          model_path="yolov8x.pt",
+                          store_path="results/bus_detection_video/detections",
+                          start_epoch=None,
+                          cascade=False,
+                          analytics=False,
+                          memory=False):
     """
     Apply YOLO model to detect buses in the trimmed video
+
+    Per-frame detections are appended to a columnar store (see
+    detection_store.py) so they can be queried later without re-running
+    inference. Pass `start_epoch` (recording start, epoch seconds) to enable
+    clock-time queries such as buses per minute between 7 and 9am.
+
+    With `cascade=True`, yolov8n screens every frame and `model_path` only
+    confirms uncertain bus/truck candidates (see cascade_detection.py).
+
+    With `analytics=True`, bus line crossings, occupancy and dwell times are
+    updated frame by frame and summarised while the video is processed
+    (see traffic_analytics.py).
+
+    With `memory=True`, RSS is sampled every frame and a memory report is
+    printed at the end (see memory_monitor.py). `memory='trace'` also turns
+    on tracemalloc, so the report names the allocation sites that grew; it
+    slows Python allocations down, so it is meant for diagnosis only.
     """
-    
-    # Video path
-    video_path = "videos/LOS SITP DE BOGOTÁ_correctly_trimmed.mp4"
-    
+    if cascade:
+        return detect_buses_in_video_cascade(video_path, model_path, store_path, start_epoch,
+                                             analytics=analytics, memory=memory)
+
     print("🚌 Bus Detection with YOLO")
     print("=" * 40)
     print(f"Video: {video_path}")
-    print("Model: yolov8x.pt")
+    print(f"Model: {model_path}")
     print("Output: results/ folder")
+    print(f"Detections: {store_path}")
     print("=" * 40)
-    
+
     try:
         # Load pre-trained model
         print("🔍 Loading YOLO model...")
-        model: YOLO = YOLO(model="yolov8x.pt")
-        
+        apply_tuning(model_path, 'video')
+        model: YOLO = YOLO(model=optimized_model_path(model_path), task='detect')
+
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or None
+        cap.release()
+
         print("🎬 Starting video analysis...")
-        # Run inference on video and save results
-        result: list = model.predict(
-            video_path, 
-            save=True, 
+        # Stream results frame by frame instead of holding every frame's
+        # Results in memory until the end of the video
+        results = model.predict(
+            video_path,
+            save=True,
             project="results",
-            name="bus_detection_video"
+            name="bus_detection_video",
+            stream=True,
+            verbose=False
         )
-        
+
+        traffic = _traffic_analytics(model.names) if analytics else None
+        monitor = _memory_monitor(memory) if memory else None
+        frame_count = 0
+        with DetectionStoreWriter(store_path, model.names, fps, start_epoch) as store:
+            for i, r in enumerate(results):
+                frame_count += 1
+                if monitor is not None:
+                    _sample_memory(monitor, i)
+                if traffic is not None:
+                    traffic.update(frame_time(fps, i, start_epoch), DetectionResult.from_ultralytics(r, model.names))
+                if hasattr(r, 'boxes') and r.boxes is not None:
+                    boxes = r.boxes
+                    store.append(
+                        i,
+                        frame_time(fps, i, start_epoch),
+                        boxes.cls.cpu().numpy().astype(int),
+                        boxes.conf.cpu().numpy(),
+                        boxes.xyxy.cpu().numpy()
+                    )
+                    print(f"Frame {i+1}: {len(boxes)} objects detected")
+        if traffic is not None:
+            traffic.finish()
+        if monitor is not None:
+            monitor.report()
+
         print("✅ Video analysis completed!")
         print("📁 Results saved in: results/bus_detection_video/")
-        
-        # Print summary of detections
-        if result:
-            print(f"📊 Processed {len(result)} frames")
-            for i, r in enumerate(result):
-                if hasattr(r, 'boxes') and r.boxes is not None:
-                    print(f"Frame {i+1}: {len(r.boxes)} objects detected")
-        
+        print(f"📊 Processed {frame_count} frames")
+        print(f"🗄️  Detections stored in: {store_path}")
+
     except Exception as e:
         print(f"❌ Error during detection: {str(e)}")
         import traceback
         traceback.print_exc()
 
-if __name__ == "__main__":
-    detect_buses_in_video()
+def _traffic_analytics(names):
+    from traffic_analytics import TrafficAnalytics
+    return TrafficAnalytics(names, log_path="results/bus_detection_video/analytics.jsonl")
+
+def _memory_monitor(memory):
+    from memory_monitor import MemoryMonitor
+    return MemoryMonitor(trace=memory == 'trace')
+
+def _sample_memory(monitor, i, warmup=300, every=1000):
+    monitor.sample(i)
+    if i + 1 == warmup:
+        monitor.set_baseline(i)
+    elif monitor.baseline_rss is not None and (i + 1) % every == 0:
+        print(f"🧠 Frame {i+1}: RSS {monitor.growth_mb():+.1f} MB since frame {warmup}")
+
+def detect_buses_in_video_cascade(video_path, large_model_path="yolov8x.pt",
+                                  store_path="results/bus_detection_video/detections",
+                                  start_epoch=None, small_model_path="yolov8n.pt",
+                                  analytics=False, memory=False, detector=None, on_frame=None):
+    """
+    Cascade variant of detect_buses_in_video: yolov8n everywhere, the large
+    model only for uncertain candidates. Writes the same detection store and
+    an annotated video to results/bus_detection_video/.
+
+    `video_path` may also be an opened capture with the cv2.VideoCapture
+    methods (e.g. a ReplayCapture from replay_source.py). `detector` replaces
+    the CascadeDetector (anything with names, batch_size, detect_batch and
+    report), and on_frame(frame_index, frame, detection) is called after each
+    frame is stored and written; returning False stops the run.
+    """
+    from cascade_detection import CascadeDetector, iter_frame_batches
+    from detect_image import annotate_allowed_classes
+
+    print("🚌 Bus Detection with YOLO (cascade)")
+    print("=" * 40)
+    print(f"Video: {video_path}")
+    print(f"Models: {small_model_path} → {large_model_path}")
+    print(f"Detections: {store_path}")
+    print("=" * 40)
 
+    try:
+        print("🔍 Loading YOLO models...")
+        apply_tuning(large_model_path, 'video')
+        detector = detector or CascadeDetector(small_model_path, large_model_path)
+
+        cap = video_path if hasattr(video_path, 'read') else cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"❌ Error: Could not open video file: {video_path}")
+            return
+        fps = cap.get(cv2.CAP_PROP_FPS) or None
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        output_path = "results/bus_detection_video/cascade.mp4"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps or 30, (width, height))
+
+        print("🎬 Starting video analysis...")
+        traffic = _traffic_analytics(detector.names) if analytics else None
+        monitor = _memory_monitor(memory) if memory else None
+        frame_index = 0
+        stop = False
+        with DetectionStoreWriter(store_path, detector.names, fps, start_epoch) as store:
+            for frames in iter_frame_batches(cap, detector.batch_size):
+                for frame, detection in zip(frames, detector.detect_batch(frames)):
+                    if monitor is not None:
+                        _sample_memory(monitor, frame_index)
+                    store.append(frame_index, frame_time(fps, frame_index, start_epoch),
+                                 detection.class_ids, detection.scores, detection.boxes)
+                    if traffic is not None:
+                        traffic.update(frame_time(fps, frame_index, start_epoch), detection)
+                    _, annotated = annotate_allowed_classes(frame, detection)
+                    writer.write(annotated)
+                    if on_frame is not None and on_frame(frame_index, frame, detection) is False:
+                        stop = True
+                        break
+                    frame_index += 1
+                    print(f"Frame {frame_index}: {len(detection)} objects detected")
+                if stop:
+                    break
+        cap.release()
+        writer.release()
+        if traffic is not None:
+            traffic.finish()
+        if monitor is not None:
+            monitor.report()
+
+        print("✅ Video analysis completed!")
+        print(f"📁 Annotated video: {output_path}")
+        print(f"🗄️  Detections stored in: {store_path}")
+        detector.report()
+
+    except Exception as e:
+        print(f"❌ Error during detection: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    # Usage: python detect_buses_video.py [video_path] [model_path] [start_epoch] [--cascade] [--analytics]
+    #                                     [--memory | --memory-trace]
+    cascade = '--cascade' in sys.argv
+    analytics = '--analytics' in sys.argv
+    memory = 'trace' if '--memory-trace' in sys.argv else '--memory' in sys.argv
+    args = [a for a in sys.argv[1:] if a not in ('--cascade', '--analytics', '--memory', '--memory-trace')]
+    if args:
+        video_path = args[0]
+        model_path = args[1] if len(args) > 1 else "yolov8x.pt"
+        start_epoch = float(args[2]) if len(args) > 2 else None
+        detect_buses_in_video(video_path, model_path, start_epoch=start_epoch, cascade=cascade, analytics=analytics,
+                              memory=memory)
+    else:
+        detect_buses_in_video(cascade=cascade, analytics=analytics, memory=memory)
@@ -4,15 +4,65 @@ Car Detection Script - Similar to mobile app
 Detects only cars using YOLO
 """
 
-from ultralytics import YOLO
+from detection_daemon import detect, use_daemon
+from image_source import source_options
+from fast_image_loader import full_resolution
+from output_writer import OutputWriter, output_options
+from remote_io import ImageFetcher, open_image_source
 import cv2
 import sys
 import os
 from pathlib import Path
 
-def detect_cars(image_path, model_path='yolov8n.pt', confidence=0.5):
+def annotate_cars(image, detection, scale=(1.0, 1.0), draw=True):
+    """
+    Keep only car detections and draw them on a copy of the image
+
+    Args:
+        image (np.ndarray): BGR image the boxes refer to
+        detection (DetectionResult): Detections for the image
+        scale (tuple): (x, y) factors from `image` to original-image pixels,
+                       applied to the returned boxes (see fast_image_loader.py)
+        draw (bool): Build the annotated copy (False returns None for it)
+
+    Returns:
+        tuple: (list of car detections in original-image pixels, annotated image)
+    """
+    cars = detection.filter_classes({'car'})
+    car_detections = cars.scaled(*scale).to_dicts()
+    if not draw:
+        return car_detections, None
+    annotated_image = image.copy()
+    
+    for x1, y1, x2, y2, conf, _ in cars:
+        # Draw blue bounding box (like mobile app)
+        color = (69, 183, 209)  # Blue color similar to mobile app
+        cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 3)
+        
+        # Draw label
+        label = f"Car {conf:.2f}"
+        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+        cv2.rectangle(annotated_image, (x1, y1-h-15), (x1+w, y1), color, -1)
+        cv2.putText(annotated_image, label, (x1, y1-8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
+    
+    return car_detections, annotated_image
+
+def save_result(image_path, annotated_image):
+    """Save an annotated car image to results/ and return its path"""
+    output_dir = "results"
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"cars_detected_{Path(image_path).stem}.jpg")
+    cv2.imwrite(output_path, annotated_image)
+    return output_path
+
+def detect_cars(image_path, model_path='yolov8n.pt', confidence=0.5, writer=None, preloaded=None):
     """
     Detect only cars in an image (similar to mobile app)
+
+    With a `writer` (batch runs), results are queued to it instead of being
+    written and displayed inline (see output_writer.py). `preloaded` is the
+    image already fetched and decoded for inference (see remote_io.py);
+    annotations are drawn on a full-resolution decode.
     """
     print("🚗 Car Detection with YOLO")
     print("=" * 40)
@@ -21,56 +71,20 @@ def detect_cars(image_path, model_path='yolov8n.pt', confidence=0.5):
     print(f"🎯 Confidence: {confidence}")
     print("=" * 40)
     
-    # Load model
-    print("🔍 Loading YOLO model...")
-    model = YOLO(model_path)
-    print("✅ Model loaded!")
-    
-    # Load image
-    image = cv2.imread(image_path)
-    if image is None:
+    # Run detection (boxes in original-image pixels)
+    print("🔍 Detecting cars...")
+    detection = detect(image_path, preloaded, model_path, confidence)
+    if detection is None:
         print(f"❌ Error: Could not load image {image_path}")
         return []
     
-    print(f"📸 Image loaded! Size: {image.shape[1]}x{image.shape[0]}")
-    
-    # Run detection
-    print("🔍 Detecting cars...")
-    results = model(image, conf=confidence, verbose=False)
-    
-    # Filter only cars
-    car_detections = []
-    annotated_image = image.copy()
-    
-    for result in results:
-        if result.boxes is not None:
-            for box in result.boxes:
-                # Get detection info
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                conf = float(box.conf[0].cpu().numpy())
-                class_id = int(box.cls[0].cpu().numpy())
-                class_name = model.names[class_id]
-                
-                # Only process cars
-                if class_name == 'car':
-                    car_detections.append({
-                        'class': 'car',
-                        'confidence': conf,
-                        'bbox': {
-                            'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
-                            'width': x2 - x1, 'height': y2 - y1
-                        }
-                    })
-                    
-                    # Draw blue bounding box (like mobile app)
-                    color = (69, 183, 209)  # Blue color similar to mobile app
-                    cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 3)
-                    
-                    # Draw label
-                    label = f"Car {conf:.2f}"
-                    (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
-                    cv2.rectangle(annotated_image, (x1, y1-h-15), (x1+w, y1), color, -1)
-                    cv2.putText(annotated_image, label, (x1, y1-8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
+    # Filter only cars, drawn on the full-resolution image when it is saved or shown
+    draw = writer is None or writer.images
+    image = full_resolution(image_path, preloaded) if draw else None
+    if draw and image is None:
+        print(f"❌ Error: Could not load image {image_path}")
+        return []
+    car_detections, annotated_image = annotate_cars(image, detection, draw=draw)
     
     # Print results
     print(f"🚗 Found {len(car_detections)} cars:")
@@ -78,11 +92,16 @@ def detect_cars(image_path, model_path='yolov8n.pt', confidence=0.5):
         bbox = car['bbox']
         print(f"  {i}. Car {i}: {car['confidence']:.1%} confidence at ({bbox['x1']},{bbox['y1']})-({bbox['x2']},{bbox['y2']})")
     
+    if writer is not None:
+        writer.add_detections(image_path, detection.filter_classes({'car'}))
+        if annotated_image is not None:
+            output_path = writer.submit_image(writer.path(f"cars_detected_{Path(image_path).stem}.jpg"),
+                                              annotated_image)
+            print(f"💾 Result queued for: {output_path}")
+        return car_detections
+    
     # Save result
-    output_dir = "results"
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f"cars_detected_{Path(image_path).stem}.jpg")
-    cv2.imwrite(output_path, annotated_image)
+    output_path = save_result(image_path, annotated_image)
     print(f"💾 Result saved to: {output_path}")
     
     # Show image
@@ -93,38 +112,48 @@ def detect_cars(image_path, model_path='yolov8n.pt', confidence=0.5):
     
     return car_detections
 
-def batch_detect_cars(folder_path, model_path='yolov8n.pt', confidence=0.5):
+def batch_detect_cars(folder_path, model_path='yolov8n.pt', confidence=0.5,
+                      recursive=True, shard=None, manifest_path=None, output=None, in_flight=16):
     """
-    Detect cars in all images in a folder
+    Detect cars in all images in a folder (and its subfolders), or under an
+    http(s):// or s3:// URI; images are fetched and decoded `in_flight` ahead
+    of the detector (see remote_io.py)
+
+    `shard` ('i/N') and `manifest_path` split the work across machines and
+    resume an interrupted run (see image_source.py). `output` holds
+    OutputWriter options: annotated images, detection records or both,
+    written on background threads (see output_writer.py).
     """
     print("📁 Batch Car Detection")
     print("=" * 40)
     print(f"📂 Folder: {folder_path}")
+    if shard:
+        print(f"🧩 Shard: {shard}")
     print("=" * 40)
     
-    # Find images
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-    image_files = []
-    for ext in image_extensions:
-        image_files.extend(Path(folder_path).glob(f"*{ext}"))
-        image_files.extend(Path(folder_path).glob(f"*{ext.upper()}"))
-    
-    if not image_files:
-        print(f"❌ No images found in {folder_path}")
-        return
-    
-    print(f"📸 Found {len(image_files)} images")
-    
     total_cars = 0
-    for i, image_path in enumerate(image_files):
-        print(f"\n🔄 Processing {i+1}/{len(image_files)}: {image_path.name}")
-        cars = detect_cars(str(image_path), model_path, confidence)
-        total_cars += len(cars)
-        print(f"✅ Found {len(cars)} cars")
+    with open_image_source(folder_path, recursive, shard, manifest_path) as source, \
+            OutputWriter(**{'output_dir': "results", 'records_name': "cars_detections", 'shard': shard,
+                            'source': source, **(output or {})}) as writer, \
+            ImageFetcher(in_flight) as fetcher:
+        for i, (image_path, preloaded) in enumerate(fetcher.prefetch(source, decode_local=not use_daemon())):
+            print(f"\n🔄 Processing {i+1}: {source.relative(image_path)}")
+            if preloaded is None:
+                writer.commit(image_path, failed=True)
+                continue
+            cars = detect_cars(image_path, model_path, confidence, writer, preloaded)
+            total_cars += len(cars)
+            print(f"✅ Found {len(cars)} cars")
+            writer.commit(image_path)
+    
+    if not source.yielded:
+        print(f"❌ No images to process in {folder_path} ({source.describe()})")
+        return
     
     print(f"\n📊 Batch Complete!")
-    print(f"Total images: {len(image_files)}")
+    print(f"Total images: {source.describe()}")
     print(f"Total cars detected: {total_cars}")
+    print(f"Output: {writer.describe()}")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -134,23 +163,30 @@ if __name__ == "__main__":
         print("  python detect_cars.py <image_path>")
         print("  python detect_cars.py <image_path> <model_path>")
         print("  python detect_cars.py <image_path> <model_path> <confidence>")
-        print("  python detect_cars.py --batch <folder_path>")
+        print("  python detect_cars.py --batch <folder_path> [model_path] [confidence] [--shard i/N] [--manifest path]")
+        print("                        [--output images|detections|both] [--format jsonl|npz] [--quality N] [--thumbnail N]")
+        print("                        [--dest <dir|uri>]    (<folder_path> may be an http(s):// or s3:// URI)")
         print("")
         print("Examples:")
         print("  python detect_cars.py images/buses.jpeg")
         print("  python detect_cars.py images/buses.jpeg yolov8s.pt")
         print("  python detect_cars.py images/buses.jpeg yolov8n.pt 0.7")
         print("  python detect_cars.py --batch images/")
+        print("  python detect_cars.py --batch images/ --shard 0/4 --manifest results/shard0.json")
+        print("  python detect_cars.py --batch images/ --output detections --format npz")
+        print("  python detect_cars.py --batch s3://frames/cam1/ --output detections --dest s3://frames-results/cam1/")
         sys.exit(1)
     
     if sys.argv[1] == "--batch":
-        if len(sys.argv) < 3:
+        args, options = source_options(sys.argv[1:])
+        args, output = output_options(args)
+        if len(args) < 2:
             print("❌ Please provide folder path for batch processing")
             sys.exit(1)
-        folder_path = sys.argv[2]
-        model_path = sys.argv[3] if len(sys.argv) > 3 else 'yolov8n.pt'
-        confidence = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
-        batch_detect_cars(folder_path, model_path, confidence)
+        folder_path = args[1]
+        model_path = args[2] if len(args) > 2 else 'yolov8n.pt'
+        confidence = float(args[3]) if len(args) > 3 else 0.5
+        batch_detect_cars(folder_path, model_path, confidence, output=output, **options)
     else:
         image_path = sys.argv[1]
         model_path = sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt'
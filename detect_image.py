@@ -4,7 +4,10 @@ Simple YOLO Image Detection Script
 Usage: python detect_image.py <image_path> [model_path] [confidence]
 """
 
-from ultralytics import YOLO
+from detection_daemon import detect, use_daemon
+from image_source import source_options
+from fast_image_loader import full_resolution
+from remote_io import ImageFetcher, open_image_source
 import cv2
 import sys
 import os
@@ -15,70 +18,87 @@ ALLOWED_CLASSES = {
     'traffic light', 'stop sign'
 }
 
-def detect_image(image_path, model_path='yolov8n.pt', confidence=0.5):
+# Colors (BGR) aligned roughly with the mobile app
+PALETTE = {
+    'person': (231, 76, 60),
+    'bicycle': (41, 128, 185),
+    'car': (69, 183, 209),
+    'motorcycle': (142, 68, 173),
+    'bus': (46, 204, 113),
+    'truck': (230, 126, 34),
+    'traffic light': (241, 196, 15),
+    'stop sign': (192, 57, 43),
+}
+
+def annotate_allowed_classes(image, detection, allowed_classes=ALLOWED_CLASSES, scale=(1.0, 1.0)):
+    """
+    Draw the allowed-class detections on a copy of the image
+
+    Args:
+        image (np.ndarray): BGR image the boxes refer to
+        detection (DetectionResult): Detections for the image
+        allowed_classes (set): Class names to keep
+        scale (tuple): (x, y) factors from `image` to original-image pixels,
+                       applied to the returned boxes (see fast_image_loader.py)
+
+    Returns:
+        tuple: (list of detections in original-image pixels, annotated image)
+    """
+    detections = []
+    annotated_image = image.copy()
+    allowed = detection.filter_classes(allowed_classes)
+    
+    for (x1, y1, x2, y2, conf, class_name), original in zip(allowed, allowed.scaled(*scale)):
+        # Store detection
+        detections.append({
+            'class': class_name,
+            'confidence': conf,
+            'bbox': original[:4]
+        })
+        
+        color = PALETTE.get(class_name, (0, 255, 0))
+        
+        # Draw bounding box
+        cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 2)
+        
+        # Draw label
+        label = f"{class_name} {conf:.2f}"
+        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        cv2.rectangle(annotated_image, (x1, y1-h-10), (x1+w, y1), color, -1)
+        cv2.putText(annotated_image, label, (x1, y1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
+    
+    return detections, annotated_image
+
+def save_result(image_path, annotated_image):
+    """Save an annotated image to results/ and return its path"""
+    output_path = f"results/detect_{Path(image_path).stem}_detected.jpg"
+    os.makedirs("results", exist_ok=True)
+    cv2.imwrite(output_path, annotated_image)
+    return output_path
+
+def detect_image(image_path, model_path='yolov8n.pt', confidence=0.5, preloaded=None, detector=None):
     """
     Quick image detection with YOLO
+
+    `preloaded` is the image already fetched and decoded for inference (see
+    remote_io.py); the result is drawn on a full-resolution decode.
+    `detector` replaces detection_daemon.detect (same arguments), e.g. for
+    the synthetic soak in memory_monitor.py.
     """
     print(f"🔍 Detecting objects in: {image_path}")
     print(f"🤖 Using model: {model_path}")
     print(f"🎯 Confidence threshold: {confidence}")
     print("-" * 50)
     
-    # Load model
-    model = YOLO(model_path)
-    
-    # Load image
-    image = cv2.imread(image_path)
+    # Run detection (on the warm daemon when it is running); boxes are in original-image pixels
+    detection = (detector or detect)(image_path, preloaded, model_path, confidence)
+    image = full_resolution(image_path, preloaded) if detection is not None else None
     if image is None:
         print(f"❌ Error: Could not load image {image_path}")
         return
     
-    # Run detection
-    results = model(image, conf=confidence, verbose=False)
-    
     # Process results
-    detections = []
-    annotated_image = image.copy()
-    
-    for result in results:
-        if result.boxes is not None:
-            for box in result.boxes:
-                # Get coordinates
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                conf = float(box.conf[0].cpu().numpy())
-                class_id = int(box.cls[0].cpu().numpy())
-                class_name = model.names[class_id]
-                if class_name not in ALLOWED_CLASSES:
-                    continue
-                
-                # Store detection
-                detections.append({
-                    'class': class_name,
-                    'confidence': conf,
-                    'bbox': (x1, y1, x2, y2)
-                })
-                
-                # Choose color (align roughly with app)
-                palette = {
-                    'person': (231, 76, 60),
-                    'bicycle': (41, 128, 185),
-                    'car': (69, 183, 209),
-                    'motorcycle': (142, 68, 173),
-                    'bus': (46, 204, 113),
-                    'truck': (230, 126, 34),
-                    'traffic light': (241, 196, 15),
-                    'stop sign': (192, 57, 43),
-                }
-                color = palette.get(class_name, (0, 255, 0))
-                
-                # Draw bounding box
-                cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 2)
-                
-                # Draw label
-                label = f"{class_name} {conf:.2f}"
-                (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                cv2.rectangle(annotated_image, (x1, y1-h-10), (x1+w, y1), color, -1)
-                cv2.putText(annotated_image, label, (x1, y1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
+    detections, annotated_image = annotate_allowed_classes(image, detection)
     
     # Print results
     print(f"✅ Found {len(detections)} objects (filtered):")
@@ -86,9 +106,7 @@ def detect_image(image_path, model_path='yolov8n.pt', confidence=0.5):
         print(f"  {i}. {det['class']}: {det['confidence']:.3f}")
     
     # Save result
-    output_path = f"results/detect_{Path(image_path).stem}_detected.jpg"
-    os.makedirs("results", exist_ok=True)
-    cv2.imwrite(output_path, annotated_image)
+    output_path = save_result(image_path, annotated_image)
     print(f"💾 Result saved to: {output_path}")
     
     # Show image unless running in headless mode
@@ -98,28 +116,35 @@ def detect_image(image_path, model_path='yolov8n.pt', confidence=0.5):
         cv2.waitKey(0)
         cv2.destroyAllWindows()
 
-def detect_folder(folder_path, model_path='yolov8n.pt', confidence=0.5):
-    folder = Path(folder_path)
-    images = list(folder.glob('*.jpg')) + list(folder.glob('*.jpeg')) + list(folder.glob('*.png'))
-    if not images:
-        print(f"❌ No images found in {folder}")
+def detect_folder(folder_path, model_path='yolov8n.pt', confidence=0.5, recursive=True, shard=None,
+                  manifest_path=None):
+    print(f"📁 Running detection on images in {folder_path}")
+    # `folder_path` may also be an http(s):// or s3:// URI (see remote_io.py)
+    with open_image_source(folder_path, recursive, shard, manifest_path) as source, ImageFetcher() as fetcher:
+        for img, preloaded in fetcher.prefetch(source, decode_local=not use_daemon()):
+            if preloaded is None:
+                source.mark_failed(img)
+                continue
+            detect_image(img, model_path, confidence, preloaded)
+            source.mark_done(img)
+    if not source.yielded:
+        print(f"❌ No images to process in {folder_path} ({source.describe()})")
         return
-    print(f"📁 Running detection on {len(images)} images in {folder}")
-    for img in images:
-        detect_image(str(img), model_path, confidence)
+    print(f"📊 Processed {source.describe()}")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage:")
         print("  python detect_image.py <image_path> [model_path] [confidence]")
-        print("  python detect_image.py --folder <folder_path> [model_path] [confidence]")
+        print("  python detect_image.py --folder <folder_path> [model_path] [confidence] [--shard i/N] [--manifest path]")
         sys.exit(1)
 
     if sys.argv[1] == '--folder':
-        folder_path = sys.argv[2]
-        model_path = sys.argv[3] if len(sys.argv) > 3 else 'yolov8n.pt'
-        confidence = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
-        detect_folder(folder_path, model_path, confidence)
+        args, options = source_options(sys.argv[1:])
+        folder_path = args[1]
+        model_path = args[2] if len(args) > 2 else 'yolov8n.pt'
+        confidence = float(args[3]) if len(args) > 3 else 0.5
+        detect_folder(folder_path, model_path, confidence, **options)
     else:
         image_path = sys.argv[1]
         model_path = sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt'
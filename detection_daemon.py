@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Persistent local detection daemon
+Keeps warmed-up YOLO models in memory behind a Unix socket. detect_image.py,
+detect_cars.py and bus_detection.py forward their inference here when the daemon
+is running, and fall back to loading the model themselves when it is not.
+
+Usage:
+  python detection_daemon.py [model_path ...]     # start (preloads the given models)
+  python detection_daemon.py --stop
+  python detection_daemon.py --ping
+
+Set BUS_DETECTION_SOCKET to change the socket path, or BUS_DETECTION_NO_DAEMON=1
+to make the scripts always run locally.
+"""
+
+from detection_results import DetectionResult
+import socketserver
+import socket
+import json
+import time
+import sys
+import os
+
+SOCKET_PATH = os.environ.get('BUS_DETECTION_SOCKET', f"/tmp/bus_detection_{os.getuid()}.sock")
+CLIENT_TIMEOUT = 60.0
+
+
+def _send_request(request, timeout=CLIENT_TIMEOUT):
+    """Send one JSON request and return the decoded reply (raises OSError if unavailable)"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(SOCKET_PATH)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    return json.loads(reply)
+
+
+def daemon_available():
+    if not os.path.exists(SOCKET_PATH):
+        return False
+    try:
+        return _send_request({'op': 'ping'}, timeout=1.0).get('ok', False)
+    except (OSError, ValueError):
+        return False
+
+
+def _resolve_model_path(model_path):
+    """
+    Local weights by absolute path, so client and daemon agree whatever their
+    working directories; names of weights to download are passed through
+    """
+    return os.path.abspath(model_path) if os.path.exists(model_path) else model_path
+
+
+def detect_remote(image_path, model_path='yolov8n.pt', confidence=0.5):
+    """
+    Ask the daemon to run detection on an image file
+
+    Returns:
+        DetectionResult or None if the daemon is not running
+    """
+    if os.environ.get('BUS_DETECTION_NO_DAEMON') == '1' or not os.path.exists(SOCKET_PATH):
+        return None
+    if '://' in str(image_path):
+        return None  # remote images are fetched by the caller; the daemon reads local files only
+    try:
+        reply = _send_request({
+            'op': 'detect',
+            'image_path': os.path.abspath(image_path),
+            'model_path': _resolve_model_path(model_path),
+            'confidence': confidence,
+        })
+    except (OSError, ValueError):
+        return None
+    if not reply.get('ok'):
+        raise RuntimeError(f"Detection daemon error: {reply.get('error')}")
+    return DetectionResult.from_json(reply['result'])
+
+
+def use_daemon():
+    """True when detect() will send local images to a running daemon"""
+    return os.environ.get('BUS_DETECTION_NO_DAEMON') != '1' and daemon_available()
+
+
+def detect(image_path, preloaded=None, model_path='yolov8n.pt', confidence=0.5):
+    """
+    Detect objects, on the daemon when it is running, otherwise in-process
+
+    The daemon reads local files itself, so nothing is decoded here in that
+    case; otherwise the preloaded (or a freshly) reduced decode is used.
+
+    Args:
+        image_path (str): Path or URI of the image (local paths go to the daemon)
+        preloaded (Preloaded): Image already fetched and decoded at reduced
+                               scale (see fast_image_loader.py), or None
+        model_path (str): Path to the YOLO model file
+        confidence (float): Minimum confidence for detections
+
+    Returns:
+        DetectionResult: Detections in original-image pixels, or None if the
+                         image could not be read
+    """
+    detection = detect_remote(image_path, model_path, confidence)
+    if detection is not None:
+        print(f"⚡ Using detection daemon at {SOCKET_PATH}")
+        return detection  # the daemon answers in original-image pixels
+
+    if preloaded is not None and preloaded.image is not None:
+        image, scale = preloaded.image, preloaded.scale
+    elif '://' in str(image_path):
+        from remote_io import read_bytes
+        from fast_image_loader import decode_image
+        image, scale = decode_image(read_bytes(image_path))
+    else:
+        from fast_image_loader import load_image
+        image, scale = load_image(image_path)
+    if image is None:
+        return None
+
+    # Imported here so the daemon path never pays for importing torch
+    from model_loader import is_loaded, load_model
+
+    if not is_loaded(model_path):
+        print("🔍 Loading YOLO model...")
+    model = load_model(model_path)
+    results = model(image, conf=confidence, verbose=False)
+    return DetectionResult.from_ultralytics(results[0], model.names).scaled(*scale)
+
+
+class _DetectionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            reply = self.server.dispatch(json.loads(line))
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e)}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class DetectionDaemon(socketserver.UnixStreamServer):
+    """
+    Single-threaded Unix socket server; requests are served one at a time,
+    so each model is only ever used by one request
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, preload=()):
+        from model_loader import load_model
+        from fast_image_loader import load_image
+
+        self._load_model = load_model
+        self._load_image = load_image
+        self.requests = 0
+        for model_path in preload:
+            start = time.perf_counter()
+            load_model(_resolve_model_path(model_path))
+            print(f"🔥 {model_path} loaded and warmed up in {time.perf_counter() - start:.2f}s")
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        super().__init__(socket_path, _DetectionHandler)
+        os.chmod(socket_path, 0o600)
+
+    def dispatch(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok': True, 'requests': self.requests}
+        if op == 'stop':
+            # shutdown() waits for serve_forever, so it must run off this thread
+            import threading
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'ok': True}
+        if op == 'detect':
+            image, scale = self._load_image(request['image_path'])
+            if image is None:
+                return {'ok': False, 'error': f"Could not load image {request['image_path']}"}
+            model = self._load_model(request.get('model_path', 'yolov8n.pt'))
+            results = model(image, conf=request.get('confidence', 0.5), verbose=False)
+            self.requests += 1
+            detection = DetectionResult.from_ultralytics(results[0], model.names).scaled(*scale)
+            return {'ok': True, 'result': detection.to_json()}
+        return {'ok': False, 'error': f"Unknown op: {op}"}
+
+
+def serve(preload=('yolov8n.pt',)):
+    print("🛰️  YOLO Detection Daemon")
+    print("=" * 40)
+    print(f"🔌 Socket: {SOCKET_PATH}")
+    print("=" * 40)
+
+    if daemon_available():
+        print("⚠️  A daemon is already running on this socket")
+        return
+
+    server = DetectionDaemon(SOCKET_PATH, preload)
+    print("✅ Ready for requests (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+        print(f"\n👋 Daemon stopped after {server.requests} requests")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--stop':
+        try:
+            _send_request({'op': 'stop'}, timeout=5.0)
+            print("✅ Stop requested")
+        except OSError:
+            print("❌ No daemon running")
+    elif len(sys.argv) > 1 and sys.argv[1] == '--ping':
+        print("✅ Daemon is running" if daemon_available() else "❌ No daemon running")
+    else:
+        serve(sys.argv[1:] or ('yolov8n.pt',))
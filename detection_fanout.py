@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+One inference pass fanned out to several consumers
+Each image is run through the model once; every registered consumer (car view,
+allowed-classes view, JSON export, ...) derives its output from the same
+DetectionResult. Inference uses a reduced decode; views that draw get one
+full-resolution decode, made only if some consumer asks for it.
+
+Usage: python detection_fanout.py <image_path> [<image_path> ...]
+"""
+
+from model_loader import load_model
+from detection_results import DetectionResult
+from fast_image_loader import Preloaded, full_resolution, load_image
+import detect_cars
+import detect_image
+import json
+import sys
+import os
+from pathlib import Path
+
+
+class DetectionFanOut:
+    """
+    Runs the model once per image and hands the result to every consumer
+
+    A consumer is any callable `consumer(image_path, full_image, detection)`,
+    where `detection` is in original-image pixels and `full_image()` returns
+    a full-resolution copy to draw on (decoded on first use); its return
+    value is collected under the name it was registered with.
+    """
+
+    def __init__(self, model_path='yolov8n.pt', confidence=0.5):
+        self.model = load_model(model_path)
+        self.confidence = confidence
+        self.consumers = {}
+        self.inference_count = 0
+
+    def register(self, name, consumer):
+        self.consumers[name] = consumer
+        return self
+
+    def run(self, image_path):
+        """
+        Decode, detect and fan out one image
+
+        Returns:
+            dict: consumer name -> consumer output (None if the image could not be read)
+        """
+        image, scale = load_image(image_path)
+        if image is None:
+            print(f"❌ Error: Could not load image {image_path}")
+            return None
+
+        results = self.model(image, conf=self.confidence, verbose=False)
+        self.inference_count += 1
+        detection = DetectionResult.from_ultralytics(results[0], self.model.names).scaled(*scale)
+
+        preloaded = Preloaded(image, scale)
+        decoded = []
+
+        def full_image():
+            if not decoded:
+                decoded.append(full_resolution(image_path, preloaded))
+            return decoded[0].copy()
+
+        outputs = {}
+        for name, consumer in self.consumers.items():
+            try:
+                outputs[name] = consumer(image_path, full_image, detection)
+            except Exception as e:
+                # One broken view must not cost the other consumers their output
+                print(f"❌ Consumer '{name}' failed on {image_path}: {e}")
+                outputs[name] = None
+        return outputs
+
+
+def car_view_consumer(image_path, full_image, detection):
+    """Car-only view, same drawing and output path as detect_cars.py"""
+    cars, annotated_image = detect_cars.annotate_cars(full_image(), detection)
+    detect_cars.save_result(image_path, annotated_image)
+    return cars
+
+
+def allowed_classes_consumer(image_path, full_image, detection):
+    """Allowed-classes view, same drawing and output path as detect_image.py"""
+    detections, annotated_image = detect_image.annotate_allowed_classes(full_image(), detection)
+    detect_image.save_result(image_path, annotated_image)
+    return detections
+
+
+class JsonExportConsumer:
+    """Writes every detection of an image to <output_dir>/<stem>.json"""
+
+    def __init__(self, output_dir="results/detections"):
+        self.output_dir = output_dir
+
+    def __call__(self, image_path, full_image, detection):
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_path = os.path.join(self.output_dir, f"{Path(image_path).stem}.json")
+        with open(output_path, 'w') as f:
+            json.dump({
+                'image': image_path,
+                'width': detection.image_shape[1],
+                'height': detection.image_shape[0],
+                'detections': detection.to_dicts(),
+            }, f, indent=2)
+        return output_path
+
+
+def default_fanout(model_path='yolov8n.pt', confidence=0.5):
+    """Fan-out with the car view, allowed-classes view and JSON export registered"""
+    return (DetectionFanOut(model_path, confidence)
+            .register('cars', car_view_consumer)
+            .register('allowed', allowed_classes_consumer)
+            .register('json', JsonExportConsumer()))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python detection_fanout.py <image_path> [<image_path> ...]")
+        sys.exit(1)
+
+    fanout = default_fanout()
+    for image_path in sys.argv[1:]:
+        outputs = fanout.run(image_path)
+        if outputs is None:
+            continue
+        print(f"✅ {image_path}: {len(outputs['cars'] or [])} cars, "
+              f"{len(outputs['allowed'] or [])} objects (filtered), JSON: {outputs['json']}")
+    print(f"🔢 Inference passes: {fanout.inference_count}")
@@ -0,0 +1,178 @@
+"""
+Plain-array detection results shared by the detection scripts
+Decouples boxes/scores/classes from ultralytics Results so one forward pass can be
+filtered, drawn, exported or sent between processes without touching the model.
+"""
+
+import numpy as np
+
+
+class DetectionResult:
+    """
+    Detections for one image as NumPy arrays
+
+    Attributes:
+        boxes (np.ndarray): (N, 4) float32 xyxy boxes in image pixels
+        scores (np.ndarray): (N,) float32 confidences
+        class_ids (np.ndarray): (N,) int class ids
+        names (dict): Class id -> class name
+        image_shape (tuple): (height, width) of the image the boxes refer to
+    """
+
+    def __init__(self, boxes, scores, class_ids, names, image_shape=None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        self.names = names
+        self.image_shape = tuple(image_shape) if image_shape is not None else None
+
+    @classmethod
+    def from_ultralytics(cls, result, names=None):
+        """Build from one ultralytics Results object"""
+        names = names if names is not None else result.names
+        image_shape = result.orig_shape
+        if result.boxes is None or len(result.boxes) == 0:
+            return cls.empty(names, image_shape)
+        boxes = result.boxes
+        return cls(
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy().astype(np.int64),
+            names,
+            image_shape,
+        )
+
+    @classmethod
+    def empty(cls, names, image_shape=None):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0), names, image_shape)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __iter__(self):
+        """Yield (x1, y1, x2, y2, confidence, class_name) with integer pixel coordinates"""
+        for box, conf, class_id in zip(self.boxes.astype(int), self.scores, self.class_ids):
+            x1, y1, x2, y2 = (int(v) for v in box)
+            yield x1, y1, x2, y2, float(conf), self.names[int(class_id)]
+
+    def select(self, mask):
+        """Subset by boolean mask or index array"""
+        return DetectionResult(self.boxes[mask], self.scores[mask], self.class_ids[mask],
+                               self.names, self.image_shape)
+
+    def scaled(self, scale_x, scale_y):
+        """Boxes multiplied by per-axis scale factors (e.g. back to original-image pixels)"""
+        factors = np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+        image_shape = None
+        if self.image_shape is not None:
+            image_shape = (int(round(self.image_shape[0] * scale_y)), int(round(self.image_shape[1] * scale_x)))
+        return DetectionResult(self.boxes * factors, self.scores, self.class_ids, self.names, image_shape)
+
+    def filter_classes(self, class_names):
+        """Keep only detections whose class name is in `class_names`"""
+        wanted = [i for i, name in self.names.items() if name in class_names]
+        return self.select(np.isin(self.class_ids, wanted))
+
+    def to_dicts(self):
+        """Detections in the dict layout used by bus_detection.py and detect_cars.py"""
+        detections = []
+        for x1, y1, x2, y2, conf, class_name in self:
+            detections.append({
+                'class': class_name,
+                'confidence': conf,
+                'bbox': {
+                    'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                    'width': x2 - x1, 'height': y2 - y1
+                }
+            })
+        return detections
+
+    def to_json(self):
+        """JSON-serialisable form (see from_json)"""
+        return {
+            'boxes': self.boxes.tolist(),
+            'scores': self.scores.tolist(),
+            'class_ids': self.class_ids.tolist(),
+            'names': {int(k): v for k, v in self.names.items()},
+            'image_shape': list(self.image_shape) if self.image_shape is not None else None,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        names = {int(k): v for k, v in data['names'].items()}
+        return cls(data['boxes'], data['scores'], data['class_ids'], names, data.get('image_shape'))
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Pairwise IoU between two sets of xyxy boxes
+
+    Returns:
+        np.ndarray: (len(boxes_a), len(boxes_b)) IoU matrix
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(1, -1, 4)
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def match_detections(pred, ref, iou_threshold=0.5):
+    """
+    Greedy one-to-one matching of `pred` against `ref` (same class, by score)
+
+    Returns:
+        int: Number of matched (true positive) detections
+    """
+    if len(pred) == 0 or len(ref) == 0:
+        return 0
+    iou = box_iou(pred.boxes, ref.boxes)
+    iou[pred.class_ids[:, None] != ref.class_ids[None, :]] = 0
+    matched_ref = np.zeros(len(ref), dtype=bool)
+    matches = 0
+    for i in np.argsort(-pred.scores):
+        candidates = np.where(~matched_ref & (iou[i] >= iou_threshold))[0]
+        if len(candidates):
+            j = candidates[np.argmax(iou[i, candidates])]
+            matched_ref[j] = True
+            matches += 1
+    return matches
+
+
+def nms(detection, iou_threshold=0.5):
+    """
+    Class-wise non-maximum suppression
+
+    Returns:
+        DetectionResult: Surviving detections, highest score first
+    """
+    order = np.argsort(-detection.scores)
+    keep = []
+    suppressed = np.zeros(len(detection), dtype=bool)
+    iou = box_iou(detection.boxes, detection.boxes)
+    same_class = detection.class_ids[:, None] == detection.class_ids[None, :]
+    overlaps = (iou > iou_threshold) & same_class
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= overlaps[i]
+    return detection.select(np.array(keep, dtype=np.int64))
+
+
+def concat_detections(detections, names=None, image_shape=None):
+    """Concatenate several DetectionResults for the same image"""
+    detections = list(detections)
+    if not detections:
+        return DetectionResult.empty(names or {}, image_shape)
+    first = detections[0]
+    return DetectionResult(
+        np.concatenate([d.boxes for d in detections]),
+        np.concatenate([d.scores for d in detections]),
+        np.concatenate([d.class_ids for d in detections]),
+        names if names is not None else first.names,
+        image_shape if image_shape is not None else first.image_shape,
+    )
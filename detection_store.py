@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Append-only columnar store for per-frame detections
+Detections are written as memory-mapped NumPy segments so long recordings can be
+queried by time range and class without re-running inference.
+
+Usage:
+  python detection_store.py <store_dir>
+  python detection_store.py <store_dir> --between 07:00 09:00 [--class bus] [--per 60]
+"""
+
+import numpy as np
+import datetime
+import json
+import os
+import sys
+
+# 24 bytes per detection: boxes are stored as whole pixels, scores as float16;
+# class ids take two bytes so models with more than 256 classes fit
+DETECTION_DTYPE = np.dtype([
+    ('frame', '<u4'),
+    ('timestamp', '<f8'),
+    ('class_id', '<u2'),
+    ('score', '<f2'),
+    ('box', '<u2', (4,)),
+])
+
+INDEX_FILE = "index.json"
+SEGMENT_ROWS = 1 << 16
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class DetectionStoreWriter:
+    """
+    Appends detections to a store directory, one `.npy` segment per
+    `segment_rows` detections. Rows must arrive in timestamp order.
+
+    An existing store at `store_path` is replaced unless `append=True`, in
+    which case new rows continue after its last segment and must not be
+    older than its newest row.
+    """
+
+    def __init__(self, store_path, class_names=None, fps=None, start_epoch=None, segment_rows=SEGMENT_ROWS,
+                 append=False):
+        self.store_path = store_path
+        self.segment_rows = segment_rows
+        os.makedirs(store_path, exist_ok=True)
+
+        index_path = os.path.join(store_path, INDEX_FILE)
+        self.index = {'segments': []}
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                previous = json.load(f)
+            if append:
+                self.index = previous
+            else:
+                for segment in previous.get('segments', []):
+                    segment_path = os.path.join(store_path, segment['file'])
+                    if os.path.exists(segment_path):
+                        os.remove(segment_path)
+                os.remove(index_path)
+        segments = self.index['segments']
+        self._t_last = segments[-1]['t_max'] if segments else None
+        if class_names is not None:
+            self.index['names'] = {int(k): v for k, v in dict(class_names).items()}
+        if fps is not None:
+            self.index['fps'] = float(fps)
+        if start_epoch is not None:
+            self.index['start_epoch'] = float(start_epoch)
+
+        self._buffer = np.zeros(segment_rows, dtype=DETECTION_DTYPE)
+        self._rows = 0
+
+    def append(self, frame_index, timestamp, class_ids, scores, boxes):
+        """
+        Append all detections of one frame
+
+        Args:
+            frame_index (int): Frame number in the source video
+            timestamp (float): Frame time in seconds (relative or epoch)
+            class_ids (array): (N,) class ids
+            scores (array): (N,) confidences
+            boxes (array): (N, 4) xyxy boxes in pixels
+        """
+        if self._t_last is not None and timestamp < self._t_last:
+            raise ValueError(f"Detections must be appended in timestamp order "
+                             f"({timestamp} is older than {self._t_last} already in {self.store_path})")
+        self._t_last = timestamp
+        n = len(class_ids)
+        offset = 0
+        while offset < n:
+            take = min(n - offset, self.segment_rows - self._rows)
+            rows = self._buffer[self._rows:self._rows + take]
+            rows['frame'] = frame_index
+            rows['timestamp'] = timestamp
+            rows['class_id'] = np.asarray(class_ids[offset:offset + take])
+            rows['score'] = np.asarray(scores[offset:offset + take])
+            rows['box'] = np.clip(np.rint(np.asarray(boxes[offset:offset + take])), 0, 65535)
+            self._rows += take
+            offset += take
+            if self._rows == self.segment_rows:
+                self.flush()
+
+    def flush(self):
+        """Write buffered rows as a new immutable segment"""
+        if self._rows == 0:
+            return
+        rows = self._buffer[:self._rows]
+        name = f"segment_{len(self.index['segments']):06d}.npy"
+        tmp_path = os.path.join(self.store_path, name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, rows)
+        os.replace(tmp_path, os.path.join(self.store_path, name))
+
+        self.index['segments'].append({
+            'file': name,
+            'rows': int(self._rows),
+            'frame_min': int(rows['frame'][0]),
+            'frame_max': int(rows['frame'][-1]),
+            't_min': float(rows['timestamp'][0]),
+            't_max': float(rows['timestamp'][-1]),
+            'classes': sorted(int(c) for c in np.unique(rows['class_id'])),
+        })
+        _write_json_atomic(os.path.join(self.store_path, INDEX_FILE), self.index)
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+        # Persist metadata even when no detection was ever written
+        _write_json_atomic(os.path.join(self.store_path, INDEX_FILE), self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DetectionStore:
+    """Read-only view over a detection store directory"""
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+        with open(os.path.join(store_path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.names = {int(k): v for k, v in self.index.get('names', {}).items()}
+        self.fps = self.index.get('fps')
+        self.start_epoch = self.index.get('start_epoch')
+
+    def class_ids(self, classes):
+        """Translate class names (or ids) into a set of class ids"""
+        if classes is None:
+            return None
+        by_name = {v: k for k, v in self.names.items()}
+        unknown = [c for c in classes if isinstance(c, str) and c not in by_name]
+        if unknown:
+            raise ValueError(f"Unknown class name(s) {', '.join(unknown)}; "
+                             f"valid names: {', '.join(sorted(by_name))}")
+        return {by_name[c] if isinstance(c, str) else int(c) for c in classes}
+
+    @property
+    def num_detections(self):
+        return sum(s['rows'] for s in self.index['segments'])
+
+    @property
+    def time_range(self):
+        segments = self.index['segments']
+        if not segments:
+            return None
+        return segments[0]['t_min'], segments[-1]['t_max']
+
+    def query(self, t_start=None, t_end=None, classes=None):
+        """
+        Return detections with t_start <= timestamp < t_end
+
+        Segments whose time range or class set cannot match are skipped
+        without being opened; the rest are memory-mapped and sliced with a
+        binary search on the (sorted) timestamp column.
+
+        Returns:
+            np.ndarray: Structured array with DETECTION_DTYPE
+        """
+        wanted = self.class_ids(classes)
+        lo = -np.inf if t_start is None else t_start
+        hi = np.inf if t_end is None else t_end
+
+        parts = []
+        for seg in self.index['segments']:
+            if seg['t_max'] < lo or seg['t_min'] >= hi:
+                continue
+            if wanted is not None and not wanted.intersection(seg['classes']):
+                continue
+            rows = np.load(os.path.join(self.store_path, seg['file']), mmap_mode='r')
+            ts = rows['timestamp']
+            a = np.searchsorted(ts, lo, side='left')
+            b = np.searchsorted(ts, hi, side='left')
+            rows = rows[a:b]
+            if wanted is not None:
+                rows = rows[np.isin(rows['class_id'], list(wanted))]
+            # Stores written before class ids were widened have one-byte ids
+            parts.append(np.asarray(rows, dtype=DETECTION_DTYPE))
+
+        if not parts:
+            return np.zeros(0, dtype=DETECTION_DTYPE)
+        return np.concatenate(parts)
+
+    def detections_per_interval(self, t_start, t_end, interval=60.0, classes=None):
+        """
+        Detection rows per interval between t_start and t_end
+
+        A vehicle in view for N frames is N rows, so the row count measures
+        presence over time, not distinct vehicles; the per-frame peak is the
+        most detections seen together in one frame of the interval.
+
+        Returns:
+            tuple: (bucket start times, detection rows, mean detections per
+                    frame or None without fps, peak detections in one frame)
+        """
+        rows = self.query(t_start, t_end, classes)
+        n_buckets = max(1, int(np.ceil((t_end - t_start) / interval)))
+        buckets = ((rows['timestamp'] - t_start) // interval).astype(np.int64)
+        counts = np.bincount(buckets, minlength=n_buckets)[:n_buckets]
+        starts = t_start + interval * np.arange(n_buckets)
+        per_frame = counts / (interval * self.fps) if self.fps else None
+
+        # Rows of a frame are contiguous, so run lengths of the frame column are per-frame counts
+        peaks = np.zeros(n_buckets, dtype=np.int64)
+        if len(rows):
+            first = np.flatnonzero(np.r_[True, rows['frame'][1:] != rows['frame'][:-1]])
+            frame_counts = np.diff(np.r_[first, len(rows)])
+            np.maximum.at(peaks, np.minimum(buckets[first], n_buckets - 1), frame_counts)
+        return starts, counts, per_frame, peaks
+
+    def day_ranges(self, start_hm, end_hm):
+        """
+        (t_start, t_end) pairs for a daily clock window such as 07:00-09:00
+
+        Requires the store to have been written with `start_epoch`, so
+        timestamps are epoch seconds.
+        """
+        if self.start_epoch is None or self.time_range is None:
+            raise ValueError("Store has no start_epoch; clock-time queries need absolute timestamps")
+        t_min, t_max = self.time_range
+        h0, m0 = map(int, start_hm.split(':'))
+        h1, m1 = map(int, end_hm.split(':'))
+        day = datetime.datetime.fromtimestamp(t_min).date()
+        last_day = datetime.datetime.fromtimestamp(t_max).date()
+        ranges = []
+        while day <= last_day:
+            a = datetime.datetime.combine(day, datetime.time(h0, m0)).timestamp()
+            b = datetime.datetime.combine(day, datetime.time(h1, m1)).timestamp()
+            if b > t_min and a <= t_max:
+                ranges.append((a, b))
+            day += datetime.timedelta(days=1)
+        return ranges
+
+
+def frame_time(fps, frame_index, start_epoch=None):
+    """Timestamp for a frame, in epoch seconds when start_epoch is known"""
+    t = frame_index / fps if fps else float(frame_index)
+    return t + start_epoch if start_epoch is not None else t
+
+
+def print_summary(store_path, between=None, classes=None, interval=60.0):
+    store = DetectionStore(store_path)
+    print("🗄️  Detection Store")
+    print("=" * 40)
+    print(f"📂 Store: {store_path}")
+    print(f"📦 Segments: {len(store.index['segments'])}")
+    print(f"🎯 Detections: {store.num_detections:,}")
+    if store.fps:
+        print(f"🎬 FPS: {store.fps}")
+    print("=" * 40)
+
+    if store.time_range is None:
+        return
+    if between:
+        ranges = store.day_ranges(*between)
+    else:
+        ranges = [(store.time_range[0], store.time_range[1] + 1e-6)]
+
+    label = ", ".join(classes) if classes else "all classes"
+    for t_start, t_end in ranges:
+        starts, counts, per_frame, peaks = store.detections_per_interval(t_start, t_end, interval, classes)
+        print(f"\n📊 {label}: detections per {interval:g}s (rows, not distinct vehicles)")
+        for i, (start, count) in enumerate(zip(starts, counts)):
+            if store.start_epoch is not None:
+                when = datetime.datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M:%S')
+            else:
+                when = f"{start:10.1f}s"
+            extra = [f"{per_frame[i]:.2f}/frame"] if per_frame is not None else []
+            extra.append(f"peak {peaks[i]} in one frame")
+            print(f"  {when}: {count} ({', '.join(extra)})")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python detection_store.py <store_dir>")
+        print("  python detection_store.py <store_dir> --between 07:00 09:00 [--class bus] [--per 60]")
+        sys.exit(1)
+
+    args = sys.argv[2:]
+    between = None
+    classes = None
+    interval = 60.0
+    i = 0
+    while i < len(args):
+        if args[i] == '--between':
+            between = (args[i + 1], args[i + 2])
+            i += 3
+        elif args[i] == '--class':
+            classes = (classes or []) + [args[i + 1]]
+            i += 2
+        elif args[i] == '--per':
+            interval = float(args[i + 1])
+            i += 2
+        else:
+            print(f"❌ Unknown option: {args[i]}")
+            sys.exit(1)
+
+    try:
+        print_summary(sys.argv[1], between, classes, interval)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
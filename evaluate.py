@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Accuracy vs. speed evaluation
+Runs detection configurations over a labeled local dataset and reports, for the
+bus/car/truck classes, precision and recall at the operating confidence plus
+mAP@0.5 and mAP@0.5:0.95, together with the measured time per image. Prints a
+table of all configurations with the Pareto-optimal ones (nothing else is both
+faster and more accurate) marked.
+
+Datasets:
+  YOLO txt   folder of images; labels in the sibling labels/ folder (ultralytics
+             layout) or next to each image. Class names come from a data.yaml
+             next to the images/labels folders, or default to the model's.
+  COCO JSON  instances JSON; images from --images (default: the JSON's folder)
+
+Configurations (--config, repeatable):
+  yolov8n.pt@640            model at an input size
+  yolov8n.pt@640+classes    NMS restricted to bus/car/truck
+  yolov8n.pt@640+bf16       optimized CPU graph (bf16|fp32, see cpu_optimized.py)
+  cascade                   yolov8n screening + yolov8x confirmation (+frame for frame mode)
+
+Usage:
+  python evaluate.py <images_dir|instances.json> [--images DIR] [--config SPEC ...] [--limit N] [--conf 0.25]
+"""
+
+from detection_results import DetectionResult, box_iou
+from pathlib import Path
+import numpy as np
+import json
+import time
+import sys
+import os
+
+EVAL_CLASSES = ('bus', 'car', 'truck')
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+DEFAULT_CONFIGS = ('yolov8n.pt@640', 'yolov8n.pt@480', 'yolov8n.pt@320',
+                   'yolov8n.pt@640+classes', 'yolov8x.pt@640')
+# mAP is computed over the full score range, as ultralytics val does
+EVAL_CONFIDENCE = 0.001
+
+
+# ----- datasets ---------------------------------------------------------------
+
+class GroundTruth:
+    """
+    Labels for one image
+
+    Attributes:
+        boxes (np.ndarray): (N, 4) xyxy boxes, in pixels or normalized
+        labels (list): Class name per box
+        normalized (bool): Boxes are fractions of the image size
+    """
+
+    __slots__ = ('image_path', 'boxes', 'labels', 'normalized')
+
+    def __init__(self, image_path, boxes, labels, normalized=False):
+        self.image_path = str(image_path)
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.labels = list(labels)
+        self.normalized = normalized
+
+    def pixel_boxes(self, width, height):
+        if self.normalized:
+            return self.boxes * np.array([width, height, width, height], dtype=np.float32)
+        return self.boxes
+
+
+def _yolo_names(images_dir):
+    """Class names from a data.yaml near the images, or None"""
+    for folder in (Path(images_dir), Path(images_dir).parent, Path(images_dir).parent.parent):
+        for name in ('data.yaml', 'dataset.yaml'):
+            path = folder / name
+            if path.exists():
+                import yaml
+                with open(path) as f:
+                    names = yaml.safe_load(f).get('names')
+                if isinstance(names, list):
+                    names = dict(enumerate(names))
+                return {int(k): v for k, v in names.items()} if names else None
+    return None
+
+
+def _label_path(image_path):
+    """ultralytics layout (.../images/x.jpg -> .../labels/x.txt), else next to the image"""
+    parts = list(image_path.parts)
+    if 'images' in parts:
+        i = len(parts) - 1 - parts[::-1].index('images')
+        parts[i] = 'labels'
+        candidate = Path(*parts).with_suffix('.txt')
+        if candidate.exists():
+            return candidate
+    return image_path.with_suffix('.txt')
+
+
+def load_yolo_dataset(images_dir, names=None):
+    """
+    Returns:
+        tuple: (list of GroundTruth, class names dict or None)
+    """
+    names = names or _yolo_names(images_dir)
+    items = []
+    for image_path in sorted(p for p in Path(images_dir).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS):
+        boxes, labels = [], []
+        label_path = _label_path(image_path)
+        if label_path.exists():
+            for line in label_path.read_text().splitlines():
+                values = line.split()
+                if len(values) < 5:
+                    continue
+                class_id = int(values[0])
+                cx, cy, w, h = (float(v) for v in values[1:5])
+                boxes.append((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2))
+                labels.append(class_id)  # resolved to names once they are known
+        items.append(GroundTruth(image_path, boxes, labels, normalized=True))
+    return items, names
+
+
+def load_coco_dataset(json_path, images_dir=None):
+    """
+    Returns:
+        tuple: (list of GroundTruth, class names dict)
+    """
+    with open(json_path) as f:
+        coco = json.load(f)
+    images_dir = Path(images_dir or os.path.dirname(os.path.abspath(json_path)))
+    names = {c['id']: c['name'] for c in coco.get('categories', [])}
+    per_image = {img['id']: ([], []) for img in coco['images']}
+    for ann in coco.get('annotations', []):
+        if ann.get('iscrowd', 0) or ann['image_id'] not in per_image:
+            continue
+        x, y, w, h = ann['bbox']
+        boxes, labels = per_image[ann['image_id']]
+        boxes.append((x, y, x + w, y + h))
+        labels.append(names.get(ann['category_id'], str(ann['category_id'])))
+    items = [GroundTruth(images_dir / img['file_name'], *per_image[img['id']]) for img in coco['images']]
+    return items, names
+
+
+def load_dataset(source, images_dir=None):
+    if str(source).lower().endswith('.json'):
+        return load_coco_dataset(source, images_dir)
+    return load_yolo_dataset(source)
+
+
+# ----- metrics ----------------------------------------------------------------
+
+def match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes, iou_thresholds=IOU_THRESHOLDS):
+    """
+    One-to-one matching of predictions to ground truth at every IoU threshold
+
+    Pairs are taken in order of decreasing IoU; each prediction and each
+    ground-truth box is used at most once per threshold.
+
+    Returns:
+        np.ndarray: (num_predictions, num_thresholds) bool, True for true positives
+    """
+    tp = np.zeros((len(pred_boxes), len(iou_thresholds)), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return tp
+    iou = box_iou(gt_boxes, pred_boxes)
+    iou[gt_classes[:, None] != pred_classes[None, :]] = 0
+    for k, threshold in enumerate(iou_thresholds):
+        gi, pi = np.nonzero(iou >= threshold)
+        if len(gi) == 0:
+            continue
+        order = np.argsort(-iou[gi, pi], kind='stable')
+        gi, pi = gi[order], pi[order]
+        _, first = np.unique(pi, return_index=True)
+        first.sort()  # keep the IoU order
+        gi, pi = gi[first], pi[first]
+        _, first = np.unique(gi, return_index=True)
+        tp[pi[first], k] = True
+    return tp
+
+
+def average_precision(tp, scores, pred_classes, gt_counts):
+    """
+    101-point interpolated AP per class and IoU threshold (COCO definition)
+
+    Returns:
+        np.ndarray: (num_classes, num_thresholds) AP, NaN for classes without ground truth
+    """
+    num_classes, num_thresholds = len(gt_counts), tp.shape[1]
+    ap = np.full((num_classes, num_thresholds), np.nan)
+    grid = np.linspace(0, 1, 101)
+    order = np.argsort(-scores, kind='stable')
+    tp, pred_classes = tp[order], pred_classes[order]
+    for c in range(num_classes):
+        if gt_counts[c] == 0:
+            continue
+        hits = tp[pred_classes == c]
+        if len(hits) == 0:
+            ap[c] = 0.0
+            continue
+        tpc = np.cumsum(hits, axis=0)
+        fpc = np.cumsum(~hits, axis=0)
+        recall = tpc / gt_counts[c]
+        precision = tpc / (tpc + fpc)
+        # Precision envelope: best precision at this recall or higher
+        precision = np.flip(np.maximum.accumulate(np.flip(precision, 0), axis=0), 0)
+        for k in range(num_thresholds):
+            idx = np.searchsorted(recall[:, k], grid, side='left')
+            ap[c, k] = np.where(idx < len(hits), precision[np.minimum(idx, len(hits) - 1), k], 0.0).mean()
+    return ap
+
+
+class Accumulator:
+    """Collects per-image matches and turns them into P/R/mAP for `classes`"""
+
+    def __init__(self, classes=EVAL_CLASSES):
+        self.classes = tuple(classes)
+        self._index = {name: i for i, name in enumerate(self.classes)}
+        self._tp, self._scores, self._pred_classes = [], [], []
+        self.gt_counts = np.zeros(len(self.classes), dtype=np.int64)
+
+    def _encode(self, labels):
+        return np.array([self._index.get(label, -1) for label in labels], dtype=np.int64)
+
+    def add(self, detection, gt_boxes, gt_labels):
+        pred_classes = self._encode([detection.names[int(c)] for c in detection.class_ids])
+        keep = pred_classes >= 0
+        gt_classes = self._encode(gt_labels)
+        gt_keep = gt_classes >= 0
+        gt_classes = gt_classes[gt_keep]
+        self.gt_counts += np.bincount(gt_classes, minlength=len(self.classes))
+        tp = match_predictions(detection.boxes[keep], pred_classes[keep], gt_boxes[gt_keep], gt_classes)
+        self._tp.append(tp)
+        self._scores.append(detection.scores[keep])
+        self._pred_classes.append(pred_classes[keep])
+
+    def compute(self, confidence=0.25):
+        tp = np.concatenate(self._tp) if self._tp else np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool)
+        scores = np.concatenate(self._scores) if self._scores else np.zeros(0)
+        pred_classes = np.concatenate(self._pred_classes) if self._pred_classes else np.zeros(0, dtype=np.int64)
+        ap = average_precision(tp, scores, pred_classes, self.gt_counts)
+
+        metrics = {'per_class': {}}
+        operating = scores >= confidence
+        for c, name in enumerate(self.classes):
+            if self.gt_counts[c] == 0:
+                continue
+            sel = operating & (pred_classes == c)
+            hits = int(tp[sel, 0].sum())
+            metrics['per_class'][name] = {
+                'instances': int(self.gt_counts[c]),
+                'precision': hits / max(1, int(sel.sum())),
+                'recall': hits / int(self.gt_counts[c]),
+                'map50': float(ap[c, 0]),
+                'map50_95': float(ap[c].mean()),
+            }
+        hits = int(tp[operating, 0].sum())
+        n_gt = int(self.gt_counts.sum())
+        metrics['precision'] = hits / max(1, int(operating.sum()))
+        metrics['recall'] = hits / n_gt if n_gt else 0.0
+        valid = ~np.isnan(ap[:, 0])
+        metrics['map50'] = float(ap[valid, 0].mean()) if valid.any() else 0.0
+        metrics['map50_95'] = float(ap[valid].mean()) if valid.any() else 0.0
+        return metrics
+
+
+# ----- configurations ---------------------------------------------------------
+
+def build_detector(spec, classes=EVAL_CLASSES):
+    """
+    Detector for a configuration string (see module docstring)
+
+    Returns:
+        tuple: (imgsz, callable(image) -> DetectionResult)
+    """
+    base, *flags = spec.split('+')
+    if base == 'cascade':
+        from cascade_detection import CascadeDetector
+        cascade = CascadeDetector(mode='frame' if 'frame' in flags else 'crop', confidence=EVAL_CONFIDENCE)
+        return 640, lambda image: cascade.detect_batch([image])[0]
+
+    model_path, _, imgsz = base.partition('@')
+    imgsz = int(imgsz) if imgsz else 640
+    precision = next((f for f in flags if f in ('bf16', 'fp32')), None)
+    if precision:
+        from ultralytics import YOLO
+        from cpu_optimized import build_optimized
+        from model_loader import warmup_model
+        model = YOLO(build_optimized(model_path, imgsz, precision), task='detect')
+        warmup_model(model, imgsz)
+    else:
+        from model_loader import load_model
+        model = load_model(model_path, imgsz)
+
+    class_ids = None
+    if 'classes' in flags:
+        class_ids = [i for i, name in model.names.items() if name in classes]
+
+    def detect(image):
+        results = model(image, imgsz=imgsz, conf=EVAL_CONFIDENCE, classes=class_ids, verbose=False)
+        return DetectionResult.from_ultralytics(results[0], model.names)
+
+    return imgsz, detect
+
+
+def evaluate_config(spec, items, names, confidence=0.25, classes=EVAL_CLASSES):
+    """
+    Run one configuration over the dataset
+
+    Returns:
+        dict: Metrics plus ms_per_image (decode + inference)
+    """
+    from fast_image_loader import load_image
+
+    imgsz, detect = build_detector(spec, classes)
+    accumulator = Accumulator(classes)
+    elapsed = 0.0
+    images = 0
+    for n, item in enumerate(items):
+        start = time.perf_counter()
+        image, (sx, sy) = load_image(item.image_path, imgsz)
+        if image is None:
+            print(f"⚠️  Could not read {item.image_path}")
+            continue
+        detection = detect(image)
+        if n > 0:  # the first image also pays for lazy initialisation
+            elapsed += time.perf_counter() - start
+            images += 1
+        if sx != 1.0 or sy != 1.0:
+            detection = detection.scaled(sx, sy)
+        height, width = round(image.shape[0] * sy), round(image.shape[1] * sx)
+        labels = [names.get(label, str(label)) if isinstance(label, int) else label for label in item.labels]
+        accumulator.add(detection, item.pixel_boxes(width, height), labels)
+
+    metrics = accumulator.compute(confidence)
+    metrics['config'] = spec
+    metrics['images'] = len(items)
+    metrics['ms_per_image'] = elapsed / images * 1000 if images else float('nan')
+    return metrics
+
+
+def pareto_front(rows):
+    """Indices of rows that no other row beats on both speed and mAP@0.5:0.95"""
+    front = []
+    for i, a in enumerate(rows):
+        dominated = any(
+            b['ms_per_image'] <= a['ms_per_image'] and b['map50_95'] >= a['map50_95']
+            and (b['ms_per_image'] < a['ms_per_image'] or b['map50_95'] > a['map50_95'])
+            for j, b in enumerate(rows) if j != i)
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def print_table(rows, classes=EVAL_CLASSES):
+    front = set(pareto_front(rows))
+    header = f"{'':2}{'config':<26}{'ms/img':>8}{'P':>7}{'R':>7}{'mAP50':>8}{'mAP50-95':>10}"
+    header += ''.join(f"{name + ' 50-95':>14}" for name in classes)
+    print("\n📈 Speed vs. accuracy (★ = Pareto-optimal)")
+    print(header)
+    print("-" * len(header))
+    for i in sorted(range(len(rows)), key=lambda i: rows[i]['ms_per_image']):
+        r = rows[i]
+        line = (f"{'★' if i in front else ' ':2}{r['config']:<26}{r['ms_per_image']:8.1f}{r['precision']:7.3f}"
+                f"{r['recall']:7.3f}{r['map50']:8.3f}{r['map50_95']:10.3f}")
+        for name in classes:
+            per_class = r['per_class'].get(name)
+            line += f"{per_class['map50_95']:14.3f}" if per_class else f"{'-':>14}"
+        print(line)
+
+
+def evaluate(source, configs=DEFAULT_CONFIGS, images_dir=None, limit=None, confidence=0.25,
+             output_path="results/evaluation.json"):
+    """
+    Evaluate every configuration on the dataset and print the Pareto table
+
+    Returns:
+        list: Metrics dict per configuration
+    """
+    print("🎯 Accuracy vs. Speed Evaluation")
+    print("=" * 40)
+    print(f"📂 Dataset: {source}")
+    print(f"🏷️  Classes: {', '.join(EVAL_CLASSES)}")
+    print(f"⚙️  Configurations: {len(configs)}")
+    print("=" * 40)
+
+    try:
+        items, names = load_dataset(source, images_dir)
+        items = items[:limit] if limit else items
+        if not items:
+            print(f"❌ No labeled images found in {source}")
+            return []
+        if names is None:
+            # YOLO labels without a data.yaml use the model's (COCO) class ids
+            from model_loader import load_model
+            names = load_model('yolov8n.pt', warmup=False).names
+        print(f"🖼️  {len(items)} images")
+
+        rows = []
+        for spec in configs:
+            print(f"\n🔧 {spec}...")
+            metrics = evaluate_config(spec, items, names, confidence)
+            print(f"  {metrics['ms_per_image']:.1f} ms/img | P {metrics['precision']:.3f} R {metrics['recall']:.3f} | "
+                  f"mAP50 {metrics['map50']:.3f} mAP50-95 {metrics['map50_95']:.3f}")
+            rows.append(metrics)
+
+        print_table(rows)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n💾 Results saved to: {output_path}")
+        return rows
+
+    except Exception as e:
+        print(f"❌ Error during evaluation: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python evaluate.py <images_dir|instances.json> [--images DIR] [--config SPEC ...] "
+              "[--limit N] [--conf 0.25]")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    configs = [args[i + 1] for i, a in enumerate(args[:-1]) if a == '--config'] or list(DEFAULT_CONFIGS)
+    evaluate(
+        args[0],
+        configs,
+        images_dir=args[args.index('--images') + 1] if '--images' in args else None,
+        limit=int(args[args.index('--limit') + 1]) if '--limit' in args else None,
+        confidence=float(args[args.index('--conf') + 1]) if '--conf' in args else 0.25,
+    )
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Quantized TF.js export for the mobile app, with a parity and size verifier
+Exports float32 / float16 / uint8 weight-quantized TF.js graph models (optionally
+with NMS in the graph and restricted to the app's classes), then runs each bundle
+on dummy-app/assets/images/ and compares its boxes against the torch model.
+
+Usage:
+  python export_mobile.py [model_path] [--nms] [--app-classes] [--quant float32,float16,uint8]
+  python export_mobile.py --verify <web_model_dir> [model_path]
+
+Exporting needs `tensorflowjs`; verifying also needs `tfjs-graph-converter`.
+"""
+
+from ultralytics import YOLO
+from detection_results import DetectionResult, match_detections, nms as class_nms
+from detect_image import ALLOWED_CLASSES
+from pathlib import Path
+import numpy as np
+import subprocess
+import shutil
+import time
+import yaml
+import cv2
+import sys
+import os
+
+QUANTIZATIONS = ('float32', 'float16', 'uint8')
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+# Export formats whose graphs emit boxes normalized to the input size (ultralytics' TF head)
+NORMALIZED_FORMATS = ('saved_model', 'pb', 'tflite', 'edgetpu', 'tfjs')
+
+
+def restrict_classes(model, class_names):
+    """
+    Cut the detection head down to `class_names`
+
+    The last 1x1 conv of every classification branch is sliced to the kept
+    classes, so the exported graph outputs (1, 4 + k, anchors) instead of
+    (1, 84, anchors) and the app decodes k scores per anchor instead of 80.
+    Class ids are re-indexed 0..k-1; the new names are written to metadata.yaml.
+    """
+    import torch.nn as nn
+
+    keep = [i for i, name in model.names.items() if name in class_names]
+    head = model.model.model[-1]
+    for branch in head.cv3:
+        conv = branch[-1]
+        sliced = nn.Conv2d(conv.in_channels, len(keep), conv.kernel_size, conv.stride, bias=True)
+        sliced.weight.data = conv.weight.data[keep].clone()
+        sliced.bias.data = conv.bias.data[keep].clone()
+        branch[-1] = sliced
+    head.nc = len(keep)
+    head.no = head.nc + head.reg_max * 4
+    if hasattr(model.model, 'nc'):
+        model.model.nc = len(keep)
+    model.model.names = {j: model.names[i] for j, i in enumerate(keep)}
+    return model
+
+
+def export_variants(model_path='yolov8n.pt', quantizations=QUANTIZATIONS, nms=False, app_classes=False,
+                    output_root="exports", imgsz=640):
+    """
+    Export one TF.js bundle per quantization from a single FP32 SavedModel
+
+    Returns:
+        list: Paths of the exported web model directories
+    """
+    print("📦 Mobile Export")
+    print("=" * 40)
+    print(f"🤖 Model: {model_path}")
+    print(f"🔢 Quantization: {', '.join(quantizations)}")
+    print(f"🧹 NMS in graph: {nms}")
+    print(f"🏷️  Classes: {'app subset' if app_classes else 'all 80'}")
+    print("=" * 40)
+
+    model = YOLO(model_path)
+    if app_classes:
+        restrict_classes(model, ALLOWED_CLASSES)
+
+    stem = Path(model_path).stem
+    suffix = ("_nms" if nms else "") + ("_app" if app_classes else "")
+    saved_model_dir = os.path.join(output_root, f"{stem}{suffix}_saved_model")
+    if os.path.exists(saved_model_dir):
+        shutil.rmtree(saved_model_dir)
+    os.makedirs(output_root, exist_ok=True)
+    shutil.move(model.export(format='saved_model', imgsz=imgsz, nms=nms), saved_model_dir)
+
+    with open(os.path.join(saved_model_dir, 'metadata.yaml')) as f:
+        metadata = yaml.safe_load(f)
+
+    exported = []
+    for quant in quantizations:
+        web_dir = os.path.join(output_root, f"{stem}{suffix}_{quant}_web_model")
+        if os.path.exists(web_dir):
+            shutil.rmtree(web_dir)
+        cmd = ['tensorflowjs_converter', '--input_format=tf_saved_model',
+               '--output_format=tfjs_graph_model', '--signature_name=serving_default',
+               '--saved_model_tags=serve']
+        if quant != 'float32':
+            cmd.append(f'--quantize_{quant}')
+        subprocess.run(cmd + [saved_model_dir, web_dir], check=True)
+
+        variant_meta = dict(metadata)
+        variant_meta['args'] = dict(metadata.get('args', {}), half=quant == 'float16', nms=nms)
+        variant_meta['quantization'] = quant
+        with open(os.path.join(web_dir, 'metadata.yaml'), 'w') as f:
+            yaml.safe_dump(variant_meta, f, sort_keys=False, allow_unicode=True)
+
+        size, shards = bundle_size(web_dir)
+        print(f"✅ {web_dir}: {size / 1024 / 1024:.2f} MB in {shards} shards")
+        exported.append(web_dir)
+
+    if app_classes:
+        print("⚠️  Class ids are re-indexed in these bundles; read names from metadata.yaml in the app")
+    return exported
+
+
+def bundle_size(web_dir):
+    """(total bytes, number of weight shards) of a TF.js model directory"""
+    files = [p for p in Path(web_dir).iterdir() if p.is_file()]
+    size = sum(p.stat().st_size for p in files if p.suffix in ('.bin', '.json'))
+    shards = sum(1 for p in files if p.suffix == '.bin')
+    return size, shards
+
+
+def letterbox(image, size=640):
+    """Resize keeping aspect ratio and pad to size x size, like ultralytics"""
+    h, w = image.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+    padded = cv2.copyMakeBorder(resized, top, size - new_h - top, left, size - new_w - left,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, ratio, (left, top)
+
+
+def _load_tfjs_graph(web_dir):
+    try:
+        import tensorflow as tf
+        import tfjs_graph_converter.api as tfjs_api
+        import tfjs_graph_converter.util as tfjs_util
+    except ImportError:
+        raise ImportError("Verifying TF.js bundles needs: pip install tensorflow tfjs-graph-converter")
+
+    graph = tfjs_api.load_graph_model(web_dir)
+    inputs = tfjs_util.get_input_tensors(graph)
+    outputs = tfjs_util.get_output_tensors(graph)
+    session = tf.compat.v1.Session(graph=graph)
+    return lambda batch: session.run(outputs[0], feed_dict={inputs[0]: batch})
+
+
+def decode_output(output, names, ratio, pad, image_shape, confidence=0.5, iou=0.45, has_nms=False, imgsz=640,
+                  export_format='tfjs'):
+    """
+    Turn a raw exported-graph output into a DetectionResult in image pixels
+
+    Raw output is (1, 4 + nc, anchors) with xywh boxes;
+    NMS-included output is (1, max_det, 6) with xyxy, score, class.
+    Boxes are in input pixels, or normalized to the input size for the TF
+    family of formats (NORMALIZED_FORMATS).
+    """
+    output = np.asarray(output)[0]
+    if has_nms:
+        output = output[output[:, 4] >= confidence]
+        boxes, scores, class_ids = output[:, :4], output[:, 4], output[:, 5].astype(np.int64)
+    else:
+        output = output.T  # (anchors, 4 + nc)
+        class_scores = output[:, 4:]
+        class_ids = class_scores.argmax(1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+        mask = scores >= confidence
+        xywh, scores, class_ids = output[mask, :4], scores[mask], class_ids[mask]
+        boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+
+    if export_format in NORMALIZED_FORMATS:
+        boxes = boxes * imgsz
+    boxes = (boxes - np.array([pad[0], pad[1], pad[0], pad[1]])) / ratio
+    h, w = image_shape[:2]
+    boxes = np.clip(boxes, 0, [w, h, w, h])
+    detection = DetectionResult(boxes, scores, class_ids, names, image_shape[:2])
+    return detection if has_nms else class_nms(detection, iou)
+
+
+def verify_variant(web_dir, model_path='yolov8n.pt', images_dir='dummy-app/assets/images', confidence=0.5):
+    """
+    Run an exported bundle on the app's sample images and compare with torch
+
+    Agreement per image is the F1 of exported vs. torch detections
+    (same class name, IoU >= 0.5), restricted to the bundle's classes.
+
+    Returns:
+        dict: size, shards, mean agreement, mean latency and per-image rows
+    """
+    with open(os.path.join(web_dir, 'metadata.yaml')) as f:
+        metadata = yaml.safe_load(f)
+    export_names = {int(k): v for k, v in metadata['names'].items()}
+    has_nms = metadata.get('args', {}).get('nms', False)
+    imgsz = metadata.get('imgsz', [640, 640])[0]
+
+    torch_model = YOLO(model_path)
+    name_to_torch_id = {v: k for k, v in torch_model.names.items()}
+    run_graph = _load_tfjs_graph(web_dir)
+
+    size, shards = bundle_size(web_dir)
+    print(f"\n🔎 Verifying {web_dir}")
+    print(f"📦 Bundle: {size / 1024 / 1024:.2f} MB, {shards} shards, {metadata.get('quantization', 'float32')}")
+
+    rows = []
+    images = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    for image_path in images:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        padded, ratio, pad = letterbox(image, imgsz)
+        batch = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB)[None].astype(np.float32) / 255.0
+
+        start = time.perf_counter()
+        output = run_graph(batch)
+        latency = time.perf_counter() - start
+        exported = decode_output(output, export_names, ratio, pad, image.shape, confidence,
+                                 has_nms=has_nms, imgsz=imgsz, export_format='tfjs')
+        # Compare in the torch model's class-id space
+        exported = DetectionResult(exported.boxes, exported.scores,
+                                   [name_to_torch_id[export_names[int(c)]] for c in exported.class_ids],
+                                   torch_model.names, image.shape[:2])
+
+        reference = DetectionResult.from_ultralytics(
+            torch_model(image, conf=confidence, verbose=False)[0], torch_model.names)
+        reference = reference.filter_classes(set(export_names.values()))
+
+        tp = match_detections(exported, reference)
+        total = len(exported) + len(reference)
+        agreement = 2 * tp / total if total else 1.0
+        rows.append({'image': image_path.name, 'torch': len(reference), 'export': len(exported),
+                     'matched': tp, 'agreement': agreement, 'ms': latency * 1000})
+        print(f"  {image_path.name}: torch {len(reference)}, export {len(exported)}, "
+              f"matched {tp}, agreement {agreement:.2f}, {latency * 1000:.0f} ms")
+
+    mean_agreement = float(np.mean([r['agreement'] for r in rows])) if rows else 0.0
+    mean_ms = float(np.mean([r['ms'] for r in rows])) if rows else 0.0
+    print(f"📊 Mean agreement: {mean_agreement:.3f}, mean latency: {mean_ms:.0f} ms")
+    return {'web_dir': web_dir, 'size': size, 'shards': shards,
+            'agreement': mean_agreement, 'ms': mean_ms, 'images': rows}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--verify':
+        if len(sys.argv) < 3:
+            print("❌ Please provide the web model directory to verify")
+            sys.exit(1)
+        verify_variant(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else 'yolov8n.pt')
+        sys.exit(0)
+
+    args = sys.argv[1:]
+    nms = '--nms' in args
+    app_classes = '--app-classes' in args
+    quantizations = QUANTIZATIONS
+    if '--quant' in args:
+        quantizations = tuple(args[args.index('--quant') + 1].split(','))
+    positional = [a for i, a in enumerate(args)
+                  if not a.startswith('--') and (i == 0 or args[i - 1] != '--quant')]
+    model_path = positional[0] if positional else 'yolov8n.pt'
+
+    reports = [verify_variant(d, model_path) for d in
+               export_variants(model_path, quantizations, nms=nms, app_classes=app_classes)]
+
+    print(f"\n{'bundle':<45} {'MB':>6} {'shards':>6} {'agree':>6} {'ms':>6}")
+    for r in reports:
+        print(f"{Path(r['web_dir']).name:<45} {r['size'] / 1024 / 1024:>6.2f} {r['shards']:>6} "
+              f"{r['agreement']:>6.3f} {r['ms']:>6.0f}")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Decode-at-target-size image loading
+JPEG photos from phones are 12-48 MP, but the model only sees `imgsz` (640) pixels
+on the long side. libjpeg can decode at 1/2, 1/4 or 1/8 scale directly in the DCT
+domain, which skips most of the decode work and the full-size pixel buffer.
+load_image() picks the largest reduction that still leaves at least `imgsz` pixels
+on the long side and returns the scale factor that maps boxes back to the original;
+decode_image() does the same for encoded bytes already in memory (remote sources).
+
+The reduced decode is for inference only: annotated results are drawn on a
+full-resolution image, decoded lazily by full_resolution() when something is
+actually saved or shown, with the boxes already mapped back to original pixels.
+
+Usage:
+  python fast_image_loader.py <folder_of_large_jpegs> [imgsz] [--infer]
+"""
+
+from collections import namedtuple
+from pathlib import Path
+import subprocess
+import struct
+import io
+import time
+import json
+import sys
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+REDUCTIONS = (8, 4, 2)
+
+# An image fetched ahead of detection: the (possibly reduced) decode, its scale to
+# original pixels, and the encoded bytes when they cannot be cheaply read again
+# (remote sources). `image` is None when decoding was left to the detector.
+Preloaded = namedtuple('Preloaded', ['image', 'scale', 'encoded'], defaults=(None,))
+
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(path):
+    """
+    (width, height) from the JPEG frame header, without decoding
+
+    Returns:
+        tuple: (width, height), or None if the file is not a readable JPEG
+    """
+    try:
+        with open(path, 'rb') as f:
+            return _read_jpeg_size(f)
+    except OSError:
+        return None
+
+
+def _read_jpeg_size(f):
+    """Scan the markers of a JPEG file object up to the frame header"""
+    try:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            byte = f.read(1)
+            if not byte:
+                return None
+            if byte != b'\xff':
+                continue
+            marker = f.read(1)
+            while marker == b'\xff':  # fill bytes
+                marker = f.read(1)
+            if not marker:
+                return None
+            code = marker[0]
+            if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+                continue  # standalone markers without a length
+            if code == 0xD9:
+                return None
+            length = struct.unpack('>H', f.read(2))[0]
+            if code in _SOF_MARKERS:
+                _, height, width = struct.unpack('>BHH', f.read(5))
+                return width, height
+            f.seek(length - 2, 1)
+    except (OSError, struct.error):
+        return None
+
+
+def choose_reduction(width, height, imgsz=640):
+    """Largest DCT reduction (8, 4, 2 or 1) that keeps the long side >= imgsz"""
+    long_side = max(width, height)
+    for reduction in REDUCTIONS:
+        if long_side // reduction >= imgsz:
+            return reduction
+    return 1
+
+
+def load_image(image_path, imgsz=640):
+    """
+    Decode an image at the smallest scale the model can use without losing input pixels
+
+    Args:
+        image_path (str): Path to the image
+        imgsz (int): Model input size (long side)
+
+    Returns:
+        tuple: (image or None, (scale_x, scale_y)) where multiplying decoded
+               pixel coordinates by the scales gives original-image coordinates
+    """
+    import cv2
+
+    image_path = str(image_path)
+    size = jpeg_size(image_path) if image_path.lower().endswith(JPEG_EXTENSIONS) else None
+    return _decode_reduced(lambda flag: cv2.imread(image_path, flag), size, imgsz)
+
+
+def decode_image(data, imgsz=640):
+    """
+    load_image() for encoded image bytes held in memory (no temporary file)
+
+    Returns:
+        tuple: (image or None, (scale_x, scale_y))
+    """
+    import cv2
+    import numpy as np
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    size = _read_jpeg_size(io.BytesIO(data)) if data[:2] == b'\xff\xd8' else None
+    return _decode_reduced(lambda flag: cv2.imdecode(buffer, flag), size, imgsz)
+
+
+def full_resolution(image_path, preloaded=None):
+    """
+    Full-size image to draw on and save (a copy the caller may modify)
+
+    Reuses the preloaded decode when it was not reduced, else decodes the
+    kept bytes, the remote object or the file again at full size.
+
+    Returns:
+        np.ndarray: BGR image, or None if it cannot be decoded
+    """
+    import cv2
+    import numpy as np
+
+    if preloaded is not None and preloaded.image is not None and tuple(preloaded.scale) == (1.0, 1.0):
+        return preloaded.image.copy()
+    encoded = preloaded.encoded if preloaded is not None else None
+    if encoded is None and str(image_path).startswith(('http://', 'https://', 's3://')):
+        from remote_io import read_bytes
+        encoded = read_bytes(image_path)
+    if encoded is not None:
+        return cv2.imdecode(np.frombuffer(encoded, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return cv2.imread(str(image_path))
+
+
+def _decode_reduced(decode, size, imgsz):
+    """Decode with `decode(flag)` at the reduction chosen from the JPEG header `size`"""
+    import cv2
+
+    reduction = choose_reduction(*size, imgsz) if size else 1
+    if reduction == 1:
+        return decode(cv2.IMREAD_COLOR), (1.0, 1.0)
+
+    flag = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[reduction]
+    image = decode(flag)
+    if image is None:
+        return decode(cv2.IMREAD_COLOR), (1.0, 1.0)
+
+    # EXIF orientation is applied during decode, so the decoded image may be
+    # the header's frame rotated by 90 degrees
+    width, height = size
+    h, w = image.shape[:2]
+    if abs(width / w - height / h) > abs(height / w - width / h):
+        width, height = height, width
+    return image, (width / w, height / h)
+
+
+def _bench_worker(folder, imgsz, mode, infer):
+    """One benchmark run (in its own process, so peak RSS is per mode)"""
+    import resource
+    import cv2
+
+    paths = sorted(str(p) for p in Path(folder).iterdir() if p.suffix.lower() in JPEG_EXTENSIONS)
+    model = None
+    if infer:
+        from model_loader import load_model
+        model = load_model('yolov8n.pt', imgsz)
+
+    pixels = 0
+    start = time.perf_counter()
+    for path in paths:
+        if mode == 'reduced':
+            image, _ = load_image(path, imgsz)
+        else:
+            image = cv2.imread(path)
+        pixels += image.shape[0] * image.shape[1]
+        if model is not None:
+            model(image, imgsz=imgsz, verbose=False)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'images': len(paths),
+        'seconds': elapsed,
+        'mean_mpix': pixels / max(1, len(paths)) / 1e6,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }))
+
+
+def benchmark(folder, imgsz=640, infer=False):
+    """
+    Compare full-resolution cv2.imread with reduced-scale decoding on a folder of JPEGs
+    """
+    print("🖼️  Decode-at-target-size Benchmark")
+    print("=" * 40)
+    print(f"📂 Folder: {folder}")
+    print(f"📐 Model input: {imgsz}")
+    print(f"🧠 Inference included: {'yes' if infer else 'no'}")
+    print("=" * 40)
+
+    results = {}
+    for mode in ('full', 'reduced'):
+        cmd = [sys.executable, __file__, '--bench-worker', folder, str(imgsz), mode, '1' if infer else '0']
+        try:
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        except subprocess.CalledProcessError as e:
+            print(f"❌ {mode} run failed:\n{e.stderr}")
+            return None
+        results[mode] = json.loads(out.strip().splitlines()[-1])
+
+    if not results['full']['images']:
+        print(f"❌ No JPEG images found in {folder}")
+        return None
+
+    for mode, r in results.items():
+        rate = r['images'] / r['seconds'] if r['seconds'] > 0 else 0.0
+        r['images_per_s'] = rate
+        print(f"  {mode:<8} {rate:7.2f} images/s | {r['mean_mpix']:6.2f} MP decoded | peak RSS {r['peak_rss_mb']:.0f} MB")
+
+    full, reduced = results['full'], results['reduced']
+    if full['images_per_s'] > 0:
+        print(f"\n🚀 Speed-up: {reduced['images_per_s'] / full['images_per_s']:.2f}x")
+    print(f"💾 Peak RSS: {full['peak_rss_mb']:.0f} MB → {reduced['peak_rss_mb']:.0f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--bench-worker':
+        _bench_worker(sys.argv[2], int(sys.argv[3]), sys.argv[4], sys.argv[5] == '1')
+    elif len(sys.argv) > 1:
+        args = [a for a in sys.argv[1:] if a != '--infer']
+        benchmark(args[0], int(args[1]) if len(args) > 1 else 640, '--infer' in sys.argv)
+    else:
+        print("Usage: python fast_image_loader.py <folder_of_large_jpegs> [imgsz] [--infer]")
+        sys.exit(1)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Shared-memory ring buffer for handing frames between processes without copies
+Capture, inference and rendering processes exchange preallocated slots in one
+multiprocessing.shared_memory block. Each slot carries a frame, its detection
+array, a sequence number and a state; only the small per-slot header changes
+hands under the lock, the pixels never move.
+
+Slot life cycle:
+    FREE → WRITING → CAPTURED → INFERRING → DETECTED → RENDERING → FREE
+
+Policies when the capture side finds no FREE slot:
+    'block'      wait for one (lossless; for video files); a timeout
+                 returns no slot without dropping anything
+    'drop'       drop the new frame (counted in `dropped`)
+    'overwrite'  reuse the oldest CAPTURED slot that inference has not
+                 started on (counted in `overwritten`); live cameras then
+                 always feed inference the freshest frames
+
+Each slot holds up to `max_detections` rows (YOLO's own max_det default,
+300); frames with more detections are truncated and counted in `truncated`.
+
+Tests: python -m pytest tests/test_frame_ring.py
+"""
+
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import numpy as np
+import time
+
+FREE, WRITING, CAPTURED, INFERRING, DETECTED, RENDERING = range(6)
+POLICIES = ('block', 'drop', 'overwrite')
+
+# Per-slot header columns
+_STATE, _SEQ, _COUNT, _TIMESTAMP = range(4)
+# Ring-wide counters
+_NEXT_SEQ, _DROPPED, _OVERWRITTEN, _TRUNCATED = range(4)
+
+# Matches the max_det default of YOLO's NMS, so a full result always fits
+MAX_DETECTIONS = 300
+
+
+class FrameRing:
+    """
+    Args:
+        slots (int): Number of preallocated frame slots
+        frame_shape (tuple): (height, width, channels) of every frame
+        max_detections (int): Detection rows per slot (x1, y1, x2, y2, conf, class)
+        policy (str): 'block', 'drop' or 'overwrite' (see module docstring)
+        context: multiprocessing context used for the lock/condition
+    """
+
+    def __init__(self, slots=4, frame_shape=(720, 1280, 3), max_detections=MAX_DETECTIONS, policy='overwrite',
+                 context=None, _name=None, _cond=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        self.max_detections = max_detections
+        self.policy = policy
+
+        header_bytes = slots * 4 * 8
+        counter_bytes = 4 * 8
+        frame_bytes = slots * int(np.prod(self.frame_shape))
+        det_bytes = slots * max_detections * 6 * 4
+        size = header_bytes + counter_bytes + frame_bytes + det_bytes
+
+        self._owner = _name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self._cond = (context or mp).Condition()
+        else:
+            self.shm = shared_memory.SharedMemory(name=_name)
+            self._cond = _cond
+
+        buf = self.shm.buf
+        offset = 0
+        self._header = np.ndarray((slots, 4), dtype=np.int64, buffer=buf, offset=offset)
+        offset += header_bytes
+        self._counters = np.ndarray((4,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += counter_bytes
+        self._frames = np.ndarray((slots,) + self.frame_shape, dtype=np.uint8, buffer=buf, offset=offset)
+        offset += frame_bytes
+        self._detections = np.ndarray((slots, max_detections, 6), dtype=np.float32, buffer=buf, offset=offset)
+
+        if self._owner:
+            self._header[:] = 0
+            self._header[:, _STATE] = FREE
+            self._header[:, _SEQ] = -1
+            self._counters[:] = 0
+
+    def __reduce__(self):
+        # Child processes re-attach to the same block by name
+        return (_attach, (self.shm.name, self.slots, self.frame_shape, self.max_detections,
+                          self.policy, self._cond))
+
+    # ----- producer side -------------------------------------------------
+
+    def acquire_write(self, timeout=None):
+        """
+        Reserve a slot for a new frame according to the ring's policy
+
+        Returns:
+            int: Slot index, or None if the frame has to be dropped
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                free = np.flatnonzero(self._header[:, _STATE] == FREE)
+                if len(free):
+                    slot = int(free[0])
+                    break
+                if self.policy == 'overwrite':
+                    captured = np.flatnonzero(self._header[:, _STATE] == CAPTURED)
+                    if len(captured):
+                        slot = int(captured[np.argmin(self._header[captured, _SEQ])])
+                        self._counters[_OVERWRITTEN] += 1
+                        break
+                if self.policy in ('drop', 'overwrite'):
+                    self._counters[_DROPPED] += 1
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None  # timed out waiting; nothing was dropped yet
+                self._cond.wait(remaining)
+            self._header[slot, _STATE] = WRITING
+            self._header[slot, _COUNT] = 0
+            return slot
+
+    def commit_write(self, slot, timestamp_ns=None):
+        """Publish a written slot as CAPTURED with the next sequence number"""
+        with self._cond:
+            seq = int(self._counters[_NEXT_SEQ])
+            self._counters[_NEXT_SEQ] += 1
+            self._header[slot, _SEQ] = seq
+            self._header[slot, _TIMESTAMP] = timestamp_ns if timestamp_ns is not None else time.monotonic_ns()
+            self._header[slot, _STATE] = CAPTURED
+            self._cond.notify_all()
+            return seq
+
+    # ----- consumer side -------------------------------------------------
+
+    def acquire(self, state, next_state, timeout=None, newest=False):
+        """
+        Take the oldest (or newest) slot in `state` and move it to `next_state`
+
+        Returns:
+            int: Slot index, or None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                ready = np.flatnonzero(self._header[:, _STATE] == state)
+                if len(ready):
+                    seqs = self._header[ready, _SEQ]
+                    slot = int(ready[np.argmax(seqs) if newest else np.argmin(seqs)])
+                    self._header[slot, _STATE] = next_state
+                    return slot
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def count(self, state):
+        """Number of slots currently in `state`"""
+        with self._cond:
+            return int(np.count_nonzero(self._header[:, _STATE] == state))
+
+    def release(self, slot, state=FREE):
+        """Hand a slot on to the next stage (or back to FREE)"""
+        with self._cond:
+            self._header[slot, _STATE] = state
+            self._cond.notify_all()
+
+    # ----- slot contents (zero-copy views) -------------------------------
+
+    def frame(self, slot):
+        return self._frames[slot]
+
+    def detections(self, slot):
+        return self._detections[slot, :int(self._header[slot, _COUNT])]
+
+    def set_detections(self, slot, rows):
+        n = min(len(rows), self.max_detections)
+        if n < len(rows):
+            with self._cond:
+                self._counters[_TRUNCATED] += 1
+        self._detections[slot, :n] = rows[:n]
+        self._header[slot, _COUNT] = n
+
+    def seq(self, slot):
+        return int(self._header[slot, _SEQ])
+
+    def timestamp_ns(self, slot):
+        return int(self._header[slot, _TIMESTAMP])
+
+    @property
+    def dropped(self):
+        return int(self._counters[_DROPPED])
+
+    @property
+    def overwritten(self):
+        return int(self._counters[_OVERWRITTEN])
+
+    @property
+    def truncated(self):
+        """Frames whose detections did not fit in `max_detections` rows"""
+        return int(self._counters[_TRUNCATED])
+
+    @property
+    def frames_written(self):
+        return int(self._counters[_NEXT_SEQ])
+
+    def close(self):
+        # Drop the views before closing, or SharedMemory refuses to release the buffer
+        del self._header, self._counters, self._frames, self._detections
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+def _attach(name, slots, frame_shape, max_detections, policy, cond):
+    return FrameRing(slots, frame_shape, max_detections, policy, _name=name, _cond=cond)
+
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Streaming image source for folder/batch detection
+Walks a directory tree in a single os.scandir pass, yielding image paths in a
+deterministic order (sorted per directory) without ever listing the whole tree.
+Supports stable `--shard i/N` partitioning across machines and a resume manifest.
+
+Memory stays flat: at any time only the listings of the directories on the
+current path are held. The manifest stores a watermark (the last finished
+path in walk order), so resuming skips finished work, pruning whole
+subdirectories, without keeping a set of done paths. Failed paths are kept
+as a small list next to it and retried on resume; past MAX_FAILED_KEYS
+failures the watermark stops advancing instead, so nothing is lost.
+
+Usage:
+  python image_source.py <folder> [--shard i/N] [--manifest path] [--no-recursive]
+"""
+
+import hashlib
+import json
+import sys
+import os
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+MAX_FAILED_KEYS = 1000
+
+
+def parse_shard(value):
+    """'i/N' -> (i, N), with 0 <= i < N"""
+    if value is None:
+        return None
+    index, count = (int(v) for v in value.split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}': expected i/N with 0 <= i < N")
+    return index, count
+
+
+def shard_of(relative_path, count):
+    """Stable shard number for a path relative to the source root"""
+    digest = hashlib.blake2b(relative_path.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def _write_json_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class ImageSource:
+    """
+    Iterate image files under `root`
+
+    Args:
+        root (str): Folder to walk (or a single image file)
+        recursive (bool): Descend into subdirectories
+        shard (tuple|str): (index, count) or 'i/N'; only paths hashing to
+                           `index` are yielded
+        manifest_path (str): Resume manifest; call mark_done() or mark_failed() per
+                             image (resumed is True when it continues an earlier run)
+        extensions (tuple): Lower-case extensions to accept (matched case-insensitively)
+        checkpoint_every (int): Manifest writes happen every this many mark_done() calls
+    """
+
+    def __init__(self, root, recursive=True, shard=None, manifest_path=None,
+                 extensions=IMAGE_EXTENSIONS, checkpoint_every=100):
+        self.root = self._resolve_root(root)
+        self.recursive = recursive
+        self.shard = parse_shard(shard) if isinstance(shard, str) else shard
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.manifest_path = manifest_path
+        self.checkpoint_every = checkpoint_every
+
+        self.yielded = 0
+        self.skipped_shard = 0
+        self.skipped_done = 0
+        self.done = 0
+        self.failed = 0
+        self._since_checkpoint = 0
+        self._watermark = None
+        self._failed_keys = set()   # retried on resume although before the watermark
+        self._held = False          # too many failures to list: the watermark stays put
+        self.resumed = False
+
+        if manifest_path and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('root') == self.root and manifest.get('shard') == (list(self.shard) if self.shard else None):
+                self._watermark = tuple(manifest['watermark']) if manifest.get('watermark') else None
+                self._failed_keys = {tuple(key) for key in manifest.get('failed', [])}
+                self.done = manifest.get('done', 0)
+                self.resumed = self._watermark is not None
+            else:
+                print(f"⚠️  Manifest {manifest_path} belongs to another root/shard; starting fresh")
+
+    def _resolve_root(self, root):
+        return os.path.abspath(root)
+
+    def _relative_key(self, path):
+        return tuple(os.path.relpath(path, self.root).split(os.sep))
+
+    def relative(self, path):
+        """`path` relative to the source root, '/'-separated"""
+        return '/'.join(self._relative_key(path))
+
+    def _is_image(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def _walk(self, directory, key, visited):
+        """Yield (path, key) for images under `directory` in sorted walk order"""
+        try:
+            st = os.stat(directory)
+            if (st.st_dev, st.st_ino) in visited:
+                return  # symlink loop or bind mount seen already
+            visited.add((st.st_dev, st.st_ino))
+            with os.scandir(directory) as it:
+                entries = sorted((e.name, e.is_dir()) for e in it)
+        except OSError as e:
+            print(f"⚠️  Cannot read {directory}: {e}")
+            return
+
+        wm = self._watermark
+        for name, is_dir in entries:
+            entry_key = key + (name,)
+            if is_dir:
+                # Skip subtrees that were finished before the watermark, unless a failed image is in them
+                if self.recursive and (wm is None or entry_key >= wm[:len(entry_key)]
+                                       or any(k[:len(entry_key)] == entry_key for k in self._failed_keys)):
+                    yield from self._walk(os.path.join(directory, name), entry_key, visited)
+            elif self._is_image(name):
+                yield os.path.join(directory, name), entry_key
+
+    def __iter__(self):
+        if os.path.isfile(self.root):
+            if self._is_image(self.root):
+                self.yielded += 1
+                yield self.root
+            return
+
+        wm = self._watermark
+        for path, key in self._walk(self.root, (), set()):
+            if wm is not None and key <= wm and key not in self._failed_keys:
+                self.skipped_done += 1
+                continue
+            if self.shard is not None and shard_of('/'.join(key), self.shard[1]) != self.shard[0]:
+                self.skipped_shard += 1
+                continue
+            self.yielded += 1
+            yield path
+
+    def mark_done(self, path):
+        """Record `path` (the latest yielded image) as finished"""
+        if not self.manifest_path:
+            return
+        key = self._relative_key(path)
+        self._failed_keys.discard(key)
+        self._advance(key)
+        self.done += 1
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def mark_failed(self, path):
+        """Record that `path` could not be processed; a resumed run retries it"""
+        self.failed += 1
+        if not self.manifest_path:
+            return
+        key = self._relative_key(path)
+        if key in self._failed_keys or len(self._failed_keys) < MAX_FAILED_KEYS:
+            self._failed_keys.add(key)
+            self._advance(key)
+        else:
+            # Too many to list: keep the watermark before this one so it is retried
+            self._held = True
+
+    def _advance(self, key):
+        # Retried images sit before the watermark and must not move it back
+        if not self._held and (self._watermark is None or key > self._watermark):
+            self._watermark = key
+
+    def checkpoint(self):
+        if not self.manifest_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        _write_json_atomic(self.manifest_path, {
+            'root': self.root,
+            'shard': list(self.shard) if self.shard else None,
+            'watermark': list(self._watermark) if self._watermark else None,
+            'failed': sorted(list(key) for key in self._failed_keys),
+            'done': self.done,
+        })
+        self._since_checkpoint = 0
+
+    def close(self):
+        self.checkpoint()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def describe(self):
+        parts = [f"{self.yielded} images"]
+        if self.shard:
+            parts.append(f"shard {self.shard[0]}/{self.shard[1]} ({self.skipped_shard} in other shards)")
+        if self.skipped_done:
+            parts.append(f"{self.skipped_done} already done")
+        if self.failed:
+            parts.append(f"{self.failed} failed")
+        return ", ".join(parts)
+
+
+def source_options(argv):
+    """
+    Pull --shard / --manifest / --no-recursive out of an argv list
+
+    Returns:
+        tuple: (remaining args, ImageSource keyword arguments)
+    """
+    args, options = [], {}
+    i = 0
+    while i < len(argv):
+        if argv[i] == '--shard':
+            options['shard'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--manifest':
+            options['manifest_path'] = argv[i + 1]
+            i += 2
+        elif argv[i] == '--no-recursive':
+            options['recursive'] = False
+            i += 1
+        else:
+            args.append(argv[i])
+            i += 1
+    return args, options
+
+
+if __name__ == "__main__":
+    args, options = source_options(sys.argv[1:])
+    if not args:
+        print("Usage: python image_source.py <folder> [--shard i/N] [--manifest path] [--no-recursive]")
+        sys.exit(1)
+    with ImageSource(args[0], **options) as source:
+        for path in source:
+            print(path)
+            source.mark_done(path)
+    print(f"📸 {source.describe()}", file=sys.stderr)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Memory accounting and soak testing
+MemoryMonitor samples RSS (and, opted in, tracemalloc) per pipeline stage (decode, inference,
+annotate, encode, store, ...) and reports which allocation sites grew. soak()
+pushes a synthetic frame stream through the real image or video entry point
+(detect_image, the cascade video path) and fails when memory grows past a bound
+after warm-up, naming the allocation sites responsible.
+
+Usage:
+  python memory_monitor.py [image|video] [--frames 1000000] [--bound-mb 64] [--model yolov8n.pt]
+                           [--no-model] [--check-every 10000] [--warmup 2000]
+
+--no-model replaces inference with synthetic detections, so the plumbing around
+the model (annotation, encoding, store, analytics) can be soaked for millions of
+frames. The video path writes its annotated video into a scratch directory.
+"""
+
+from detection_results import DetectionResult
+from contextlib import contextmanager, redirect_stdout
+import numpy as np
+import tracemalloc
+import tempfile
+import time
+import sys
+import os
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+MAX_SAMPLES = 2048
+
+
+def current_rss_mb():
+    """Resident set size of this process right now (cheap: one /proc read)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # peak, not current
+
+
+class MemoryMonitor:
+    """
+    Args:
+        trace (bool): Also track Python allocations with tracemalloc (names the
+                      sites that grew, at a noticeable cost per allocation)
+        trace_depth (int): Frames kept per allocation traceback
+        top_n (int): Allocation sites listed in reports
+    """
+
+    def __init__(self, trace=False, trace_depth=1, top_n=10):
+        self.trace = trace
+        self.top_n = top_n
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(trace_depth)
+        self.stages = {}
+        self.samples = []         # (frame, rss_mb, traced_mb), downsampled to stay bounded
+        self._sample_stride = 1
+        self._baseline = None
+        self.baseline_rss = None
+        self.baseline_frame = None
+
+    @contextmanager
+    def stage(self, name):
+        """Account RSS and traced-memory change across one pass through a stage"""
+        rss0 = current_rss_mb()
+        traced0 = tracemalloc.get_traced_memory()[0] if self.trace else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rss_mb': 0.0, 'traced_mb': 0.0})
+            stats['calls'] += 1
+            stats['seconds'] += time.perf_counter() - start
+            stats['rss_mb'] += current_rss_mb() - rss0
+            if self.trace:
+                stats['traced_mb'] += (tracemalloc.get_traced_memory()[0] - traced0) / (1024 * 1024)
+
+    def sample(self, frame):
+        """Record RSS / traced memory; the series is thinned so it never grows past MAX_SAMPLES"""
+        if frame % self._sample_stride:
+            return
+        traced = tracemalloc.get_traced_memory()[0] / (1024 * 1024) if self.trace else 0.0
+        self.samples.append((frame, current_rss_mb(), traced))
+        if len(self.samples) >= MAX_SAMPLES:
+            self.samples = self.samples[::2]
+            self._sample_stride *= 2
+
+    def set_baseline(self, frame):
+        """Mark the end of warm-up: later growth is measured against this point"""
+        self.baseline_frame = frame
+        self.baseline_rss = current_rss_mb()
+        if self.trace:
+            self._baseline = tracemalloc.take_snapshot()
+
+    def growth_mb(self):
+        return current_rss_mb() - self.baseline_rss if self.baseline_rss is not None else 0.0
+
+    def top_growth(self):
+        """Allocation sites with the largest net growth since the baseline"""
+        if not self.trace or self._baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        diffs = snapshot.compare_to(self._baseline, 'lineno')
+        return [d for d in diffs if d.size_diff > 0][:self.top_n]
+
+    def slope_mb_per_1k(self):
+        """RSS growth rate after the baseline, from a least-squares fit"""
+        points = [(f, r) for f, r, _ in self.samples if self.baseline_frame is None or f >= self.baseline_frame]
+        if len(points) < 2:
+            return 0.0
+        frames, rss = np.array(points, dtype=np.float64).T
+        if frames[-1] == frames[0]:
+            return 0.0
+        return float(np.polyfit(frames, rss, 1)[0] * 1000)
+
+    def report(self):
+        print("\n🧠 Memory report")
+        print("=" * 40)
+        if self.baseline_rss is not None:
+            print(f"RSS: {self.baseline_rss:.1f} MB after warm-up → {current_rss_mb():.1f} MB "
+                  f"({self.growth_mb():+.1f} MB, {self.slope_mb_per_1k():+.3f} MB per 1k frames)")
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"Python heap (tracemalloc): {current / 1e6:.1f} MB now, {peak / 1e6:.1f} MB peak")
+        if self.stages:
+            print("Per stage (mean per call):")
+            for name, s in self.stages.items():
+                n = max(1, s['calls'])
+                line = f"  {name:<12} {s['seconds'] / n * 1000:8.2f} ms | RSS {s['rss_mb'] / n * 1024:+8.2f} KB"
+                if self.trace:
+                    line += f" | heap {s['traced_mb'] / n * 1024:+8.2f} KB retained"
+                print(line)
+        sites = self.top_growth()
+        if sites:
+            print("Top allocation sites by growth since warm-up:")
+            for d in sites:
+                frame = d.traceback[0]
+                print(f"  {d.size_diff / 1024:+10.1f} KB ({d.count_diff:+d} blocks)  {frame.filename}:{frame.lineno}")
+        return sites
+
+
+# ----- soak test --------------------------------------------------------------
+
+class SyntheticCapture:
+    """
+    Stands in for cv2.VideoCapture (isOpened, read, get, release) with a
+    synthetic stream of `frames` frames: a smooth background with a box
+    moving across it, so the annotated video stays small on disk. Every
+    read() returns a new array, as a real capture does.
+    """
+
+    def __init__(self, shape=(720, 1280, 3), frames=1_000_000, fps=30.0):
+        h, w = shape[:2]
+        ramp = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+        self._background = np.broadcast_to(ramp, shape).astype(np.uint8)
+        self.shape = shape
+        self.frames = frames
+        self.fps = fps
+        self.index = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.index >= self.frames:
+            return False, None
+        h, w = self.shape[:2]
+        frame = self._background.copy()
+        x = (self.index * 7) % (w - 200)
+        frame[h // 2:h // 2 + 120, x:x + 200] = (self.index * 13) % 255
+        self.index += 1
+        return True, frame
+
+    def get(self, prop):
+        import cv2
+        return {cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_WIDTH: self.shape[1],
+                cv2.CAP_PROP_FRAME_HEIGHT: self.shape[0], cv2.CAP_PROP_FRAME_COUNT: self.frames}.get(prop, 0.0)
+
+    def release(self):
+        pass
+
+
+class _SyntheticModel:
+    """
+    Stands in for the model in --no-model soaks: a few plausible boxes per
+    frame, usable as detect_image's detector and as the cascade's detector
+    """
+
+    names = {0: 'person', 2: 'car', 5: 'bus', 7: 'truck'}
+    batch_size = 8
+
+    def __init__(self, seed=0):
+        self._rs = np.random.RandomState(seed)
+
+    def detect(self, frame):
+        h, w = frame.shape[:2]
+        n = self._rs.randint(0, 8)
+        xy = self._rs.uniform(0, [w - 100, h - 100], size=(n, 2))
+        boxes = np.concatenate([xy, xy + self._rs.uniform(30, 100, size=(n, 2))], axis=1)
+        return DetectionResult(boxes, self._rs.uniform(0.3, 1.0, n), self._rs.choice(list(self.names), n),
+                               self.names, (h, w))
+
+    def detect_image(self, image_path, preloaded, model_path=None, confidence=None):
+        return self.detect(preloaded.image)
+
+    def detect_batch(self, frames):
+        return [self.detect(frame) for frame in frames]
+
+    def report(self):
+        pass
+
+
+def soak(path='image', frames=1_000_000, bound_mb=64.0, model_path='yolov8n.pt', use_model=True,
+         check_every=10_000, warmup=2_000, shape=(720, 1280, 3)):
+    """
+    Run `frames` synthetic frames through the real image or video entry point
+    and check that RSS after warm-up stays within `bound_mb`
+
+    The image path calls detect_image() once per frame; the video path runs
+    detect_buses_in_video_cascade() on a synthetic capture, with analytics,
+    and checks memory from its on_frame hook. Both run in a scratch
+    directory, with their per-frame output silenced and the daemon off.
+
+    Returns:
+        bool: True when memory stayed within the bound
+    """
+    print("🧪 Memory Soak Test")
+    print("=" * 40)
+    print(f"🛤️  Path: {path}")
+    print(f"🎞️  Frames: {frames:,} ({shape[1]}x{shape[0]})")
+    print(f"🤖 Model: {model_path if use_model else 'synthetic detections'}")
+    print(f"📏 Bound: {bound_mb:.0f} MB growth after {warmup:,} warm-up frames")
+    print("=" * 40)
+
+    # Model files are resolved before moving into the scratch directory
+    model_path = os.path.abspath(model_path) if os.path.exists(model_path) else model_path
+    small_model_path = os.path.abspath('yolov8n.pt') if os.path.exists('yolov8n.pt') else 'yolov8n.pt'
+    synthetic = None if use_model else _SyntheticModel()
+    capture = SyntheticCapture(shape, frames)
+    monitor = MemoryMonitor(trace=True)
+    console = sys.stdout
+    state = {'ok': True, 'frames': 0}
+    start = time.perf_counter()
+
+    def check(i, *_):
+        state['frames'] = i + 1
+        monitor.sample(i)
+        if i + 1 == warmup:
+            monitor.set_baseline(i)
+        if monitor.baseline_rss is not None and (i + 1) % check_every == 0:
+            growth = monitor.growth_mb()
+            rate = (i + 1) / (time.perf_counter() - start)
+            print(f"  frame {i + 1:>9,}: RSS {current_rss_mb():7.1f} MB ({growth:+.1f} MB) | {rate:,.0f} frames/s",
+                  file=console)
+            if growth > bound_mb:
+                print(f"❌ RSS grew {growth:.1f} MB past the warm-up baseline (bound {bound_mb:.0f} MB)",
+                      file=console)
+                state['ok'] = False
+                return False
+        return True
+
+    cwd = os.getcwd()
+    env = {k: os.environ.get(k) for k in ('HEADLESS', 'BUS_DETECTION_NO_DAEMON')}
+    os.environ.update(HEADLESS='1', BUS_DETECTION_NO_DAEMON='1')
+    with tempfile.TemporaryDirectory(prefix="soak_") as workdir, open(os.devnull, 'w') as devnull:
+        os.chdir(workdir)
+        try:
+            with redirect_stdout(devnull):
+                if path == 'video':
+                    from detect_buses_video import detect_buses_in_video_cascade
+                    detect_buses_in_video_cascade(capture, model_path, os.path.join(workdir, "detections"),
+                                                  small_model_path=small_model_path, analytics=True,
+                                                  detector=synthetic, on_frame=check)
+                else:
+                    from detect_image import detect_image
+                    from fast_image_loader import Preloaded
+                    detector = synthetic.detect_image if synthetic is not None else None
+                    image_path = os.path.join(workdir, "soak.jpg")
+                    for i in range(frames):
+                        ret, frame = capture.read()
+                        if not ret:
+                            break
+                        detect_image(image_path, model_path, 0.5, Preloaded(frame, (1.0, 1.0)), detector)
+                        if not check(i):
+                            break
+        finally:
+            os.chdir(cwd)
+            for k, v in env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+    if state['ok'] and state['frames'] < frames:
+        print(f"❌ The {path} path stopped after {state['frames']:,} of {frames:,} frames (see the error above)")
+        state['ok'] = False
+
+    monitor.report()
+    if state['ok']:
+        print(f"\n✅ Soak passed: {monitor.growth_mb():+.1f} MB after warm-up (bound {bound_mb:.0f} MB)")
+    return state['ok']
+
+
+def _option(args, name, cast, default):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path = args[0] if args and not args[0].startswith('--') else 'image'
+    if path not in ('image', 'video'):
+        print("Usage: python memory_monitor.py [image|video] [--frames 1000000] [--bound-mb 64] "
+              "[--model yolov8n.pt] [--no-model] [--check-every 10000] [--warmup 2000]")
+        sys.exit(1)
+    passed = soak(
+        path,
+        frames=_option(args, '--frames', int, 1_000_000),
+        bound_mb=_option(args, '--bound-mb', float, 64.0),
+        model_path=_option(args, '--model', str, 'yolov8n.pt'),
+        use_model='--no-model' not in args,
+        check_every=_option(args, '--check-every', int, 10_000),
+        warmup=_option(args, '--warmup', int, 2_000),
+    )
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,69 @@
+"""
+Cached, warmed-up YOLO model loading
+The first forward pass of a fresh model pays for layer fusion, graph setup and
+allocator growth. load_model() pays that on dummy input at load time, so the first
+real image runs at steady-state speed, and keeps the model for later calls in the
+same process.
+"""
+
+from ultralytics import YOLO
+from cpu_autotune import apply_tuning
+from cpu_optimized import optimized_model_path
+import numpy as np
+import time
+
+_MODELS = {}
+
+
+def warmup_model(model, imgsz=640, runs=2):
+    """
+    Run a few forward passes on a blank image of the configured input size
+
+    Returns:
+        float: Seconds spent warming up
+    """
+    start = time.perf_counter()
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model(dummy, imgsz=imgsz, verbose=False)
+    return time.perf_counter() - start
+
+
+def is_loaded(model_path='yolov8n.pt', imgsz=640):
+    """Whether load_model() already holds this model in this process"""
+    return any(key[:2] == (model_path, imgsz) for key in _MODELS)
+
+
+def load_model(model_path='yolov8n.pt', imgsz=640, warmup=True, input_type='image', tune=True, optimize=True):
+    """
+    Load a YOLO model once per process, warmed up at `imgsz`
+
+    Thread settings recorded by cpu_autotune.py for this model and input
+    type are applied before the model is built. With BUS_DETECTION_CPU_OPT
+    set, the cached optimized graph for `imgsz` is loaded instead (see
+    cpu_optimized.py).
+
+    Args:
+        model_path (str): Path to the YOLO model file
+        imgsz (int): Input size the warm-up runs at
+        warmup (bool): Run dummy inference before returning
+        input_type (str): 'image' or 'video', selects the tuning record
+        tune (bool): Apply the tuning record; False for processes that set their
+                     own thread configuration (autotune probes, pool workers)
+        optimize (bool): Allow the optimized graph, which only accepts batch 1
+                         at `imgsz`; False for callers that run batches or
+                         other input sizes
+
+    Returns:
+        YOLO: The cached model
+    """
+    key = (model_path, imgsz, optimize)
+    model = _MODELS.get(key)
+    if model is None:
+        if tune:
+            apply_tuning(model_path, input_type)
+        model = YOLO(optimized_model_path(model_path, imgsz) if optimize else model_path, task='detect')
+        if warmup:
+            warmup_model(model, imgsz)
+        _MODELS[key] = model
+    return model
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Background output writing for batch detection
+Annotated images are encoded and written by a pool of writer threads fed through
+a bounded queue, so JPEG encoding and disk writes overlap with inference instead
+of following it; when the writers fall behind, the queue bounds memory and the
+inference loop waits only for a free slot. Detections can be written instead of
+(or as well as) images, as compact sidecars:
+
+  jsonl  one line per image in <name>.jsonl (same fields as the JSON export)
+  npz    one <name>_<batch>.npz per batch of images: flat boxes / scores /
+         class_ids arrays with per-image offsets (read back with read_npz)
+
+Output modes:
+  images      annotated images only (default, what the scripts always did)
+  detections  sidecar records only: no annotated copy, drawing or encoding
+  both        images and records
+
+The output directory may be an http(s):// or s3:// URI (see remote_io.py):
+images are then uploaded by the writer threads, and JSONL records are stored
+as one object per batch, since objects cannot be appended to.
+
+With a resume manifest (an ImageSource passed as `source`), the batch loop calls
+commit() per image instead of source.mark_done(): the manifest only advances
+past an image once its annotated image and record batch have been written, and
+a fresh (not resumed) run replaces the local records of an earlier one. Failed
+images are listed in the manifest and retried on resume, without repeating the
+records of the images that followed them (see image_source.py).
+
+Command-line options (see output_options):
+  --output images|detections|both  --format jsonl|npz  --quality 1-100
+  --thumbnail <max_side>           --writers N          --dest <dir|uri>
+"""
+
+from detection_results import DetectionResult
+from remote_io import is_remote, join_uri, write_bytes
+from image_source import parse_shard
+from collections import deque
+from pathlib import Path
+import numpy as np
+import threading
+import socket
+import glob
+import queue
+import io
+import json
+import time
+import uuid
+import os
+import re
+
+MODES = ('images', 'detections', 'both')
+FORMATS = ('jsonl', 'npz')
+_STOP = object()
+
+
+class OutputWriter:
+    """
+    Args:
+        output_dir (str): Directory (or remote URI) for images and records
+        mode (str): 'images', 'detections' or 'both'
+        detections_format (str): 'jsonl' or 'npz'
+        quality (int): JPEG quality of annotated images
+        thumbnail (int): Downscale annotated images to this long side (None = full size)
+        workers (int): Image writer threads (default 2, or 8 for remote uploads)
+        queue_size (int): Images waiting for a writer before submit_image() blocks
+        batch_size (int): Images per record batch (one npz file, one JSONL write)
+        records_name (str): File name stem of the records
+        shard (str): Shard 'i/N' this run processes; part of remote record names
+        source (ImageSource): Source whose manifest commit() advances; when it
+                              resumed from a manifest, local records are
+                              continued instead of replaced
+    """
+
+    def __init__(self, output_dir="results", mode='images', detections_format='jsonl', quality=95,
+                 thumbnail=None, workers=None, queue_size=16, batch_size=256, records_name="detections",
+                 shard=None, source=None):
+        if mode not in MODES:
+            raise ValueError(f"Output mode must be one of {', '.join(MODES)} (got '{mode}')")
+        if detections_format not in FORMATS:
+            raise ValueError(f"Detections format must be one of {', '.join(FORMATS)} (got '{detections_format}')")
+        self.output_dir = str(output_dir)
+        self.remote = is_remote(output_dir)
+        if workers is None:
+            workers = 8 if self.remote else 2
+        self.mode = mode
+        self.detections_format = detections_format
+        self.quality = int(quality)
+        self.thumbnail = thumbnail
+        self.batch_size = batch_size
+        self.records_name = records_name
+        self.stats = {'images': 0, 'image_bytes': 0, 'records': 0, 'record_files': 0, 'errors': 0,
+                      'wait_s': 0.0}
+        self._lock = threading.Lock()
+        self._batch = []
+        self._batch_index = 0
+        resume = source is not None and source.resumed
+
+        # commit() bookkeeping: images/records submitted, and the written prefix of each
+        self.source = source
+        self._pending = deque()     # (image_path, image seq range, record seq range, failed)
+        self._image_seq = 0
+        self._record_seq = 0
+        self._committed = (0, 0)
+        self._images_written = 0
+        self._images_finished = set()
+        self._failed_images = set()
+        self._records_written = 0
+        self._failed_records = []   # (start, end) record seq ranges of failed batches
+
+        self._images = queue.Queue(maxsize=queue_size)
+        self._threads = [threading.Thread(target=self._image_worker, name=f"image-writer-{i}", daemon=True)
+                         for i in range(max(1, workers) if self.images else 0)]
+        # Record batches go to a single thread so JSONL lines stay in image order
+        self._records = queue.Queue(maxsize=4)
+        if self.detections:
+            self._threads.append(threading.Thread(target=self._record_worker, name="record-writer", daemon=True))
+            if self.remote:
+                # One object per batch, named per run so a resumed run adds to the earlier ones;
+                # shard, host, pid and a random suffix keep concurrent runs from overwriting each other
+                self._run_id = _run_id(shard)
+                self.records_path = self.path(f"{records_name}_{self._run_id}_*.{detections_format}")
+            elif detections_format == 'jsonl':
+                os.makedirs(output_dir, exist_ok=True)
+                # Appended to, so a run resumed from an ImageSource manifest continues it
+                self.records_path = os.path.join(output_dir, f"{records_name}.jsonl")
+                if not resume:
+                    open(self.records_path, 'w').close()
+            else:
+                os.makedirs(output_dir, exist_ok=True)
+                self.records_path = os.path.join(output_dir, f"{records_name}_*.npz")
+                earlier = sorted(glob.glob(self.records_path))
+                if resume:
+                    # Numbering continues after batches from the resumed run
+                    self._batch_index = len(earlier)
+                else:
+                    for path in earlier:
+                        os.remove(path)
+        else:
+            self.records_path = None
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def images(self):
+        return self.mode in ('images', 'both')
+
+    @property
+    def detections(self):
+        return self.mode in ('detections', 'both')
+
+    def path(self, name):
+        """Output path (or URI) of `name` in the output directory"""
+        return join_uri(self.output_dir, name)
+
+    # ----- producer side ---------------------------------------------------
+
+    def _put(self, q, item):
+        start = time.perf_counter()
+        q.put(item)
+        self.stats['wait_s'] += time.perf_counter() - start
+
+    def submit_image(self, output_path, image):
+        """
+        Queue an annotated image for encoding and writing
+
+        The image must not be modified afterwards (the writers read it later).
+        """
+        if self.images:
+            self._put(self._images, (self._image_seq, output_path, image))
+            self._image_seq += 1
+        return output_path
+
+    def submit_bytes(self, output_path, data):
+        """Queue already-encoded bytes for writing (or uploading)"""
+        if self.images:
+            self._put(self._images, (self._image_seq, output_path, bytes(data)))
+            self._image_seq += 1
+        return output_path
+
+    def add_detections(self, image_path, detection):
+        """
+        Record the detections of one image (a DetectionResult in original-image pixels)
+        """
+        if not self.detections:
+            return
+        self._batch.append((str(image_path), detection))
+        self._record_seq += 1
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the current record batch to the record writer"""
+        if self._batch:
+            self._put(self._records, (self._batch_index, self._record_seq - len(self._batch), self._batch))
+            self._batch_index += 1
+            self._batch = []
+
+    def commit(self, image_path, failed=False):
+        """
+        Mark `image_path` finished by the caller: everything submitted for it so
+        far is its output, and the source's manifest advances past it once that
+        output is written (or records it failed when a write failed, or when
+        `failed` says it could not be processed)
+        """
+        if self.source is None:
+            return
+        committed = (self._image_seq, self._record_seq)
+        self._pending.append((image_path, (self._committed[0], committed[0]), (self._committed[1], committed[1]),
+                              failed))
+        self._committed = committed
+        self._advance()
+
+    def _advance(self):
+        """Report committed images whose output is written to the source, in order"""
+        while self._pending:
+            image_path, images, records, failed = self._pending[0]
+            with self._lock:
+                if self._images_written < images[1] or self._records_written < records[1]:
+                    return
+                failed = failed or any(seq in self._failed_images for seq in range(*images)) or \
+                    any(start < records[1] and records[0] < end for start, end in self._failed_records)
+            self._pending.popleft()
+            if failed:
+                self.source.mark_failed(image_path)
+            else:
+                self.source.mark_done(image_path)
+
+    def close(self):
+        """Write everything still queued and stop the writers"""
+        if self.detections:
+            self.flush()
+            self._records.put(_STOP)
+        for _ in range(len(self._threads) - (1 if self.detections else 0)):
+            self._images.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._advance()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def describe(self):
+        s = self.stats
+        parts = []
+        if self.images:
+            parts.append(f"{s['images']} images ({s['image_bytes'] / 1024 / 1024:.1f} MB)")
+        if self.detections:
+            parts.append(f"{s['records']} detection records in {self.records_path}")
+        text = ", ".join(parts) + f", inference waited {s['wait_s']:.2f}s on writers"
+        if s['errors']:
+            text += f", {s['errors']} write errors"
+        return text
+
+    # ----- writer threads ----------------------------------------------------
+
+    def _encode(self, output_path, image):
+        import cv2
+
+        if self.thumbnail:
+            h, w = image.shape[:2]
+            factor = self.thumbnail / max(h, w)
+            if factor < 1.0:
+                image = cv2.resize(image, (max(1, round(w * factor)), max(1, round(h * factor))),
+                                   interpolation=cv2.INTER_AREA)
+        suffix = Path(output_path).suffix.lower() or '.jpg'
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality] if suffix in ('.jpg', '.jpeg') else []
+        ok, buffer = cv2.imencode(suffix, image, params)
+        if not ok:
+            raise IOError(f"Could not encode {output_path}")
+        return buffer
+
+    def _image_worker(self):
+        while True:
+            item = self._images.get()
+            if item is _STOP:
+                return
+            seq, output_path, image = item
+            try:
+                buffer = image if isinstance(image, bytes) else self._encode(output_path, image).tobytes()
+                write_bytes(output_path, buffer, _content_type(output_path))
+                with self._lock:
+                    self.stats['images'] += 1
+                    self.stats['image_bytes'] += len(buffer)
+                    self._image_finished(seq)
+            except Exception as e:
+                print(f"❌ Could not write {output_path}: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                    self._failed_images.add(seq)
+                    self._image_finished(seq)
+
+    def _image_finished(self, seq):
+        # Writers finish out of order: advance the written prefix (caller holds the lock)
+        self._images_finished.add(seq)
+        while self._images_written in self._images_finished:
+            self._images_finished.remove(self._images_written)
+            self._images_written += 1
+
+    def _record_worker(self):
+        while True:
+            item = self._records.get()
+            if item is _STOP:
+                return
+            index, start, batch = item
+            try:
+                if self.detections_format == 'jsonl':
+                    self._write_jsonl(index, batch)
+                else:
+                    self._write_npz(index, batch)
+                with self._lock:
+                    self.stats['records'] += len(batch)
+                    self.stats['record_files'] += 1
+                    self._records_written = start + len(batch)
+            except Exception as e:
+                print(f"❌ Could not write detection batch {index}: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                    self._failed_records.append((start, start + len(batch)))
+                    self._records_written = start + len(batch)
+
+    def _batch_path(self, index, suffix):
+        if self.remote:
+            return self.path(f"{self.records_name}_{self._run_id}_{index:05d}.{suffix}")
+        return os.path.join(self.output_dir, f"{self.records_name}_{index:05d}.{suffix}")
+
+    def _write_jsonl(self, index, batch):
+        lines = []
+        for image_path, detection in batch:
+            height, width = detection.image_shape or (None, None)
+            lines.append(json.dumps({
+                'image': image_path,
+                'width': width,
+                'height': height,
+                'detections': detection.to_dicts(),
+            }) + '\n')
+        if self.remote:
+            write_bytes(self._batch_path(index, 'jsonl'), ''.join(lines).encode('utf-8'), 'application/x-ndjson')
+            return
+        with open(self.records_path, 'a') as f:
+            f.writelines(lines)
+
+    def _write_npz(self, index, batch):
+        counts = np.array([len(d) for _, d in batch], dtype=np.int64)
+        names = batch[0][1].names
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            images=np.array([p for p, _ in batch]),
+            image_shapes=np.array([d.image_shape or (0, 0) for _, d in batch], dtype=np.int32),
+            offsets=np.concatenate([[0], np.cumsum(counts)]),
+            boxes=np.concatenate([d.boxes for _, d in batch]).astype(np.float32),
+            scores=np.concatenate([d.scores for _, d in batch]).astype(np.float16),
+            class_ids=np.concatenate([d.class_ids for _, d in batch]).astype(np.int16),
+            names=np.array(json.dumps({str(k): v for k, v in names.items()})),
+        )
+        path = self._batch_path(index, 'npz')
+        if self.remote:
+            write_bytes(path, buffer.getvalue())
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, path)
+
+
+def _run_id(shard=None):
+    """Unique name for one writer run: time, shard, host, pid and a random suffix"""
+    parts = [time.strftime('%Y%m%d-%H%M%S')]
+    if shard:
+        index, count = parse_shard(shard) if isinstance(shard, str) else shard
+        parts.append(f"s{index}of{count}")
+    host = re.sub(r'[^A-Za-z0-9-]', '-', socket.gethostname()) or 'host'
+    parts += [host, str(os.getpid()), uuid.uuid4().hex[:8]]
+    return '-'.join(parts)
+
+
+def _content_type(path):
+    suffix = Path(str(path)).suffix.lower()
+    return {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+            '.webp': 'image/webp'}.get(suffix, 'application/octet-stream')
+
+
+def read_npz(path):
+    """
+    Yield (image_path, DetectionResult) from one npz record batch
+    """
+    with np.load(path) as data:
+        names = {int(k): v for k, v in json.loads(str(data['names'])).items()}
+        offsets = data['offsets']
+        for i, image_path in enumerate(data['images']):
+            sl = slice(offsets[i], offsets[i + 1])
+            yield str(image_path), DetectionResult(data['boxes'][sl], data['scores'][sl].astype(np.float32),
+                                                   data['class_ids'][sl], names,
+                                                   tuple(int(v) for v in data['image_shapes'][i]))
+
+
+def output_options(argv):
+    """
+    Pull --output / --format / --quality / --thumbnail / --writers / --dest out of an argv list
+
+    Returns:
+        tuple: (remaining args, OutputWriter keyword arguments)
+    """
+    flags = {'--output': ('mode', str), '--format': ('detections_format', str), '--quality': ('quality', int),
+             '--thumbnail': ('thumbnail', int), '--writers': ('workers', int), '--dest': ('output_dir', str)}
+    args, options = [], {}
+    i = 0
+    while i < len(argv):
+        if argv[i] in flags and i + 1 < len(argv):
+            key, cast = flags[argv[i]]
+            options[key] = cast(argv[i + 1])
+            i += 2
+        else:
+            args.append(argv[i])
+            i += 1
+    return args, options
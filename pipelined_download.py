@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Pipelined download-and-detect
+Streams video bytes to ffmpeg while they are still being downloaded, so decoding
+and YOLO inference overlap with the network transfer. The bytes are also kept on
+disk (with resume support) so the finished file is still available afterwards.
+
+Usage:
+  python pipelined_download.py <url> [<url> ...] [--workers N] [--model yolov8n.pt] [--imgsz 640]
+  python pipelined_download.py --self-test <local_video_file>
+
+Note: MP4 files must be "faststart" (moov atom first) to be decodable from a
+pipe; YouTube progressive formats and WebM/MKV streams are.
+"""
+
+from cpu_optimized import optimized_model_path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlparse, quote, unquote
+from functools import partial
+from pathlib import Path
+import urllib.request
+import urllib.error
+import numpy as np
+import subprocess
+import threading
+import tempfile
+import json
+import re
+import time
+import sys
+import os
+
+CHUNK_SIZE = 256 * 1024
+DIRECT_MEDIA_EXTENSIONS = {'.mp4', '.webm', '.mkv', '.mov', '.avi', '.ts'}
+
+
+def safe_filename(title):
+    """A video title made safe to use as a file name (no path separators or reserved characters)"""
+    try:
+        from yt_dlp.utils import sanitize_filename
+        name = sanitize_filename(title, restricted=False)
+    except ImportError:
+        name = re.sub(r'[\x00-\x1f/\\:*?"<>|]', '_', title)
+    name = name.strip().strip('.')
+    return name[:200] or 'video'
+
+
+def resolve_media_url(url, max_height=None, imgsz=None):
+    """
+    Turn a page URL into a directly downloadable media URL
+
+    Direct file URLs are returned unchanged; anything else goes through
+    yt-dlp, picking a single-file (progressive) format so one byte stream
+    carries the video. With `imgsz`, the smallest video-only stream that
+    still covers the model input is used instead (see
+    youtube_downloader.select_detection_format); `max_height` caps both.
+
+    Returns:
+        dict: {'url', 'title', 'ext', 'width', 'height', 'headers'}
+    """
+    if Path(urlparse(url).path).suffix.lower() in DIRECT_MEDIA_EXTENSIONS:
+        return {'url': url, 'title': unquote(Path(urlparse(url).path).stem), 'ext': Path(urlparse(url).path).suffix[1:],
+                'width': None, 'height': None, 'headers': {}}
+
+    import yt_dlp
+
+    height_filter = f"[height<={max_height}]" if max_height else ""
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'format': f"best{height_filter}[vcodec!=none][protocol^=http]",
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    if imgsz:
+        from youtube_downloader import select_detection_format
+
+        direct = [f for f in info.get('formats', []) if str(f.get('protocol', '')).startswith('http')
+                  and (not max_height or (f.get('height') or 0) <= max_height)]
+        chosen = select_detection_format(direct, imgsz, duration=info.get('duration'))
+        if chosen is not None:
+            return {
+                'url': chosen['url'],
+                'title': info.get('title', 'video'),
+                'ext': chosen.get('ext', 'mp4'),
+                'width': chosen.get('width'),
+                'height': chosen.get('height'),
+                'headers': chosen.get('http_headers', info.get('http_headers', {})),
+            }
+
+    return {
+        'url': info['url'],
+        'title': info.get('title', 'video'),
+        'ext': info.get('ext', 'mp4'),
+        'width': info.get('width'),
+        'height': info.get('height'),
+        'headers': info.get('http_headers', {}),
+    }
+
+
+def probe_frame_size(url, headers=None):
+    """Read (width, height) of the first video stream without downloading it"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'stream=width,height', '-of', 'json']
+    if headers:
+        cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    out = subprocess.run(cmd + [url], capture_output=True, check=True).stdout
+    stream = json.loads(out)['streams'][0]
+    return int(stream['width']), int(stream['height'])
+
+
+def progressive_fetch(url, dest_path, on_chunk, headers=None, chunk_size=CHUNK_SIZE):
+    """
+    Download `url` to `dest_path`, calling on_chunk(bytes) as data arrives
+
+    A partial `<dest_path>.part` from an interrupted run is resumed with an
+    HTTP Range request. Its existing bytes are replayed through on_chunk
+    first, so the consumer always sees the stream from the beginning.
+
+    Returns:
+        int: Total bytes written
+    """
+    part_path = dest_path + ".part"
+    existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+    request = urllib.request.Request(url, headers=dict(headers or {}))
+    if existing:
+        request.add_header('Range', f"bytes={existing}-")
+
+    try:
+        response = urllib.request.urlopen(request, timeout=30)
+    except urllib.error.HTTPError as e:
+        if e.code != 416:  # 416: the .part file is already complete
+            raise
+        response = None
+
+    resumed = response is None or response.status == 206
+    mode = 'ab' if resumed else 'wb'
+    total = 0
+
+    with open(part_path, mode) as out:
+        if resumed and existing:
+            with open(part_path, 'rb') as previous:
+                while True:
+                    chunk = previous.read(chunk_size)
+                    if not chunk:
+                        break
+                    on_chunk(chunk)
+                    total += len(chunk)
+        if response is not None:
+            with response:
+                expected = response.headers.get('Content-Length')
+                received = 0
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    on_chunk(chunk)
+                    total += len(chunk)
+                    received += len(chunk)
+            # read(n) returns short at EOF instead of raising: keep the .part for a resume
+            if expected is not None and received < int(expected):
+                raise IOError(f"Connection closed after {received} of {expected} bytes")
+
+    os.replace(part_path, dest_path)
+    return total
+
+
+def pipelined_detect(url, model_path='yolov8n.pt', output_path="downloads", confidence=0.5,
+                     max_height=None, imgsz=None, on_frame=None):
+    """
+    Download one video and run detection on it while it downloads
+
+    Args:
+        url (str): YouTube page or direct media URL
+        model_path (str): Path to the YOLO model file
+        output_path (str): Directory for the downloaded file
+        confidence (float): Minimum confidence for detections
+        max_height (int): Optional cap on the selected stream height
+        imgsz (int): Download the smallest stream covering this model input size
+        on_frame (callable): Optional callback(frame_index, frame, result)
+
+    Returns:
+        dict: Download and detection statistics
+    """
+    from ultralytics import YOLO
+
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    media = resolve_media_url(url, max_height, imgsz)
+    dest_path = os.path.join(output_path, f"{safe_filename(media['title'])}.{safe_filename(media['ext'])}")
+
+    width, height = media['width'], media['height']
+    if not width or not height:
+        width, height = probe_frame_size(media['url'], media['headers'])
+    frame_bytes = width * height * 3
+
+    model = YOLO(optimized_model_path(model_path), task='detect')
+
+    decoder = subprocess.Popen(
+        ['ffmpeg', '-loglevel', 'error', '-i', 'pipe:0',
+         '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+
+    stats = {'url': url, 'path': dest_path, 'bytes': 0, 'frames': 0, 'objects': 0,
+             'download_s': None, 'first_detection_s': None, 'total_s': None, 'error': None}
+    start = time.perf_counter()
+
+    def feed():
+        try:
+            stats['bytes'] = progressive_fetch(media['url'], dest_path, decoder.stdin.write, media['headers'])
+        except Exception as e:
+            stats['error'] = str(e)
+        finally:
+            stats['download_s'] = time.perf_counter() - start
+            try:
+                decoder.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    try:
+        while True:
+            raw = decoder.stdout.read(frame_bytes)
+            if len(raw) < frame_bytes:
+                break
+            frame = np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 3)
+            result = model(frame, conf=confidence, verbose=False)[0]
+            if stats['first_detection_s'] is None:
+                stats['first_detection_s'] = time.perf_counter() - start
+            if result.boxes is not None:
+                stats['objects'] += len(result.boxes)
+            if on_frame is not None:
+                on_frame(stats['frames'], frame, result)
+            stats['frames'] += 1
+    finally:
+        decoder.stdout.close()
+        decoder.wait()
+        feeder.join()
+
+    stats['total_s'] = time.perf_counter() - start
+    return stats
+
+
+def download_and_detect_many(urls, max_workers=2, **kwargs):
+    """
+    Run pipelined_detect over several URLs through a bounded worker pool
+
+    Each worker owns its own model instance; at most `max_workers`
+    downloads (and decoders) are in flight at once.
+    """
+    print("🎥 Pipelined Download + Detection")
+    print("=" * 40)
+    print(f"🔗 URLs: {len(urls)}")
+    print(f"👷 Workers: {max_workers}")
+    print("=" * 40)
+
+    reports = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(pipelined_detect, url, **kwargs): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"❌ {url}: {e}")
+                continue
+            reports.append(stats)
+            if stats['error']:
+                print(f"⚠️  {url}: download error: {stats['error']} (partial file kept for resume)")
+            first = stats['first_detection_s']
+            first_text = f"{first:.2f}s" if first is not None else "n/a"
+            print(f"✅ {Path(stats['path']).name}: {stats['frames']} frames, {stats['objects']} objects | "
+                  f"{stats['bytes'] / 1024 / 1024:.1f} MB | download {stats['download_s']:.2f}s | "
+                  f"first detection {first_text} | total {stats['total_s']:.2f}s")
+    return reports
+
+
+class _RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    http.server with single byte-range requests ('bytes=N-' / 'bytes=N-M'),
+    answered with 206 like real media servers; setting `cut_after` on the
+    server drops the next response after that many bytes
+    """
+
+    def send_head(self):
+        self._remaining = None
+        path = self.translate_path(self.path)
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', '').strip())
+        if match is None or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{size}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        limit, self.server.cut_after = getattr(self.server, 'cut_after', None), None
+        remaining = self._remaining
+        while True:
+            size = CHUNK_SIZE
+            if remaining is not None:
+                size = min(size, remaining)
+            if limit is not None:
+                size = min(size, limit)
+            chunk = source.read(size) if size > 0 else b''
+            if not chunk:
+                return
+            outputfile.write(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+            if limit is not None:
+                limit -= len(chunk)
+
+
+def check_resume(url, original, workdir):
+    """
+    Interrupt a download halfway, resume it with a Range request and check
+    that both the file and the byte stream seen by the consumer are intact
+
+    Returns:
+        bool: True when the resumed download matches the original
+    """
+    dest_path = os.path.join(workdir, Path(original).name)
+    expected = Path(original).read_bytes()
+
+    try:
+        progressive_fetch(url, dest_path, lambda chunk: None)
+        print("❌ Resume check: the interrupted download did not fail")
+        return False
+    except Exception as e:
+        partial_bytes = os.path.getsize(dest_path + ".part") if os.path.exists(dest_path + ".part") else 0
+        print(f"✂️  Interrupted after {partial_bytes:,} of {len(expected):,} bytes ({type(e).__name__})")
+
+    seen = []
+    total = progressive_fetch(url, dest_path, seen.append)
+    ok = Path(dest_path).read_bytes() == expected and b''.join(seen) == expected and total == len(expected)
+    if ok:
+        print(f"✅ Resume check: resumed with a Range request, {total:,} bytes intact")
+    else:
+        print("❌ Resume check: the resumed file or stream differs from the original")
+    return ok
+
+
+def self_test(video_file, model_path='yolov8n.pt'):
+    """
+    Serve a local video over HTTP, check interrupted downloads resume, and
+    run the pipeline against it
+    """
+    video_file = Path(video_file).resolve()
+    handler = partial(_RangeRequestHandler, directory=str(video_file.parent))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/{quote(video_file.name)}"
+        print(f"🌐 Serving {video_file.name} at {url}")
+        server.cut_after = max(1, video_file.stat().st_size // 2)
+        with tempfile.TemporaryDirectory(prefix="resume_check_") as workdir:
+            if not check_resume(url, video_file, workdir):
+                return None
+        return download_and_detect_many([url], max_workers=1, model_path=model_path,
+                                        output_path="downloads/self_test")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python pipelined_download.py <url> [<url> ...] [--workers N] [--model yolov8n.pt] [--imgsz 640]")
+        print("  python pipelined_download.py --self-test <local_video_file>")
+        sys.exit(1)
+
+    if sys.argv[1] == '--self-test':
+        self_test(sys.argv[2])
+        sys.exit(0)
+
+    urls = []
+    workers = 2
+    model_path = 'yolov8n.pt'
+    imgsz = None
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        if args[i] == '--workers':
+            workers = int(args[i + 1])
+            i += 2
+        elif args[i] == '--model':
+            model_path = args[i + 1]
+            i += 2
+        elif args[i] == '--imgsz':
+            imgsz = int(args[i + 1])
+            i += 2
+        else:
+            urls.append(args[i])
+            i += 1
+
+    download_and_detect_many(urls, max_workers=workers, model_path=model_path, imgsz=imgsz)
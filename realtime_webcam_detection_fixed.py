@@ -1,13 +1,67 @@
 from ultralytics import YOLO
 import cv2
 import numpy as np
+import queue
 import time
 import sys
+import os
+from detection_results import DetectionResult
+from adaptive_resolution import ResolutionController
+from cpu_autotune import apply_tuning
+from cpu_optimized import optimized_model_path
+from roi_masks import load_roi
 
-def realtime_webcam_detection():
+def draw_detections(frame, detection):
+    """
+    Draw detections on the frame in place, with the custom 'person' → 'gay' label
+    """
+    for x1, y1, x2, y2, conf, class_name in detection:
+        # Replace 'person' with 'gay'
+        if class_name == 'person':
+            class_name = 'gay'
+        
+        # Draw bounding box
+        color = (0, 255, 0)  # Green for default
+        if class_name == 'gay':
+            color = (0, 0, 255)  # Red for 'gay'
+        
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        
+        # Create label text
+        label = f"{class_name} {conf:.2f}"
+        
+        # Calculate text size
+        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        
+        # Draw label background
+        cv2.rectangle(frame, (x1, y1 - text_height - 10), (x1 + text_width, y1), color, -1)
+        
+        # Draw label text
+        cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+def detect_frame(model, frame, imgsz=640, roi=None):
+    """
+    Run the model on a frame, restricted to the camera's ROI when one is configured
+    (see roi_masks.py); boxes are always in full-frame coordinates
+    """
+    inp = roi.prepare(frame) if roi is not None else frame
+    results = model(inp, imgsz=imgsz, verbose=False)
+    detection = DetectionResult.from_ultralytics(results[0], model.names)
+    return roi.restore(detection) if roi is not None else detection
+
+def realtime_webcam_detection(target_fps=None, capture=None, headless=None, max_frames=None):
     """
     Real-time object detection using webcam with custom label replacement
+    
+    Args:
+        target_fps (float): If set, adapt the model input size between
+                            320 and 640 to hold this frame rate
+        capture: Capture object to use instead of probing for a webcam,
+                 e.g. a ReplayCapture (replay_source.py)
+        headless (bool): Skip imshow/waitKey (default: HEADLESS=1 env var)
+        max_frames (int): Stop after this many frames
     """
+    headless = os.environ.get('HEADLESS') == '1' if headless is None else headless
     
     print("🎥 Real-time Webcam Detection")
     print("=" * 40)
@@ -19,16 +73,21 @@ def realtime_webcam_detection():
     try:
         # Load YOLO model
         print("🔍 Loading YOLO model...")
-        model = YOLO('yolov8n.pt')
+        apply_tuning('yolov8n.pt', 'video')
+        # The optimized graph has a fixed input size, so adaptive mode stays eager
+        model = YOLO('yolov8n.pt' if target_fps else optimized_model_path('yolov8n.pt'), task='detect')
         
         # Try different webcam indices
         webcam_index = 0
-        cap = None
+        cap = capture
         
-        print("📹 Trying to initialize webcam...")
+        if cap is not None:
+            print(f"📼 Using capture source: {getattr(cap, 'source', cap)}")
+        else:
+            print("📹 Trying to initialize webcam...")
         
         # Try different webcam indices
-        for i in range(3):  # Try indices 0, 1, 2
+        for i in range(3 if cap is None else 0):  # Try indices 0, 1, 2
             print(f"Trying webcam index {i}...")
             cap = cv2.VideoCapture(i)
             
@@ -44,6 +103,10 @@ def realtime_webcam_detection():
             else:
                 cap.release()
         
+        if capture is not None and not cap.isOpened():
+            print(f"❌ Error: Could not open capture source {getattr(cap, 'source', cap)}")
+            return
+        
         # If no webcam found, try with different backend
         if cap is None or not cap.isOpened():
             print("🔄 Trying with different backend...")
@@ -64,63 +127,38 @@ def realtime_webcam_detection():
         
         print(f"📐 Resolution: {width}x{height}")
         print(f"🎬 FPS: {fps}")
+        
+        roi = load_roi(getattr(cap, 'source', webcam_index), (height, width))
+        if roi:
+            print(f"🛣️  ROI: {roi.describe()}")
         print("✅ Starting real-time detection...")
         print("💡 If you see a blank screen, check camera permissions!")
         
         # Performance tracking
         frame_count = 0
         start_time = time.time()
+        latencies = []
+        
+        # Adaptive input size (fixed 640 when no target FPS is given)
+        controller = ResolutionController(target_fps) if target_fps else None
+        imgsz = controller.imgsz if controller else 640
         
         while True:
+            frame_start = time.perf_counter()
+            
             # Capture frame
             ret, frame = cap.read()
             if not ret:
                 print("❌ Error: Could not read frame")
                 break
             
-            # Run YOLO inference
-            results = model(frame, verbose=False)
+            # Run YOLO inference (on the ROI crop when configured)
+            detection = detect_frame(model, frame, imgsz, roi)
             
             # Process results
-            for result in results:
-                # Get bounding boxes and labels
-                if result.boxes is not None:
-                    boxes = result.boxes
-                    
-                    for i, box in enumerate(boxes):
-                        # Get coordinates
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                        
-                        # Get confidence
-                        conf = float(box.conf[0].cpu().numpy())
-                        
-                        # Get class name
-                        class_id = int(box.cls[0].cpu().numpy())
-                        class_name = model.names[class_id]
-                        
-                        # Replace 'person' with 'gay'
-                        if class_name == 'person':
-                            class_name = 'gay'
-                        
-                        # Draw bounding box
-                        color = (0, 255, 0)  # Green for default
-                        if class_name == 'gay':
-                            color = (0, 0, 255)  # Red for 'gay'
-                        
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                        
-                        # Create label text
-                        label = f"{class_name} {conf:.2f}"
-                        
-                        # Calculate text size
-                        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                        
-                        # Draw label background
-                        cv2.rectangle(frame, (x1, y1 - text_height - 10), (x1 + text_width, y1), color, -1)
-                        
-                        # Draw label text
-                        cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            if roi:
+                roi.draw(frame)
+            draw_detections(frame, detection)
             
             # Calculate and display FPS
             frame_count += 1
@@ -133,12 +171,26 @@ def realtime_webcam_detection():
                 fps_text = f"FPS: {current_fps:.1f}"
                 cv2.putText(frame, fps_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             
+            if controller:
+                cv2.putText(frame, f"imgsz: {imgsz}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            
+            # Capture→result latency, when the source timestamps its frames
+            if getattr(cap, 'last_timestamp', None) is not None:
+                latencies.append((time.perf_counter() - cap.last_timestamp) * 1000)
+            
             # Display frame
-            cv2.imshow('Real-time YOLO Detection', frame)
+            if not headless:
+                cv2.imshow('Real-time YOLO Detection', frame)
+                
+                # Check for quit command
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
             
-            # Check for quit command
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if max_frames and frame_count >= max_frames:
                 break
+            
+            if controller:
+                imgsz = controller.update(time.perf_counter() - frame_start)
         
         # Calculate final statistics
         end_time = time.time()
@@ -149,6 +201,18 @@ def realtime_webcam_detection():
         print(f"Total frames processed: {frame_count}")
         print(f"Total time: {total_time:.2f} seconds")
         print(f"Average FPS: {avg_fps:.2f}")
+        if roi:
+            print(f"ROI effective resolution gain: {roi.resolution_gain():.2f}x")
+        if latencies:
+            print(f"Capture→result latency: p50 {np.percentile(latencies, 50):.1f} ms, "
+                  f"p99 {np.percentile(latencies, 99):.1f} ms")
+        if hasattr(cap, 'stats'):
+            print(f"Source frames: {cap.stats['scheduled']} scheduled, {cap.stats['delivered']} delivered, "
+                  f"{cap.stats['injected_drops']} dropped at source, {cap.stats['overruns']} missed (too slow)")
+            print(f"Drop rate: {cap.drop_rate_observed():.1%}")
+        if controller:
+            print(f"Resolution changes: {len(controller.log) - 1}")
+            print(f"Resolution log saved to: {controller.save_log()}")
         
     except Exception as e:
         print(f"❌ Error during detection: {str(e)}")
@@ -159,12 +223,16 @@ def realtime_webcam_detection():
         # Clean up
         if 'cap' in locals() and cap is not None:
             cap.release()
-        cv2.destroyAllWindows()
+        if not headless:
+            cv2.destroyAllWindows()
         print("✅ Webcam released and windows closed")
 
-def test_with_video():
+def test_with_video(target_fps=None):
     """
     Test the detection with a video file instead of webcam
+    
+    Args:
+        target_fps (float): If set, adapt the model input size to hold this frame rate
     """
     print("🎬 Testing with video file...")
     
@@ -174,7 +242,9 @@ def test_with_video():
     try:
         # Load YOLO model
         print("🔍 Loading YOLO model...")
-        model = YOLO('yolov8n.pt')
+        apply_tuning('yolov8n.pt', 'video')
+        # The optimized graph has a fixed input size, so adaptive mode stays eager
+        model = YOLO('yolov8n.pt' if target_fps else optimized_model_path('yolov8n.pt'), task='detect')
         
         # Open video file
         cap = cv2.VideoCapture(video_path)
@@ -186,45 +256,31 @@ def test_with_video():
         print("✅ Video opened successfully!")
         print("Press 'q' to quit, 's' to skip frames")
         
+        roi = load_roi(video_path, (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))))
+        if roi:
+            print(f"🛣️  ROI: {roi.describe()}")
+        
         frame_count = 0
         start_time = time.time()
         
+        controller = ResolutionController(target_fps) if target_fps else None
+        imgsz = controller.imgsz if controller else 640
+        
         while True:
+            frame_start = time.perf_counter()
+            
             ret, frame = cap.read()
             if not ret:
                 print("✅ End of video reached")
                 break
             
-            # Run YOLO inference
-            results = model(frame, verbose=False)
+            # Run YOLO inference (on the ROI crop when configured)
+            detection = detect_frame(model, frame, imgsz, roi)
             
             # Process results (same as webcam version)
-            for result in results:
-                if result.boxes is not None:
-                    boxes = result.boxes
-                    
-                    for i, box in enumerate(boxes):
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                        
-                        conf = float(box.conf[0].cpu().numpy())
-                        class_id = int(box.cls[0].cpu().numpy())
-                        class_name = model.names[class_id]
-                        
-                        # Replace 'person' with 'gay'
-                        if class_name == 'person':
-                            class_name = 'gay'
-                        
-                        color = (0, 255, 0)
-                        if class_name == 'gay':
-                            color = (0, 0, 255)
-                        
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                        
-                        label = f"{class_name} {conf:.2f}"
-                        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                        cv2.rectangle(frame, (x1, y1 - text_height - 10), (x1 + text_width, y1), color, -1)
-                        cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            if roi:
+                roi.draw(frame)
+            draw_detections(frame, detection)
             
             # Display frame
             cv2.imshow('Video Detection Test', frame)
@@ -239,6 +295,9 @@ def test_with_video():
                     cap.read()
             
             frame_count += 1
+            
+            if controller:
+                imgsz = controller.update(time.perf_counter() - frame_start)
         
         cap.release()
         cv2.destroyAllWindows()
@@ -251,24 +310,213 @@ def test_with_video():
         print(f"Total frames processed: {frame_count}")
         print(f"Total time: {total_time:.2f} seconds")
         print(f"Average FPS: {avg_fps:.2f}")
+        if roi:
+            print(f"ROI effective resolution gain: {roi.resolution_gain():.2f}x")
+        if controller:
+            print(f"Resolution changes: {len(controller.log) - 1}")
+            print(f"Resolution log saved to: {controller.save_log()}")
         
     except Exception as e:
         print(f"❌ Error during video test: {str(e)}")
 
+def _open_source(source):
+    """Open a webcam index or a video path, probing indices 0-2 for webcams"""
+    if isinstance(source, int):
+        for i in range(source, 3):
+            cap = cv2.VideoCapture(i)
+            if cap.isOpened() and cap.read()[0]:
+                return cap
+            cap.release()
+        return cv2.VideoCapture(0, cv2.CAP_AVFOUNDATION)  # macOS specific
+    return cv2.VideoCapture(source)
+
+def _capture_stage(ring, source, stop, capture_done):
+    """Decode frames straight into ring slots"""
+    cap = _open_source(source)
+    try:
+        while not stop.is_set():
+            slot = ring.acquire_write(timeout=0.5)
+            if slot is None:
+                if ring.policy == 'block':
+                    continue  # timed out waiting for a slot; check stop and retry
+                # Frame dropped under this policy: still consume it so a live
+                # camera does not queue stale frames inside the driver
+                if not cap.grab():
+                    break
+                continue
+            view = ring.frame(slot)
+            ret, frame = cap.read(view)
+            if not ret:
+                ring.release(slot)
+                break
+            if not np.shares_memory(frame, view):
+                # OpenCV allocated its own buffer (size mismatch): copy once
+                view[:] = frame if frame.shape == view.shape else cv2.resize(frame, (view.shape[1], view.shape[0]))
+            ring.commit_write(slot)
+    finally:
+        cap.release()
+        capture_done.set()
+
+def _inference_stage(ring, model_path, names_queue, stop, capture_done, inference_done, source=None):
+    """Run YOLO on captured slots in place and attach detection rows"""
+    from frame_ring import CAPTURED, INFERRING, DETECTED
+    from model_loader import load_model
+    
+    try:
+        try:
+            model = load_model(model_path, input_type='video')
+            roi = load_roi(source, ring.frame_shape) if source is not None else None
+        except Exception as e:
+            # Tell the parent instead of leaving it waiting for the class names
+            names_queue.put(f"{type(e).__name__}: {e}")
+            raise
+        names_queue.put(model.names)
+        while not stop.is_set():
+            slot = ring.acquire(CAPTURED, INFERRING, timeout=0.1)
+            if slot is None:
+                if capture_done.is_set() and ring.count(CAPTURED) == 0:
+                    break
+                continue
+            detection = detect_frame(model, ring.frame(slot), roi=roi)
+            rows = np.concatenate([detection.boxes, detection.scores[:, None],
+                                   detection.class_ids[:, None].astype(np.float32)], axis=1)
+            ring.set_detections(slot, rows)
+            ring.release(slot, DETECTED)
+    finally:
+        inference_done.set()
+
+def run_multiprocess_pipeline(source=0, model_path='yolov8n.pt', slots=4, policy=None):
+    """
+    Capture, inference and rendering in separate processes
+    
+    Frames are decoded directly into a shared-memory ring (frame_ring.py)
+    and detections are written next to them, so nothing is pickled between
+    stages.
+    
+    Args:
+        source: Webcam index (int) or video file path
+        model_path (str): Path to the YOLO model file
+        slots (int): Number of frame slots in the ring
+        policy (str): 'overwrite' (default for webcams), 'drop', or
+                      'block' (default for video files, lossless)
+    """
+    from frame_ring import FrameRing, DETECTED, RENDERING
+    import multiprocessing as mp
+    
+    policy = policy or ('overwrite' if isinstance(source, int) else 'block')
+    print("🎥 Multi-process Detection Pipeline")
+    print("=" * 40)
+    print(f"Source: {source}")
+    print(f"Ring: {slots} slots, policy '{policy}'")
+    print("Press 'q' to quit")
+    print("=" * 40)
+    
+    # Probe the frame size once so the ring slots can be preallocated
+    cap = _open_source(source)
+    ret, probe = cap.read()
+    cap.release()
+    if not ret:
+        print(f"❌ Error: Could not read from source {source}")
+        return
+    
+    ring = FrameRing(slots, probe.shape, policy=policy)
+    stop, capture_done, inference_done = mp.Event(), mp.Event(), mp.Event()
+    names_queue = mp.Queue()
+    stages = [
+        mp.Process(target=_capture_stage, args=(ring, source, stop, capture_done), daemon=True),
+        mp.Process(target=_inference_stage, args=(ring, model_path, names_queue, stop, capture_done,
+                                                  inference_done, source), daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+    
+    # Wait for the model to load, but not forever if the inference stage dies
+    names = None
+    while names is None:
+        try:
+            names = names_queue.get(timeout=1.0)
+        except queue.Empty:
+            if not stages[1].is_alive():
+                names = f"inference process exited with code {stages[1].exitcode}"
+    if isinstance(names, str):
+        print(f"❌ Error: Could not start inference: {names}")
+        stop.set()
+        for stage in stages:
+            stage.join(timeout=5)
+        ring.close()
+        return
+    
+    frame_count = 0
+    latencies = []
+    start_time = time.time()
+    try:
+        while True:
+            slot = ring.acquire(DETECTED, RENDERING, timeout=0.1)
+            if slot is None:
+                if inference_done.is_set():
+                    break
+                continue
+            
+            frame = ring.frame(slot)  # drawn on in place; the slot is ours until released
+            rows = ring.detections(slot)
+            draw_detections(frame, DetectionResult(rows[:, :4], rows[:, 4], rows[:, 5], names))
+            cv2.imshow('Multi-process YOLO Detection', frame)
+            latencies.append((time.monotonic_ns() - ring.timestamp_ns(slot)) / 1e6)
+            ring.release(slot)
+            frame_count += 1
+            
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join(timeout=5)
+        cv2.destroyAllWindows()
+        
+        total_time = time.time() - start_time
+        print(f"\n📊 Pipeline Statistics:")
+        print(f"Frames captured: {ring.frames_written}")
+        print(f"Frames rendered: {frame_count}")
+        print(f"Dropped (no free slot): {ring.dropped}")
+        print(f"Overwritten before inference: {ring.overwritten}")
+        if ring.truncated:
+            print(f"⚠️  Detections truncated to {ring.max_detections} on {ring.truncated} frames")
+        if total_time > 0:
+            print(f"Average FPS: {frame_count / total_time:.2f}")
+        if latencies:
+            print(f"Capture→render latency: p50 {np.percentile(latencies, 50):.1f} ms, "
+                  f"p99 {np.percentile(latencies, 99):.1f} ms")
+        ring.close()
+
 if __name__ == "__main__":
     print("Choose an option:")
     print("1. Try webcam (may need permissions)")
     print("2. Test with video file")
+    print("3. Multi-process pipeline with webcam")
+    print("4. Multi-process pipeline with video file")
+    
+    choice = input("Enter choice (1-4): ").strip()
     
-    choice = input("Enter choice (1 or 2): ").strip()
+    if choice == "3":
+        run_multiprocess_pipeline(0)
+        sys.exit(0)
+    elif choice == "4":
+        run_multiprocess_pipeline("videos/LOS SITP DE BOGOTÁ_correctly_trimmed.mp4")
+        sys.exit(0)
+    
+    target_fps = input("Target FPS for adaptive resolution (Enter = fixed 640): ").strip()
+    try:
+        target_fps = float(target_fps) if target_fps else None
+    except ValueError:
+        target_fps = None
     
     if choice == "1":
-        realtime_webcam_detection()
+        realtime_webcam_detection(target_fps)
     elif choice == "2":
-        test_with_video()
+        test_with_video(target_fps)
     else:
         print("Invalid choice. Running webcam detection...")
-        realtime_webcam_detection()
+        realtime_webcam_detection(target_fps)
 
 
 
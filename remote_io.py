@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Remote image sources and result sinks (HTTP(S) and S3-compatible object stores)
+Batch detectors accept URIs wherever they take a folder:
+
+  http(s)://host/path/   directory listing (HTML index, as served by http.server
+                         or nginx autoindex) or a text file with one URL per line
+  s3://bucket/prefix/    S3 or any S3-compatible store (MinIO, Ceph, ...); needs
+                         boto3, endpoint from $BUS_DETECTION_S3_ENDPOINT or
+                         $AWS_ENDPOINT_URL
+
+Images are fetched by a bounded pool of threads with keep-alive connections
+(per-host HTTP connections, boto3's own connection pool) and decoded from memory
+at the reduced scale the model needs (see fast_image_loader.decode_image); no
+temporary files. Prefetching keeps at most `in_flight` images being fetched or
+waiting for the detector, in source order.
+Transient HTTP failures (connection errors, timeouts, 429/5xx) are retried with
+exponential backoff; images that still fail are not marked done in the manifest.
+
+Results go to the same kinds of URIs: OutputWriter uploads annotated images from
+its writer threads and detection records in batches (see output_writer.py).
+
+Usage:
+  python remote_io.py --self-test <local_image_folder> [--in-flight 16] [--latency 20] [--limit N]
+  python remote_io.py --list <uri>
+"""
+
+from image_source import ImageSource, IMAGE_EXTENSIONS
+from fast_image_loader import Preloaded, decode_image, load_image
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from html.parser import HTMLParser
+from urllib.parse import urlparse, urljoin, unquote, quote
+from collections import deque
+from functools import partial
+from pathlib import Path
+import http.client
+import threading
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+REMOTE_SCHEMES = ('http://', 'https://', 's3://')
+REQUEST_TIMEOUT = 30
+RETRIES = 4                 # HTTP attempts after the first; boto3 retries S3 calls itself
+RETRY_BACKOFF = 0.5         # seconds before the first retry, doubled for each further one
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+_local = threading.local()
+_s3 = None
+_s3_lock = threading.Lock()
+
+
+def is_remote(uri):
+    return str(uri).startswith(REMOTE_SCHEMES)
+
+
+def join_uri(base, name):
+    """os.path.join for local paths, '/'-join for URIs"""
+    if is_remote(base):
+        return f"{str(base).rstrip('/')}/{name}"
+    return os.path.join(base, name)
+
+
+# ----- HTTP with per-thread keep-alive connections ------------------------------
+
+def _connection(scheme, netloc):
+    pool = getattr(_local, 'connections', None)
+    if pool is None:
+        pool = _local.connections = {}
+    key = (scheme, netloc)
+    conn = pool.get(key)
+    if conn is None:
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        conn = pool[key] = cls(netloc, timeout=REQUEST_TIMEOUT)
+    return conn
+
+
+def _http_request(method, url, body=None, headers=None):
+    """
+    One request over this thread's pooled connection to the host
+
+    Returns:
+        tuple: (status, response headers, body bytes)
+    """
+    parsed = urlparse(url)
+    target = parsed.path or '/'
+    if parsed.query:
+        target += f"?{parsed.query}"
+    for attempt in range(2):
+        conn = _connection(parsed.scheme, parsed.netloc)
+        try:
+            conn.request(method, target, body=body, headers=headers or {})
+            response = conn.getresponse()
+            data = response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+            return response.status, response.headers, data
+        except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionError):
+            # The server closed the idle keep-alive connection: reconnect once
+            conn.close()
+            _local.connections.pop((parsed.scheme, parsed.netloc), None)
+            if attempt:
+                raise
+
+
+class _HTTPStatusError(IOError):
+    def __init__(self, method, url, status):
+        super().__init__(f"{method} {url} returned HTTP {status}")
+        self.status = status
+
+
+def _http_with_retries(method, url, ok_statuses, body=None, headers=None):
+    """
+    _http_request with exponential backoff on connection errors, timeouts and
+    transient statuses (RETRY_STATUSES); other error statuses fail at once
+
+    Returns:
+        tuple: (response headers, body bytes)
+    """
+    for attempt in range(RETRIES + 1):
+        try:
+            status, response_headers, data = _http_request(method, url, body=body, headers=headers)
+            if status in ok_statuses:
+                return response_headers, data
+            raise _HTTPStatusError(method, url, status)
+        except (OSError, http.client.HTTPException) as e:
+            if attempt == RETRIES or (isinstance(e, _HTTPStatusError) and e.status not in RETRY_STATUSES):
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href and not href.startswith(('?', '#', '../')):
+                self.links.append(href)
+
+
+def _list_http(url, recursive, extensions, visited=None):
+    """Yield image URLs under an HTTP directory index (or URL list), sorted per directory"""
+    visited = visited if visited is not None else set()
+    if url in visited:
+        return
+    visited.add(url)
+    headers, body = _http_with_retries('GET', url, (200,))
+    text = body.decode('utf-8', errors='replace')
+    index = 'html' in headers.get('Content-Type', '')
+    if index:
+        parser = _LinkParser()
+        parser.feed(text)
+        links = parser.links
+    else:
+        links = [line.strip() for line in text.splitlines() if line.strip() and not line.startswith('#')]
+
+    entries = sorted({urljoin(url, link) for link in links})
+    for entry in entries:
+        if index and not entry.startswith(url):
+            continue  # index links out of this tree
+        if entry.endswith('/'):
+            if recursive and entry != url:
+                yield from _list_http(entry, recursive, extensions, visited)
+        elif unquote(urlparse(entry).path).lower().endswith(extensions):
+            yield entry
+
+
+# ----- S3 ---------------------------------------------------------------------
+
+def _s3_client(max_pool_connections=32):
+    """Shared boto3 client; its connection pool is sized for the fetcher threads"""
+    global _s3
+    with _s3_lock:
+        if _s3 is None:
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError:
+                raise ImportError("s3:// URIs need boto3: pip install boto3")
+            endpoint = os.environ.get('BUS_DETECTION_S3_ENDPOINT') or os.environ.get('AWS_ENDPOINT_URL')
+            _s3 = boto3.client('s3', endpoint_url=endpoint,
+                               config=Config(max_pool_connections=max_pool_connections,
+                                             retries={'max_attempts': 5, 'mode': 'adaptive'}))
+        return _s3
+
+
+def _split_s3(uri):
+    parsed = urlparse(uri)
+    return parsed.netloc, parsed.path.lstrip('/')
+
+
+def _list_s3(uri, recursive, extensions):
+    """Yield image URIs under an S3 prefix (the listing is already in key order)"""
+    bucket, prefix = _split_s3(uri)
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    if not recursive:
+        kwargs['Delimiter'] = '/'
+    for page in _s3_client().get_paginator('list_objects_v2').paginate(**kwargs):
+        for obj in page.get('Contents', []):
+            if obj['Key'].lower().endswith(extensions):
+                yield f"s3://{bucket}/{obj['Key']}"
+
+
+# ----- generic read / write / list ---------------------------------------------
+
+def list_images(uri, recursive=True, extensions=IMAGE_EXTENSIONS):
+    """Yield image URIs under a remote folder URI in a stable order"""
+    extensions = tuple(e.lower() for e in extensions)
+    if str(uri).startswith('s3://'):
+        return _list_s3(uri, recursive, extensions)
+    return _list_http(uri, recursive, extensions)
+
+
+def read_bytes(uri):
+    """Fetch an object (or read a local file) into memory, retrying transient failures"""
+    uri = str(uri)
+    if uri.startswith('s3://'):
+        bucket, key = _split_s3(uri)
+        return _s3_client().get_object(Bucket=bucket, Key=key)['Body'].read()
+    if is_remote(uri):
+        return _http_with_retries('GET', uri, (200,))[1]
+    with open(uri, 'rb') as f:
+        return f.read()
+
+
+def write_bytes(uri, data, content_type='application/octet-stream'):
+    """Store `data` at a URI (S3 PutObject, HTTP PUT) or a local path"""
+    uri = str(uri)
+    if uri.startswith('s3://'):
+        bucket, key = _split_s3(uri)
+        _s3_client().put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+        return
+    if is_remote(uri):
+        _http_with_retries('PUT', uri, (200, 201, 204), body=data,
+                           headers={'Content-Type': content_type, 'Content-Length': str(len(data))})
+        return
+    os.makedirs(os.path.dirname(uri) or '.', exist_ok=True)
+    with open(uri, 'wb') as f:
+        f.write(data)
+
+
+# ----- sources ------------------------------------------------------------------
+
+class RemoteImageSource(ImageSource):
+    """
+    ImageSource over a remote folder URI
+
+    Sharding and the resume manifest work as for local folders; keys are
+    the '/'-separated paths relative to the URI.
+    """
+
+    def _resolve_root(self, root):
+        root = str(root)
+        # A folder URI gets its trailing '/'; a URL list file is kept as it is
+        if not Path(urlparse(root).path).suffix:
+            root = root.rstrip('/') + '/'
+        self._base = root.rsplit('/', 1)[0] + '/'
+        return root
+
+    def _relative_key(self, path):
+        relative = path[len(self._base):] if path.startswith(self._base) else path
+        if not path.startswith('s3://'):
+            relative = unquote(relative)
+        # A single component, so keys compare as whole strings: the order
+        # S3 lists keys in, which the resume watermark relies on
+        return (relative,)
+
+    def _walk(self, directory, key, visited):
+        uris = list_images(self.root, self.recursive, self.extensions)
+        if not self.root.startswith('s3://'):
+            # HTTP indexes are walked directory by directory
+            uris = sorted(uris, key=self._relative_key)
+        for uri in uris:
+            yield uri, self._relative_key(uri)
+
+
+def open_image_source(root, recursive=True, shard=None, manifest_path=None):
+    """ImageSource for a local folder, RemoteImageSource for a URI"""
+    cls = RemoteImageSource if is_remote(root) else ImageSource
+    return cls(root, recursive, shard, manifest_path)
+
+
+class ImageFetcher:
+    """
+    Fetch and decode images ahead of the detector on a bounded thread pool
+
+    Args:
+        in_flight (int): Images being fetched/decoded or waiting to be consumed
+        imgsz (int): Model input size (decode at the matching reduced scale)
+    """
+
+    def __init__(self, in_flight=16, imgsz=640):
+        self.in_flight = max(1, in_flight)
+        self.imgsz = imgsz
+        self._pool = ThreadPoolExecutor(max_workers=self.in_flight, thread_name_prefix="image-fetch")
+        self.stats = {'images': 0, 'bytes': 0, 'errors': 0, 'fetch_s': 0.0, 'wait_s': 0.0}
+        self._lock = threading.Lock()
+
+    def _fetch(self, uri):
+        start = time.perf_counter()
+        encoded = None
+        if is_remote(uri):
+            data = read_bytes(uri)
+            image, scale = decode_image(data, self.imgsz)
+            size = len(data)
+            if tuple(scale) != (1.0, 1.0):
+                encoded = data  # kept for a full-resolution decode if the result is drawn
+        else:
+            image, scale = load_image(uri, self.imgsz)
+            size = os.path.getsize(uri)
+        if image is None:
+            raise IOError("could not decode the image")
+        with self._lock:
+            self.stats['fetch_s'] += time.perf_counter() - start
+            self.stats['bytes'] += size
+        return Preloaded(image, scale, encoded)
+
+    def prefetch(self, uris, decode_local=True):
+        """
+        Yield (uri, Preloaded) in the order of `uris`; Preloaded is None when
+        the fetch or decode failed
+
+        With `decode_local=False`, local files are passed through undecoded
+        (Preloaded with image None), for a detection daemon that reads them itself.
+        """
+        pending = deque()
+        uris = iter(uris)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.in_flight:
+                uri = next(uris, None)
+                if uri is None:
+                    exhausted = True
+                    break
+                if not decode_local and not is_remote(uri):
+                    pending.append((uri, None))
+                else:
+                    pending.append((uri, self._pool.submit(self._fetch, uri)))
+            if not pending:
+                return
+            uri, future = pending.popleft()
+            if future is None:
+                yield uri, Preloaded(None, None)
+                continue
+            start = time.perf_counter()
+            try:
+                preloaded = future.result()
+            except Exception as e:
+                print(f"❌ Could not fetch {uri}: {e}")
+                preloaded = None
+            self.stats['wait_s'] += time.perf_counter() - start
+            self.stats['images' if preloaded is not None else 'errors'] += 1
+            yield uri, preloaded
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def describe(self):
+        s = self.stats
+        text = f"{s['images']} images fetched ({s['bytes'] / 1024 / 1024:.1f} MB), " \
+               f"detector waited {s['wait_s']:.2f}s"
+        if s['errors']:
+            text += f", {s['errors']} failed"
+        return text
+
+
+# ----- local stand-in server ------------------------------------------------------
+
+class _StandInHandler(SimpleHTTPRequestHandler):
+    """http.server with keep-alive, PUT uploads and an optional per-request latency"""
+
+    protocol_version = 'HTTP/1.1'
+    latency_s = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency_s)
+        super().do_GET()
+
+    def do_PUT(self):
+        time.sleep(self.latency_s)
+        path = self.translate_path(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def serve_folder(folder, latency_ms=0.0):
+    """
+    Serve `folder` over HTTP on a free local port (GET, directory listings, PUT)
+
+    Returns:
+        tuple: (server, base URL); call server.shutdown() when done
+    """
+    handler = type('Handler', (_StandInHandler,), {'latency_s': latency_ms / 1000.0})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=str(folder)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def self_test(folder, in_flight=16, latency_ms=20.0, limit=None):
+    """
+    Serve a local image folder and compare fetch/decode throughput: local disk,
+    one request at a time, and the concurrent prefetcher; then time a bulk upload
+    """
+    print("🌐 Remote I/O Self-Test")
+    print("=" * 40)
+    print(f"📂 Folder: {folder}")
+    print(f"⏱️  Simulated request latency: {latency_ms:.0f} ms")
+    print(f"🔀 In flight: {in_flight}")
+    print("=" * 40)
+
+    folder = Path(folder).resolve()
+    server, base_url = serve_folder(folder.parent, latency_ms)
+    # Uploads go to a scratch folder behind a second stand-in server
+    upload_dir = tempfile.mkdtemp(prefix="upload_test_")
+    upload_server, upload_url = serve_folder(upload_dir, latency_ms)
+    try:
+        root = f"{base_url}{quote(folder.name)}/"
+        remote = list(list_images(root))
+        local = [str(p) for p in sorted(folder.rglob('*')) if p.suffix.lower() in IMAGE_EXTENSIONS]
+        if limit:
+            remote, local = remote[:limit], local[:limit]
+        if not remote:
+            print(f"❌ No images found in {folder}")
+            return None
+        print(f"🖼️  {len(remote)} images listed from {root}")
+
+        runs = (('local disk', local, in_flight), ('http, 1 in flight', remote, 1),
+                (f'http, {in_flight} in flight', remote, in_flight))
+        results = {}
+        for label, uris, n in runs:
+            with ImageFetcher(n) as fetcher:
+                start = time.perf_counter()
+                for _ in fetcher.prefetch(uris):
+                    pass
+                elapsed = time.perf_counter() - start
+            rate = len(uris) / elapsed
+            results[label] = rate
+            print(f"  {label:<22} {rate:8.1f} images/s | {fetcher.stats['bytes'] / elapsed / 1024 / 1024:7.1f} MB/s"
+                  f"{' | ' + str(fetcher.stats['errors']) + ' errors' if fetcher.stats['errors'] else ''}")
+
+        # Bulk upload of the same bytes through the output writer's thread pool
+        from output_writer import OutputWriter
+        payloads = [read_bytes(p) for p in local]
+        sink = f"{upload_url}uploads"
+        start = time.perf_counter()
+        with OutputWriter(sink, workers=in_flight) as writer:
+            for path, data in zip(local, payloads):
+                writer.submit_bytes(writer.path(Path(path).name), data)
+        elapsed = time.perf_counter() - start
+        print(f"  {'upload (PUT)':<22} {len(payloads) / elapsed:8.1f} images/s | {writer.describe()}")
+        print(f"\n🚀 Prefetch speed-up over one request at a time: "
+              f"{results[runs[2][0]] / results[runs[1][0]]:.2f}x")
+        return results
+    finally:
+        server.shutdown()
+        upload_server.shutdown()
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def _option(args, name, cast, default):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('--self-test', '--list'):
+        print("Usage:")
+        print("  python remote_io.py --self-test <local_image_folder> [--in-flight 16] [--latency 20] [--limit N]")
+        print("  python remote_io.py --list <uri>")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    if args[0] == '--list':
+        for uri in list_images(args[1]):
+            print(uri)
+    else:
+        self_test(args[1], _option(args, '--in-flight', int, 16), _option(args, '--latency', float, 20.0),
+                  _option(args, '--limit', int, None))
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Deterministic replay capture source
+Plays a video file or an image folder as if it were a live camera: frame i
+"arrives" at i / fps seconds of wall-clock time, and read() returns what a camera
+driver would hand over at that moment. A consumer slower than the source misses
+frames (overruns); a faster one waits for the next arrival. Jitter, bursts and
+dropped frames can be injected from a seed, so runs are reproducible on headless
+machines without a webcam.
+
+ReplayCapture has the cv2.VideoCapture methods the realtime loops use (isOpened,
+read, grab, get, release) and can be passed to them in place of a camera.
+
+Usage:
+  python replay_source.py <video|image_folder> [--fps 15] [--jitter 5] [--burst 60:5] [--drop 0.02]
+                          [--seed 0] [--buffer 1] [--loop] [--show] [--target-fps N] [--max-frames N]
+"""
+
+from pathlib import Path
+import numpy as np
+import time
+import sys
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+
+class ReplayCapture:
+    """
+    Args:
+        source (str): Video file or folder of images (played in name order)
+        fps (float): Playback rate; defaults to the video's own rate (30 for folders)
+        jitter_ms (float): Std-dev of Gaussian arrival jitter per frame
+        burst_every (int): Every this many frames, hold frames back and
+                           release `burst_len` of them at once (0 = off)
+        burst_len (int): Frames per burst
+        drop_rate (float): Probability that a frame never arrives
+        seed (int): Seed for jitter, bursts and drops
+        buffer (int): Frames the "driver" keeps; older unread frames are overrun
+        loop (bool): Restart at the end instead of reporting end of stream
+    """
+
+    def __init__(self, source, fps=None, jitter_ms=0.0, burst_every=0, burst_len=0, drop_rate=0.0,
+                 seed=0, buffer=1, loop=False):
+        import cv2
+
+        self.source = str(source)
+        self._cv2 = cv2
+        self._images = None
+        self._cap = None
+        if Path(self.source).is_dir():
+            self._images = sorted(str(p) for p in Path(self.source).iterdir()
+                                  if p.suffix.lower() in IMAGE_EXTENSIONS)
+            first = cv2.imread(self._images[0]) if self._images else None
+            self._shape = first.shape if first is not None else None
+            native_fps = 30.0
+        else:
+            self._cap = cv2.VideoCapture(self.source)
+            native_fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self._shape = (int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                           int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        self.fps = fps or native_fps
+        self.jitter_ms = jitter_ms
+        self.burst_every = burst_every
+        self.burst_len = burst_len
+        self.drop_rate = drop_rate
+        self.buffer = max(1, buffer)
+        self.loop = loop
+        self._rng = np.random.default_rng(seed)
+
+        self._start = None
+        self._next_seq = 0          # next position in the schedule (keeps counting across loops)
+        self._decoded_index = 0     # next frame the decoder would return
+        self._last_arrival = 0.0
+        self._pending = []          # (index, arrival) scheduled but not yet read
+
+        self.last_timestamp = None  # perf_counter arrival time of the last frame returned
+        self.last_index = None
+        self.stats = {'scheduled': 0, 'delivered': 0, 'injected_drops': 0, 'overruns': 0}
+
+    # ----- schedule -------------------------------------------------------
+
+    def _frame_count(self):
+        if self._images is not None:
+            return len(self._images)
+        return int(self._cap.get(self._cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    def _schedule_next(self):
+        """Arrival time (seconds from start) of the next frame, or None for a dropped frame"""
+        i = self._next_seq
+        arrival = i / self.fps
+        if self.jitter_ms:
+            arrival += self._rng.normal(0.0, self.jitter_ms / 1000.0)
+        if self.burst_every and self.burst_len and i % self.burst_every < self.burst_len:
+            # Held back, then released together with the last frame of the burst
+            burst_start = i - i % self.burst_every
+            arrival = max(arrival, (burst_start + self.burst_len - 1) / self.fps)
+        arrival = max(arrival, self._last_arrival)  # frames never arrive out of order
+        self._last_arrival = arrival
+        dropped = self.drop_rate and self._rng.random() < self.drop_rate
+        return None if dropped else arrival
+
+    def _fill(self, now):
+        """Schedule every frame that has arrived by `now` (plus the next one)"""
+        total = self._frame_count()
+        while not self._pending or self._pending[-1][1] <= now:
+            if total is not None and self._next_seq >= total and not self.loop:
+                return
+            index = self._next_seq % total if total else self._next_seq
+            arrival = self._schedule_next()
+            self._next_seq += 1
+            self.stats['scheduled'] += 1
+            if arrival is None:
+                self.stats['injected_drops'] += 1
+                continue
+            self._pending.append((index, arrival))
+
+    # ----- decoding -------------------------------------------------------
+
+    def _decode(self, index):
+        if self._images is not None:
+            frame = self._cv2.imread(self._images[index % len(self._images)])
+            return frame is not None, frame
+        if index < self._decoded_index:
+            # Looped back to the start
+            self._cap.set(self._cv2.CAP_PROP_POS_FRAMES, 0)
+            self._decoded_index = 0
+        while self._decoded_index < index:
+            if not self._cap.grab():
+                return False, None
+            self._decoded_index += 1
+        ret, frame = self._cap.read()
+        self._decoded_index += 1
+        return ret, frame
+
+    # ----- cv2.VideoCapture interface --------------------------------------
+
+    def isOpened(self):
+        if self._images is not None:
+            return bool(self._images)
+        return self._cap.isOpened()
+
+    def read(self, image=None):
+        """
+        Block until a frame has arrived and return the oldest one the driver
+        still holds, like a live camera with a `buffer`-frame queue
+        """
+        if self._start is None:
+            self._start = time.perf_counter()
+        while True:
+            now = time.perf_counter() - self._start
+            self._fill(now)
+            if not self._pending:
+                return False, None
+            arrived = [p for p in self._pending if p[1] <= now]
+            if arrived:
+                break
+            time.sleep(max(0.0, self._pending[0][1] - now))
+
+        # Frames beyond the driver buffer were overwritten before we got here
+        overrun = len(arrived) - self.buffer
+        if overrun > 0:
+            self.stats['overruns'] += overrun
+            del self._pending[:overrun]
+        index, arrival = self._pending.pop(0)
+
+        ret, frame = self._decode(index)
+        if not ret:
+            return False, None
+        if image is not None and image.shape == frame.shape:
+            image[:] = frame
+            frame = image
+        self.stats['delivered'] += 1
+        self.last_index = index
+        self.last_timestamp = self._start + arrival
+        return True, frame
+
+    def grab(self):
+        return self.read()[0]
+
+    def get(self, prop):
+        cv2 = self._cv2
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._shape[1]) if self._shape else 0.0
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._shape[0]) if self._shape else 0.0
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self._frame_count() or 0)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.last_index + 1 if self.last_index is not None else 0)
+        return 0.0
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+
+    def drop_rate_observed(self):
+        """Fraction of scheduled frames the consumer never saw (injected + overrun)"""
+        scheduled = self.stats['scheduled'] - len(self._pending)
+        lost = self.stats['injected_drops'] + self.stats['overruns']
+        return lost / scheduled if scheduled > 0 else 0.0
+
+
+def _option(args, name, cast, default):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python replay_source.py <video|image_folder> [--fps 15] [--jitter 5] [--burst 60:5] "
+              "[--drop 0.02] [--seed 0] [--buffer 1] [--loop] [--show] [--target-fps N] [--max-frames N]")
+        sys.exit(1)
+
+    from realtime_webcam_detection_fixed import realtime_webcam_detection
+
+    args = sys.argv[1:]
+    burst = _option(args, '--burst', str, '0:0')
+    burst_every, burst_len = (int(v) for v in burst.split(':'))
+    capture = ReplayCapture(
+        args[0],
+        fps=_option(args, '--fps', float, None),
+        jitter_ms=_option(args, '--jitter', float, 0.0),
+        burst_every=burst_every,
+        burst_len=burst_len,
+        drop_rate=_option(args, '--drop', float, 0.0),
+        seed=_option(args, '--seed', int, 0),
+        buffer=_option(args, '--buffer', int, 1),
+        loop='--loop' in args,
+    )
+    realtime_webcam_detection(
+        target_fps=_option(args, '--target-fps', float, None),
+        capture=capture,
+        headless='--show' not in args,
+        max_frames=_option(args, '--max-frames', int, None),
+    )
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Per-camera regions of interest
+Fixed cameras only ever see buses in the road lanes. With an ROI configured, each
+frame is cropped to the ROI's bounding rectangle before the model letterboxes it
+(so the lanes get more of the model's input pixels), pixels outside the ROI are
+blanked, and boxes are mapped back to full-frame coordinates. Detections whose
+center falls outside the ROI are dropped with a single mask lookup per box.
+
+ROIs live in roi_config.json (or $BUS_DETECTION_ROI), keyed by source: a video
+file name, or "webcam:<index>". Coordinates are fractions of the frame (0-1) or
+pixels; each source may list polygons and/or rectangles:
+
+  {
+    "LOS SITP DE BOGOTÁ_correctly_trimmed.mp4": {
+      "polygons": [[[0.05, 0.55], [0.95, 0.55], [1.0, 1.0], [0.0, 1.0]]],
+      "rects": [[0.3, 0.4, 0.7, 0.55]]
+    },
+    "webcam:0": {"rects": [[0, 0.3, 1, 1]]}
+  }
+
+Usage:
+  python roi_masks.py <video_path> [model_path] [max_frames]     # FPS / resolution gain
+  python roi_masks.py <video_path> --preview                      # results/roi_preview.jpg
+"""
+
+from detection_results import DetectionResult
+import numpy as np
+import json
+import time
+import sys
+import os
+
+ROI_CONFIG = os.environ.get('BUS_DETECTION_ROI', 'roi_config.json')
+# Same grey ultralytics pads letterboxed images with
+FILL_VALUE = 114
+
+
+def roi_key(source):
+    """Config key for a capture source (webcam index or video path)"""
+    if isinstance(source, int):
+        return f"webcam:{source}"
+    return os.path.basename(str(source))
+
+
+def load_roi(source, frame_shape, config_path=ROI_CONFIG):
+    """
+    ROI configured for `source`, or None if there is none
+
+    Args:
+        source (int|str): Webcam index or video path
+        frame_shape (tuple): (height, width[, channels]) of the frames
+        config_path (str): ROI config file
+    """
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path) as f:
+        entry = json.load(f).get(roi_key(source))
+    if not entry:
+        return None
+    return FrameROI(entry.get('polygons', []), entry.get('rects', []), frame_shape)
+
+
+class FrameROI:
+    """
+    Args:
+        polygons (list): Polygons as lists of (x, y) points
+        rects (list): Rectangles as (x1, y1, x2, y2)
+        frame_shape (tuple): (height, width[, channels]) of the frames
+    """
+
+    def __init__(self, polygons, rects, frame_shape):
+        import cv2
+
+        height, width = frame_shape[:2]
+        self.frame_shape = (height, width)
+
+        def to_pixels(points):
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            if points.max() <= 1.0:
+                points = points * [width, height]
+            return np.round(points).astype(np.int32)
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for polygon in polygons:
+            cv2.fillPoly(mask, [to_pixels(polygon)], 255)
+        for rect in rects:
+            (x1, y1), (x2, y2) = to_pixels(rect)
+            mask[max(0, y1):y2, max(0, x1):x2] = 255
+        if not mask.any():
+            raise ValueError("ROI is empty")
+        self.mask = mask
+        self._contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        ys, xs = np.nonzero(mask)
+        self.x0, self.y0 = int(xs.min()), int(ys.min())
+        self.x1, self.y1 = int(xs.max()) + 1, int(ys.max()) + 1
+
+        # Only blank pixels when the ROI is not simply its bounding rectangle
+        outside = mask[self.y0:self.y1, self.x0:self.x1] == 0
+        self._outside = outside if outside.any() else None
+        self.area_fraction = float(np.count_nonzero(mask)) / (height * width)
+
+    def prepare(self, frame):
+        """
+        Crop to the ROI bounding rectangle and blank everything outside the ROI
+
+        Returns:
+            np.ndarray: The model input (a copy only when blanking is needed)
+        """
+        crop = frame[self.y0:self.y1, self.x0:self.x1]
+        if self._outside is not None:
+            crop = crop.copy()
+            crop[self._outside] = FILL_VALUE
+        return crop
+
+    def restore(self, detection):
+        """
+        Map detections on the prepared crop back to full-frame coordinates
+        and drop those whose center lies outside the ROI
+        """
+        if len(detection) == 0:
+            return DetectionResult.empty(detection.names, self.frame_shape)
+        boxes = detection.boxes + np.array([self.x0, self.y0, self.x0, self.y0], dtype=np.float32)
+        cx = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int64), 0, self.frame_shape[1] - 1)
+        cy = np.clip(((boxes[:, 1] + boxes[:, 3]) / 2).astype(np.int64), 0, self.frame_shape[0] - 1)
+        inside = self.mask[cy, cx] > 0
+        return DetectionResult(boxes[inside], detection.scores[inside], detection.class_ids[inside],
+                               detection.names, self.frame_shape)
+
+    def resolution_gain(self):
+        """
+        How many more model-input pixels each frame pixel gets with the ROI
+
+        The model scales the long side of its input to imgsz, so the linear
+        gain is the ratio of the full frame's long side to the crop's.
+        """
+        height, width = self.frame_shape
+        return max(height, width) / max(self.y1 - self.y0, self.x1 - self.x0)
+
+    def draw(self, frame, color=(255, 255, 0)):
+        """Outline the ROI on a frame in place"""
+        import cv2
+
+        cv2.drawContours(frame, self._contours, -1, color, 2)
+        return frame
+
+    def describe(self):
+        height, width = self.frame_shape
+        return (f"crop {self.x1 - self.x0}x{self.y1 - self.y0} of {width}x{height}, "
+                f"ROI {self.area_fraction:.0%} of frame, {self.resolution_gain():.2f}x effective resolution")
+
+
+def compare_roi(video_path, model_path='yolov8n.pt', max_frames=300, imgsz=640):
+    """
+    FPS and detections with and without the configured ROI on the same frames
+    """
+    import cv2
+    from model_loader import load_model
+
+    print("🛣️  ROI Benchmark")
+    print("=" * 40)
+    print(f"🎬 Video: {video_path}")
+    print(f"🤖 Model: {model_path}")
+    print("=" * 40)
+
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        print(f"❌ Error: Could not read frames from {video_path}")
+        return None
+
+    roi = load_roi(video_path, frames[0].shape)
+    if roi is None:
+        print(f"❌ No ROI for '{roi_key(video_path)}' in {ROI_CONFIG}")
+        return None
+    print(f"📐 {roi.describe()}")
+
+    model = load_model(model_path, imgsz, optimize=False)  # ROI crops are smaller, non-square inputs
+    results = {}
+    for label, use_roi in (('full frame', False), ('ROI', True)):
+        detections = 0
+        start = time.perf_counter()
+        for frame in frames:
+            inp = roi.prepare(frame) if use_roi else frame
+            detection = DetectionResult.from_ultralytics(model(inp, imgsz=imgsz, verbose=False)[0], model.names)
+            detection = roi.restore(detection) if use_roi else detection
+            detections += len(detection)
+        elapsed = time.perf_counter() - start
+        results[label] = {'fps': len(frames) / elapsed, 'detections': detections}
+        print(f"  {label:<10} {results[label]['fps']:6.2f} FPS | {detections} detections")
+
+    print(f"\n🚀 FPS: {results['full frame']['fps']:.2f} → {results['ROI']['fps']:.2f}")
+    print(f"🔍 Effective resolution gain: {roi.resolution_gain():.2f}x")
+    return results
+
+
+def preview(video_path, output_path="results/roi_preview.jpg"):
+    """Save the first frame with the ROI outlined, for checking a config"""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        print(f"❌ Error: Could not read {video_path}")
+        return None
+    roi = load_roi(video_path, frame.shape)
+    if roi is None:
+        print(f"❌ No ROI for '{roi_key(video_path)}' in {ROI_CONFIG}")
+        return None
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    cv2.imwrite(output_path, roi.draw(frame))
+    print(f"📐 {roi.describe()}")
+    print(f"💾 Preview saved to: {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python roi_masks.py <video_path> [model_path] [max_frames]")
+        print("  python roi_masks.py <video_path> --preview")
+        sys.exit(1)
+
+    if '--preview' in sys.argv:
+        preview(sys.argv[1])
+    else:
+        compare_roi(
+            sys.argv[1],
+            sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt',
+            int(sys.argv[3]) if len(sys.argv) > 3 else 300,
+        )
@@ -4,8 +4,7 @@ Quick detection script to test with existing images
 """
 
 import os
-from detect_cars import detect_cars
-from detect_image import detect_image
+from detection_fanout import default_fanout
 
 def main():
     print("🚗 YOLO Detection Test")
@@ -31,8 +30,11 @@ def main():
     for i, path in enumerate(available_images, 1):
         print(f"  {i}. {path}")
     
-    # Test car detection
-    print("\n🚗 Testing car detection...")
+    # One decode and one forward pass per image, shared by every view
+    fanout = default_fanout(confidence=0.5)
+    processed = 0
+    
+    print("\n🎯 Testing car detection, general object detection and JSON export...")
     for image_path in available_images:
         if image_path.endswith('.mp4'):
             print(f"⏭️  Skipping video file: {image_path}")
@@ -40,22 +42,19 @@ def main():
             
         print(f"\n🔍 Processing: {image_path}")
         try:
-            cars = detect_cars(image_path, confidence=0.5)
-            print(f"✅ Found {len(cars)} cars")
+            outputs = fanout.run(image_path)
+            if outputs is None:
+                continue
+            processed += 1
+            print(f"✅ Found {len(outputs['cars'] or [])} cars")
+            print(f"✅ Found {len(outputs['allowed'] or [])} objects (filtered)")
+            print(f"💾 Detections exported to: {outputs['json']}")
         except Exception as e:
             print(f"❌ Error: {e}")
     
-    # Test general object detection
-    print("\n🎯 Testing general object detection...")
-    for image_path in available_images:
-        if image_path.endswith('.mp4'):
-            continue
-            
-        print(f"\n🔍 Processing: {image_path}")
-        try:
-            detect_image(image_path, confidence=0.5)
-        except Exception as e:
-            print(f"❌ Error: {e}")
+    print(f"\n🔢 Inference passes: {fanout.inference_count} for {processed} images")
+    if fanout.inference_count != processed:
+        print("⚠️  Expected exactly one inference per image")
 
 if __name__ == "__main__":
     main()
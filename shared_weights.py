@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Worker pool that shares one copy of the model weights
+The parent loads, fuses and warms the model once, moves its tensors into shared
+memory and forks the workers, which run inference on the same read-only weights.
+Compare with the current pattern of every process calling YOLO(...) itself.
+
+Usage: python shared_weights.py <image_folder> [model_path] [workers]
+
+Requires the 'fork' start method (Linux); elsewhere each worker loads its own copy.
+"""
+
+from detection_results import DetectionResult
+from pathlib import Path
+import multiprocessing as mp
+import time
+import sys
+import os
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+
+# Model inherited by forked workers (set in the parent before forking)
+_SHARED_MODEL = None
+
+
+def process_memory():
+    """
+    Memory of the current process in MB
+
+    RSS counts shared pages in full for every process, so PSS (shared pages
+    split between their users) and USS (private pages only) are reported as
+    well when /proc/self/smaps_rollup is available.
+    """
+    stats = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    stats[parts[0][:-1]] = int(parts[1]) / 1024.0
+        return {
+            'rss_mb': stats.get('Rss', 0.0),
+            'pss_mb': stats.get('Pss', 0.0),
+            'uss_mb': stats.get('Private_Clean', 0.0) + stats.get('Private_Dirty', 0.0),
+        }
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        return {'rss_mb': rss, 'pss_mb': None, 'uss_mb': None}
+
+
+def share_model_weights(model):
+    """
+    Move every parameter and buffer of a loaded YOLO model into shared memory
+
+    The model must already have been run once (load_model warms it up), so
+    layer fusion has happened in the parent; otherwise each worker would fuse
+    on its first call and end up with private copies of the fused weights.
+    """
+    import torch
+
+    module = model.predictor.model if model.predictor is not None else model.model
+    with torch.no_grad():
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            tensor.requires_grad_(False)
+            tensor.share_memory_()
+    return model
+
+
+def _worker_main(worker_index, task_queue, result_queue, model_path, imgsz, confidence, launched, torch_threads,
+                 tuning):
+    import torch
+    import cv2
+
+    if tuning is not None:
+        from cpu_autotune import apply_config
+        apply_config(tuning, worker_index)
+    else:
+        torch.set_num_threads(torch_threads)
+    if _SHARED_MODEL is not None:
+        model = _SHARED_MODEL
+    else:
+        from model_loader import load_model
+        model = load_model(model_path, imgsz, tune=False)  # keep this worker's thread settings
+    startup = time.time() - launched
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, image_path = task
+        image = cv2.imread(image_path)
+        if image is None:
+            result_queue.put(('result', task_id, None))
+            continue
+        results = model(image, conf=confidence, imgsz=imgsz, verbose=False)
+        result_queue.put(('result', task_id, DetectionResult.from_ultralytics(results[0], model.names).to_json()))
+
+    result_queue.put(('report', os.getpid(), dict(process_memory(), startup_s=startup)))
+
+
+class SharedModelPool:
+    """
+    Fixed set of worker processes running one model
+
+    Args:
+        model_path (str): Path to the YOLO model file
+        workers (int): Number of worker processes (default: cpu_autotune
+                       record for this model, else 4)
+        shared (bool): Load once in the parent and share the weights (True),
+                       or let every worker load its own copy (False)
+        imgsz (int): Model input size
+        confidence (float): Minimum confidence for detections
+        torch_threads (int): Intra-op threads per worker (default: cpu_autotune
+                             record, pinned to a core block per worker, else 1)
+    """
+
+    def __init__(self, model_path='yolov8n.pt', workers=None, shared=True, imgsz=640, confidence=0.5,
+                 torch_threads=None):
+        global _SHARED_MODEL
+        from cpu_autotune import load_tuning
+
+        tuning = load_tuning(model_path, 'image') if workers is None and torch_threads is None else None
+        workers = workers or (tuning['workers'] if tuning else 4)
+        torch_threads = torch_threads or 1
+
+        fork_available = 'fork' in mp.get_all_start_methods()
+        self.shared = shared and fork_available
+        self.context = mp.get_context('fork' if fork_available else 'spawn')
+        self.parent_load_s = 0.0
+
+        if self.shared:
+            from model_loader import load_model
+            start = time.perf_counter()
+            _SHARED_MODEL = share_model_weights(load_model(model_path, imgsz, tune=False))
+            self.parent_load_s = time.perf_counter() - start
+
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        launched = time.time()
+        self.processes = [
+            self.context.Process(target=_worker_main, daemon=True,
+                                 args=(i, self.tasks, self.results, model_path, imgsz, confidence,
+                                       launched, torch_threads, tuning))
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.reports = []
+        self._pending_reports = []
+
+    def map(self, image_paths):
+        """
+        Detect objects in every image; results come back in input order
+
+        Returns:
+            list: DetectionResult (or None for unreadable images) per path
+        """
+        image_paths = [str(p) for p in image_paths]
+        for task_id, image_path in enumerate(image_paths):
+            self.tasks.put((task_id, image_path))
+        results = [None] * len(image_paths)
+        remaining = len(image_paths)
+        while remaining:
+            kind, key, payload = self.results.get()
+            if kind == 'report':
+                self._pending_reports.append(dict(payload, pid=key))
+                continue
+            results[key] = DetectionResult.from_json(payload) if payload is not None else None
+            remaining -= 1
+        return results
+
+    def close(self):
+        """
+        Stop the workers
+
+        Returns:
+            list: Per-worker dicts with pid, startup_s, rss_mb, pss_mb, uss_mb
+        """
+        for _ in self.processes:
+            self.tasks.put(None)
+        self.reports = list(self._pending_reports)
+        while len(self.reports) < len(self.processes):
+            kind, key, payload = self.results.get()
+            if kind == 'report':
+                self.reports.append(dict(payload, pid=key))
+        for process in self.processes:
+            process.join()
+        return self.reports
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if any(p.is_alive() for p in self.processes):
+            self.close()
+
+
+def compare_loading(image_folder, model_path='yolov8n.pt', workers=4):
+    """
+    Per-worker memory and startup time: shared weights vs. per-process YOLO(...)
+    """
+    print("🧠 Shared Model Weights")
+    print("=" * 40)
+    print(f"📂 Folder: {image_folder}")
+    print(f"🤖 Model: {model_path}")
+    print(f"👷 Workers: {workers}")
+    print("=" * 40)
+
+    images = sorted(p for p in Path(image_folder).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not images:
+        print(f"❌ No images found in {image_folder}")
+        return None
+
+    summary = {}
+    # Per-process loading first, so the shared run's parent model does not
+    # leak into the baseline's forked workers
+    for label, shared in (('per-process', False), ('shared', True)):
+        start = time.perf_counter()
+        pool = SharedModelPool(model_path, workers, shared=shared)
+        pool.map(images)
+        reports = pool.close()
+        elapsed = time.perf_counter() - start
+
+        print(f"\n📊 {label} loading ({len(images)} images in {elapsed:.2f}s"
+              f"{f', parent load {pool.parent_load_s:.2f}s' if shared else ''}):")
+        for r in sorted(reports, key=lambda r: r['pid']):
+            pss = f"{r['pss_mb']:.0f}" if r['pss_mb'] is not None else "n/a"
+            uss = f"{r['uss_mb']:.0f}" if r['uss_mb'] is not None else "n/a"
+            print(f"  pid {r['pid']}: startup {r['startup_s']:.2f}s | RSS {r['rss_mb']:.0f} MB | "
+                  f"PSS {pss} MB | USS {uss} MB")
+        summary[label] = reports
+
+        global _SHARED_MODEL
+        _SHARED_MODEL = None
+
+    def total(reports, key):
+        values = [r[key] for r in reports if r[key] is not None]
+        return sum(values) if values else None
+
+    base, shared = summary['per-process'], summary['shared']
+    if total(base, 'pss_mb') and total(shared, 'pss_mb'):
+        print(f"\n💾 Total worker PSS: {total(base, 'pss_mb'):.0f} MB → {total(shared, 'pss_mb'):.0f} MB")
+    print(f"⏱️  Mean worker startup: {sum(r['startup_s'] for r in base) / len(base):.2f}s → "
+          f"{sum(r['startup_s'] for r in shared) / len(shared):.2f}s")
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python shared_weights.py <image_folder> [model_path] [workers]")
+        sys.exit(1)
+
+    compare_loading(
+        sys.argv[1],
+        sys.argv[2] if len(sys.argv) > 2 else 'yolov8n.pt',
+        int(sys.argv[3]) if len(sys.argv) > 3 else 4,
+    )
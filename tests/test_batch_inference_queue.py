@@ -0,0 +1,108 @@
+"""Batching, restart and shutdown behaviour of MicroBatcher, with a stand-in model"""
+
+import asyncio
+import threading
+import random
+import time
+
+import pytest
+
+from batch_inference_queue import MicroBatcher
+
+
+class _EchoModel:
+    """Returns each input back as its result and records the batch sizes"""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.batches = []
+        self.delay = delay
+        self.gate = gate
+
+    def __call__(self, images, **kwargs):
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(self.delay)
+        self.batches.append(len(images))
+        return list(images)
+
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+def test_concurrent_requests_are_batched():
+    model = _EchoModel()
+
+    async def main():
+        async with MicroBatcher(model, max_batch_size=4, max_wait_ms=50) as batcher:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+
+    assert _run(main()) == list(range(6))
+    assert model.batches == [4, 2]
+
+
+def test_can_be_started_again_after_stop():
+    model = _EchoModel()
+
+    async def main():
+        batcher = MicroBatcher(model, max_batch_size=2, max_wait_ms=1)
+        results = []
+        for round_ in range(3):
+            await batcher.start()
+            results.append(await batcher.submit(round_))
+            await batcher.stop()
+        return results
+
+    assert _run(main()) == [0, 1, 2]
+
+
+def test_submit_requires_start():
+    async def main():
+        await MicroBatcher(_EchoModel()).submit(0)
+
+    with pytest.raises(RuntimeError, match='not running'):
+        _run(main())
+
+
+def test_stop_fails_waiting_requests():
+    gate = threading.Event()
+    model = _EchoModel(gate=gate)
+
+    async def main():
+        batcher = await MicroBatcher(model, max_batch_size=1, max_wait_ms=0).start()
+        tasks = [asyncio.create_task(batcher.submit(i)) for i in range(4)]
+        await asyncio.sleep(0.05)   # first request is in the model, the rest queued
+        # stop() waits for the inference thread, so release the model from another thread
+        threading.Timer(0.05, gate.set).start()
+        await batcher.stop()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = _run(main())
+    assert all(isinstance(r, RuntimeError) for r in results[1:])
+
+
+def test_no_request_is_lost_at_the_flush_timeout():
+    model = _EchoModel()
+    rng = random.Random(0)
+
+    async def main():
+        async with MicroBatcher(model, max_batch_size=8, max_wait_ms=0.5) as batcher:
+            async def one(i):
+                await asyncio.sleep(rng.uniform(0, 0.02))
+                return await batcher.submit(i)
+            return await asyncio.gather(*(one(i) for i in range(300)))
+
+    assert _run(main()) == list(range(300))
+    assert sum(model.batches) == 300
+
+
+def test_deadline_flushes_before_max_wait():
+    model = _EchoModel()
+
+    async def main():
+        async with MicroBatcher(model, max_batch_size=8, max_wait_ms=1000) as batcher:
+            start = time.perf_counter()
+            await batcher.submit(0, deadline_ms=50)
+            return time.perf_counter() - start
+
+    assert _run(main()) < 0.5
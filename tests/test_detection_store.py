@@ -0,0 +1,80 @@
+"""Round trips, interval queries and old-format segments of the detection store"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from detection_store import DetectionStore, DetectionStoreWriter
+
+NAMES = {0: 'person', 5: 'bus', 300: 'tram'}
+
+
+def _write(path, frames, fps=10.0, **kwargs):
+    with DetectionStoreWriter(str(path), NAMES, fps, **kwargs) as store:
+        for frame, class_ids in frames:
+            n = len(class_ids)
+            store.append(frame, frame / fps, np.array(class_ids), np.full(n, 0.5),
+                         np.tile([10, 20, 30, 40], (n, 1)))
+    return DetectionStore(str(path))
+
+
+def test_round_trip_keeps_wide_class_ids(tmp_path):
+    store = _write(tmp_path / 'store', [(0, [5, 300]), (1, [0])], segment_rows=2)
+    rows = store.query()
+    assert rows['class_id'].tolist() == [5, 300, 0]
+    assert rows['frame'].tolist() == [0, 0, 1]
+    assert store.query(classes=['tram'])['frame'].tolist() == [0]
+    assert len(store.index['segments']) == 2
+
+
+def test_unknown_class_name_is_rejected(tmp_path):
+    store = _write(tmp_path / 'store', [(0, [5])])
+    with pytest.raises(ValueError, match='Unknown class'):
+        store.query(classes=['bsu'])
+
+
+def test_detections_per_interval_counts_rows_and_frame_peaks(tmp_path):
+    # 10 fps, 1 s intervals: one bus seen in 10 frames is 10 rows but a peak of 1
+    frames = [(i, [5]) for i in range(10)] + [(10, [5, 5, 5]), (11, [5])]
+    store = _write(tmp_path / 'store', frames)
+
+    starts, counts, per_frame, peaks = store.detections_per_interval(0.0, 2.0, 1.0, ['bus'])
+    assert starts.tolist() == [0.0, 1.0]
+    assert counts.tolist() == [10, 4]
+    assert per_frame.tolist() == [1.0, 0.4]
+    assert peaks.tolist() == [1, 3]
+
+
+def test_empty_interval(tmp_path):
+    store = _write(tmp_path / 'store', [(0, [0])])
+    _, counts, _, peaks = store.detections_per_interval(5.0, 7.0, 1.0)
+    assert counts.tolist() == [0, 0] and peaks.tolist() == [0, 0]
+
+
+def test_segments_with_one_byte_class_ids_are_readable(tmp_path):
+    path = tmp_path / 'store'
+    _write(path, [(0, [5])])
+    old_dtype = np.dtype([('frame', '<u4'), ('timestamp', '<f8'), ('class_id', 'u1'),
+                          ('score', '<f2'), ('box', '<u2', (4,))])
+    old = np.zeros(1, dtype=old_dtype)
+    old['frame'], old['timestamp'], old['class_id'] = 20, 2.0, 7
+    np.save(os.path.join(path, 'segment_000001.npy'), old)
+    index = json.load(open(path / 'index.json'))
+    index['segments'].append({'file': 'segment_000001.npy', 'rows': 1, 'frame_min': 20, 'frame_max': 20,
+                              't_min': 2.0, 't_max': 2.0, 'classes': [7]})
+    json.dump(index, open(path / 'index.json', 'w'))
+
+    rows = DetectionStore(str(path)).query()
+    assert rows['class_id'].tolist() == [5, 7]
+    assert rows.dtype['class_id'] == np.dtype('<u2')
+
+
+def test_append_continues_an_existing_store(tmp_path):
+    _write(tmp_path / 'store', [(0, [5])])
+    store = _write(tmp_path / 'store', [(1, [0])], append=True)
+    assert store.query()['frame'].tolist() == [0, 1]
+
+    store = _write(tmp_path / 'store', [(2, [0])])
+    assert store.query()['frame'].tolist() == [2]
@@ -0,0 +1,124 @@
+"""Slot reuse, overwrite/drop/block policies and cross-process visibility of FrameRing"""
+
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+from frame_ring import FrameRing, CAPTURED, INFERRING, RENDERING
+
+SHAPE = (4, 4, 3)
+
+
+@pytest.fixture
+def make_ring():
+    rings = []
+
+    def make(**kwargs):
+        rings.append(FrameRing(frame_shape=SHAPE, **kwargs))
+        return rings[-1]
+
+    yield make
+    for ring in rings:
+        ring.close()
+
+
+def _write(ring, value, timeout=None):
+    slot = ring.acquire_write(timeout=timeout)
+    if slot is not None:
+        ring.frame(slot)[:] = value
+        ring.commit_write(slot)
+    return slot
+
+
+def _drain(ring, count):
+    seen = []
+    for _ in range(count):
+        slot = ring.acquire(CAPTURED, RENDERING, timeout=1.0)
+        seen.append((ring.seq(slot), int(ring.frame(slot)[0, 0, 0])))
+        ring.release(slot)
+    return seen
+
+
+def test_overwrite_replaces_oldest_unprocessed_frame(make_ring):
+    ring = make_ring(slots=2, policy='overwrite')
+    for value in (1, 2, 3):
+        assert _write(ring, value) is not None
+
+    assert _drain(ring, 2) == [(1, 2), (2, 3)]
+    assert ring.overwritten == 1 and ring.dropped == 0
+    assert ring.frames_written == 3
+
+
+def test_overwrite_never_touches_slots_in_inference(make_ring):
+    ring = make_ring(slots=2, policy='overwrite')
+    _write(ring, 1)
+    _write(ring, 2)
+    ring.acquire(CAPTURED, INFERRING)
+    ring.acquire(CAPTURED, INFERRING)
+
+    assert ring.acquire_write() is None
+    assert ring.dropped == 1 and ring.overwritten == 0
+
+
+def test_drop_keeps_oldest_frames_and_reuses_released_slots(make_ring):
+    ring = make_ring(slots=2, policy='drop')
+    written = [_write(ring, value) for value in (1, 2, 3)]
+
+    assert written[2] is None
+    assert [value for _, value in _drain(ring, 2)] == [1, 2]
+    assert ring.dropped == 1
+    assert ring.acquire_write() is not None
+
+
+def test_block_times_out_without_dropping(make_ring):
+    ring = make_ring(slots=1, policy='block')
+    _write(ring, 1)
+
+    assert ring.acquire_write(timeout=0.05) is None
+    assert ring.dropped == 0
+    ring.release(ring.acquire(CAPTURED, RENDERING))
+    assert ring.acquire_write(timeout=0.05) is not None
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        FrameRing(frame_shape=SHAPE, policy='newest')
+
+
+def test_detections_are_truncated_and_counted(make_ring):
+    ring = make_ring(slots=1, max_detections=5)
+    slot = ring.acquire_write()
+    ring.set_detections(slot, np.ones((3, 6), dtype=np.float32))
+    assert ring.detections(slot).shape == (3, 6) and ring.truncated == 0
+
+    ring.set_detections(slot, np.ones((8, 6), dtype=np.float32))
+    assert ring.detections(slot).shape == (5, 6)
+    assert ring.truncated == 1
+
+
+def test_default_capacity_fits_a_full_yolo_result(make_ring):
+    ring = make_ring(slots=1)
+    slot = ring.acquire_write()
+    ring.set_detections(slot, np.ones((300, 6), dtype=np.float32))
+    assert len(ring.detections(slot)) == 300 and ring.truncated == 0
+
+
+def _child_write(ring, value):
+    slot = ring.acquire_write()
+    ring.frame(slot)[:] = value
+    ring.set_detections(slot, np.full((3, 6), value, dtype=np.float32))
+    ring.commit_write(slot)
+
+
+def test_child_process_writes_are_visible_in_place(make_ring):
+    ring = make_ring(slots=2, policy='block')
+    child = mp.Process(target=_child_write, args=(ring, 7))
+    child.start()
+    child.join(timeout=10)
+    assert child.exitcode == 0
+
+    slot = ring.acquire(CAPTURED, RENDERING, timeout=1.0)
+    assert slot is not None and int(ring.frame(slot)[0, 0, 0]) == 7
+    assert ring.detections(slot).shape == (3, 6)
+    assert float(ring.detections(slot)[0, 0]) == 7.0
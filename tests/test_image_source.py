@@ -0,0 +1,103 @@
+"""Walk order, sharding and the resume manifest of ImageSource"""
+
+import json
+
+import pytest
+
+import image_source
+from image_source import ImageSource
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'images'
+    for name in ['b.jpg', 'a.jpg', 'notes.txt', 'sub/c.jpg', 'sub/a.PNG', 'sub/deep/x.jpg', 'z.jpg']:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+    return root
+
+
+def _keys(source):
+    return [source.relative(path) for path in source]
+
+
+def _run(root, manifest, fail=(), stop_after=None, **kwargs):
+    with ImageSource(str(root), manifest_path=manifest, **kwargs) as source:
+        seen = []
+        for path in source:
+            key = source.relative(path)
+            seen.append(key)
+            if key in fail:
+                source.mark_failed(path)
+            else:
+                source.mark_done(path)
+            if stop_after is not None and len(seen) == stop_after:
+                break
+    return source, seen
+
+
+def test_walk_order_is_sorted_per_directory(tree):
+    assert _keys(ImageSource(str(tree))) == ['a.jpg', 'b.jpg', 'sub/a.PNG', 'sub/c.jpg', 'sub/deep/x.jpg', 'z.jpg']
+    assert _keys(ImageSource(str(tree), recursive=False)) == ['a.jpg', 'b.jpg', 'z.jpg']
+
+
+def test_shards_partition_the_tree(tree):
+    everything = _keys(ImageSource(str(tree)))
+    shards = [_keys(ImageSource(str(tree), shard=f"{i}/3")) for i in range(3)]
+    assert sorted(sum(shards, [])) == sorted(everything)
+
+
+def test_single_file_root_is_counted(tree):
+    source = ImageSource(str(tree / 'a.jpg'))
+    assert list(source) == [str(tree / 'a.jpg')]
+    assert source.yielded == 1
+
+
+def test_resume_skips_finished_images(tree, tmp_path):
+    manifest = str(tmp_path / 'manifest.json')
+    _, seen = _run(tree, manifest, stop_after=3)
+    assert seen == ['a.jpg', 'b.jpg', 'sub/a.PNG']
+
+    source, seen = _run(tree, manifest)
+    assert source.resumed
+    assert seen == ['sub/c.jpg', 'sub/deep/x.jpg', 'z.jpg']
+    assert source.skipped_done == 3
+
+
+def test_failures_do_not_hold_back_the_watermark(tree, tmp_path):
+    manifest = str(tmp_path / 'manifest.json')
+    source, _ = _run(tree, manifest, fail={'b.jpg', 'sub/deep/x.jpg'})
+    assert source.failed == 2
+    saved = json.load(open(manifest))
+    assert saved['watermark'] == ['z.jpg']
+    assert saved['failed'] == [['b.jpg'], ['sub', 'deep', 'x.jpg']]
+
+    # Only the failed images are retried, including one inside a finished subtree
+    source, seen = _run(tree, manifest, fail={'b.jpg'})
+    assert seen == ['b.jpg', 'sub/deep/x.jpg']
+    assert json.load(open(manifest))['failed'] == [['b.jpg']]
+
+    _, seen = _run(tree, manifest)
+    assert seen == ['b.jpg']
+    _, seen = _run(tree, manifest)
+    assert seen == []
+
+
+def test_too_many_failures_hold_the_watermark(tree, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_source, 'MAX_FAILED_KEYS', 1)
+    manifest = str(tmp_path / 'manifest.json')
+    _run(tree, manifest, fail={'a.jpg', 'sub/a.PNG'})
+    saved = json.load(open(manifest))
+    assert saved['failed'] == [['a.jpg']]
+    assert saved['watermark'] == ['b.jpg']
+
+    _, seen = _run(tree, manifest)
+    assert seen == ['a.jpg', 'sub/a.PNG', 'sub/c.jpg', 'sub/deep/x.jpg', 'z.jpg']
+
+
+def test_manifest_of_another_shard_is_ignored(tree, tmp_path):
+    manifest = str(tmp_path / 'manifest.json')
+    _run(tree, manifest, shard='0/2')
+    source = ImageSource(str(tree), shard='1/2', manifest_path=manifest)
+    assert not source.resumed
@@ -0,0 +1,127 @@
+"""Remote sources against the local stand-in server: retries, ordering and resume"""
+
+from functools import partial
+from http.server import ThreadingHTTPServer
+import threading
+import json
+
+import pytest
+
+import remote_io
+from remote_io import RemoteImageSource, _StandInHandler, read_bytes
+
+
+class _FlakyHandler(_StandInHandler):
+    """Stand-in handler answering 503 to the first `failures[path]` GETs of a path"""
+
+    failures = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if self.failures.get(self.path, 0) > 0:
+            self.failures[self.path] -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(remote_io, 'RETRY_BACKOFF', 0.001)
+    handler = type('Handler', (_FlakyHandler,), {'failures': {}, 'requests': []})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=str(tmp_path)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield handler, f"http://127.0.0.1:{httpd.server_address[1]}/"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _make_tree(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(name.encode())
+
+
+def test_read_bytes_retries_503(tmp_path, server):
+    handler, base = server
+    _make_tree(tmp_path, ['a.jpg'])
+    handler.failures['/a.jpg'] = 2
+
+    assert read_bytes(base + 'a.jpg') == b'a.jpg'
+    assert handler.requests.count('/a.jpg') == 3
+
+
+def test_read_bytes_gives_up_after_retries(tmp_path, server):
+    handler, base = server
+    _make_tree(tmp_path, ['a.jpg'])
+    handler.failures['/a.jpg'] = remote_io.RETRIES + 1
+
+    with pytest.raises(IOError, match='503'):
+        read_bytes(base + 'a.jpg')
+    assert handler.requests.count('/a.jpg') == remote_io.RETRIES + 1
+
+
+def test_read_bytes_does_not_retry_404(server):
+    handler, base = server
+    with pytest.raises(IOError, match='404'):
+        read_bytes(base + 'missing.jpg')
+    assert handler.requests.count('/missing.jpg') == 1
+
+
+def test_listing_retries_and_is_ordered(tmp_path, server):
+    handler, base = server
+    names = ['b.jpg', 'a.jpg', 'sub/c.jpg', 'sub/a.png', 'z/y/x.jpg', 'notes.txt']
+    _make_tree(tmp_path / 'frames', names)
+    handler.failures['/frames/sub/'] = 1
+
+    with RemoteImageSource(base + 'frames') as source:
+        keys = [source.relative(uri) for uri in source]
+
+    assert keys == ['a.jpg', 'b.jpg', 'sub/a.png', 'sub/c.jpg', 'z/y/x.jpg']
+    assert handler.requests.count('/frames/sub/') == 2
+
+
+def test_resume_retries_failed_image(tmp_path, server):
+    _, base = server
+    _make_tree(tmp_path / 'frames', ['a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'])
+    manifest = str(tmp_path / 'manifest.json')
+
+    with RemoteImageSource(base + 'frames', manifest_path=manifest) as source:
+        for uri in source:
+            if source.relative(uri) == 'b.jpg':
+                source.mark_failed(uri)
+            else:
+                source.mark_done(uri)
+    saved = json.load(open(manifest))
+    assert saved['watermark'] == ['d.jpg'] and saved['failed'] == [['b.jpg']]
+
+    with RemoteImageSource(base + 'frames', manifest_path=manifest) as source:
+        assert source.resumed
+        assert [source.relative(uri) for uri in source] == ['b.jpg']
+        source.mark_done(base + 'frames/b.jpg')
+    saved = json.load(open(manifest))
+    assert saved['watermark'] == ['d.jpg'] and saved['failed'] == []
+
+
+def test_prefetch_keeps_order_and_reports_failures(tmp_path, server):
+    cv2 = pytest.importorskip('cv2')
+    import numpy as np
+    from remote_io import ImageFetcher
+
+    handler, base = server
+    for i in range(12):
+        cv2.imwrite(str(tmp_path / f"{i:02d}.jpg"), np.full((32, 48, 3), i * 10, dtype=np.uint8))
+    handler.failures['/05.jpg'] = remote_io.RETRIES + 1
+    uris = [f"{base}{i:02d}.jpg" for i in range(12)]
+
+    with ImageFetcher(in_flight=4) as fetcher:
+        fetched = list(fetcher.prefetch(uris))
+
+    assert [uri for uri, _ in fetched] == uris
+    assert fetched[5][1] is None
+    assert all(p is not None and p.image.shape == (32, 48, 3) for i, (_, p) in enumerate(fetched) if i != 5)
+    assert fetcher.stats['errors'] == 1
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Streaming traffic analytics over per-frame detections
+Associates boxes frame to frame with an IoU tracker and updates, incrementally:
+  - counting-line crossings per interval (both directions)
+  - time-bucketed occupancy (mean vehicles in view)
+  - dwell-time histogram (time spent in the stop zone, or in view)
+Each active vehicle keeps a fixed-size state record; finished tracks are folded
+into the counters and forgotten. Summaries are emitted while the video runs.
+
+Usage:
+  python traffic_analytics.py <store_dir> <width>x<height> [--line x1,y1,x2,y2] [--zone x1,y1,x2,y2] [--per 60]
+
+Line and zone coordinates are fractions of the frame (0-1) or pixels.
+"""
+
+from detection_results import DetectionResult, box_iou
+import numpy as np
+import datetime
+import json
+import os
+import sys
+
+DEFAULT_LINE = (0.0, 0.5, 1.0, 0.5)
+DWELL_BINS = (0, 5, 10, 20, 30, 60, 120, 300)
+
+
+class _Track:
+    """Fixed-size state for one active vehicle"""
+
+    __slots__ = ('track_id', 'class_id', 'box', 'first_t', 'last_t', 'hits', 'side',
+                 'pending_side', 'pending_hits', 'zone_enter_t', 'zone_time', 'counted')
+
+    def __init__(self, track_id, class_id, box, t):
+        self.track_id = track_id
+        self.class_id = class_id
+        self.box = box
+        self.first_t = t
+        self.last_t = t
+        self.hits = 1
+        self.side = 0
+        self.pending_side = 0
+        self.pending_hits = 0
+        self.zone_enter_t = None
+        self.zone_time = 0.0
+        self.counted = 0  # bit per direction already counted
+
+
+class TrafficAnalytics:
+    """
+    Args:
+        names (dict): Class id -> class name
+        classes (tuple): Class names to analyse
+        line (tuple): Counting line (x1, y1, x2, y2), fractions or pixels
+        stop_zone (tuple): Optional stop rectangle (x1, y1, x2, y2); dwell is
+                           measured inside it, otherwise over the whole view
+        bucket_s (float): Occupancy/crossing interval length in seconds
+        summary_every_s (float): Emit a summary every this many seconds of video
+        iou_threshold (float): Minimum IoU to continue a track
+        max_age_s (float): Drop a track after this long without a match
+        min_hits (int): Matches before a track counts (filters flicker)
+        dead_band_px (float): Centers closer than this to the line keep their previous side
+        confirm_frames (int): Consecutive frames on the new side before a track changes side
+        log_path (str): Optional JSONL file receiving every summary
+
+    A track is counted at most once per direction, so a vehicle stopped on
+    the line, with its box jittering across it, is not counted repeatedly.
+    """
+
+    def __init__(self, names, classes=('bus',), line=DEFAULT_LINE, stop_zone=None, bucket_s=60.0,
+                 summary_every_s=60.0, iou_threshold=0.3, max_age_s=1.0, min_hits=3, dead_band_px=8.0,
+                 confirm_frames=3, log_path=None):
+        self.names = names
+        self.class_ids = {i for i, n in names.items() if n in classes}
+        self.line = line
+        self.stop_zone = stop_zone
+        self.bucket_s = bucket_s
+        self.summary_every_s = summary_every_s
+        self.iou_threshold = iou_threshold
+        self.max_age_s = max_age_s
+        self.min_hits = min_hits
+        self.dead_band_px = dead_band_px
+        self.confirm_frames = confirm_frames
+        self.log_path = log_path
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+            open(log_path, 'w').close()
+
+        self.tracks = []
+        self._next_id = 0
+        self._line_px = None
+        self._zone_px = None
+
+        self.t_start = None
+        self._bucket = None
+        self._bucket_frames = 0
+        self._bucket_in_view = 0
+        self._bucket_crossings = [0, 0]
+        self._last_summary_t = None
+
+        self.crossings = [0, 0]
+        self.buckets = []
+        self.dwell_hist = np.zeros(len(DWELL_BINS), dtype=np.int64)
+        self.dwell_count = 0
+        self.dwell_total = 0.0
+        self.dwell_max = 0.0
+        self.frames = 0
+
+    # ----- geometry -------------------------------------------------------
+
+    def _to_pixels(self, coords, image_shape):
+        if coords is None:
+            return None
+        coords = np.asarray(coords, dtype=np.float32)
+        if coords.max() <= 1.0:
+            if image_shape is None:
+                raise ValueError("Fractional line/zone coordinates need the frame size")
+            h, w = image_shape[:2]
+            coords = coords * np.array([w, h, w, h], dtype=np.float32)
+        return coords
+
+    def _side(self, cx, cy):
+        """+1 / -1 for the two sides of the line, 0 inside the dead band"""
+        x1, y1, x2, y2 = self._line_px
+        cross = (x2 - x1) * (cy - y1) - (y2 - y1) * (cx - x1)
+        distance = cross / max(float(np.hypot(x2 - x1, y2 - y1)), 1e-9)
+        if abs(distance) <= self.dead_band_px:
+            return 0
+        return 1 if distance > 0 else -1
+
+    def _in_zone(self, cx, cy):
+        x1, y1, x2, y2 = self._zone_px
+        return x1 <= cx <= x2 and y1 <= cy <= y2
+
+    # ----- streaming update ----------------------------------------------
+
+    def update(self, t, detection):
+        """
+        Consume one frame's detections at timestamp `t` (seconds)
+
+        Returns:
+            dict: A summary when one is due, else None
+        """
+        if self._line_px is None:
+            self._line_px = self._to_pixels(self.line, detection.image_shape)
+            self._zone_px = self._to_pixels(self.stop_zone, detection.image_shape)
+        if self.t_start is None:
+            self.t_start = t
+            self._last_summary_t = t
+        self._roll_bucket(t)
+
+        keep = np.isin(detection.class_ids, list(self.class_ids))
+        boxes = detection.boxes[keep]
+        class_ids = detection.class_ids[keep]
+
+        matched = self._associate(boxes, t)
+        for j in np.flatnonzero(~matched):
+            self._next_id += 1
+            track = _Track(self._next_id, int(class_ids[j]), boxes[j].copy(), t)
+            self._observe(track, t)
+            self.tracks.append(track)
+
+        alive = []
+        for track in self.tracks:
+            if t - track.last_t > self.max_age_s:
+                self._finish_track(track)
+            else:
+                alive.append(track)
+        self.tracks = alive
+
+        self.frames += 1
+        self._bucket_frames += 1
+        self._bucket_in_view += sum(1 for tr in self.tracks if tr.last_t == t and tr.hits >= self.min_hits)
+
+        if t - self._last_summary_t >= self.summary_every_s:
+            self._last_summary_t = t
+            return self._emit(t)
+        return None
+
+    def _associate(self, boxes, t):
+        """Greedy IoU matching of current boxes to active tracks; returns matched mask"""
+        matched = np.zeros(len(boxes), dtype=bool)
+        if not self.tracks or not len(boxes):
+            return matched
+        iou = box_iou(np.stack([tr.box for tr in self.tracks]), boxes)
+        for _ in range(min(iou.shape)):
+            i, j = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[i, j] < self.iou_threshold:
+                break
+            track = self.tracks[i]
+            track.box = boxes[j].copy()
+            track.last_t = t
+            track.hits += 1
+            self._observe(track, t)
+            matched[j] = True
+            iou[i, :] = -1
+            iou[:, j] = -1
+        return matched
+
+    def _observe(self, track, t):
+        """Update line side and stop-zone timing from the track's current center"""
+        x1, y1, x2, y2 = track.box
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+
+        side = self._side(cx, cy)
+        if side != 0:
+            if track.side == 0:
+                track.side = side
+            elif side == track.side:
+                track.pending_hits = 0
+            else:
+                # The center must stay on the new side for confirm_frames frames
+                if side != track.pending_side:
+                    track.pending_side, track.pending_hits = side, 0
+                track.pending_hits += 1
+                if track.pending_hits >= self.confirm_frames:
+                    direction = 0 if side > 0 else 1
+                    if track.hits >= self.min_hits and not track.counted & (1 << direction):
+                        self.crossings[direction] += 1
+                        self._bucket_crossings[direction] += 1
+                        track.counted |= 1 << direction
+                    track.side = side
+                    track.pending_hits = 0
+
+        if self._zone_px is not None:
+            inside = self._in_zone(cx, cy)
+            if inside and track.zone_enter_t is None:
+                track.zone_enter_t = t
+            elif not inside and track.zone_enter_t is not None:
+                track.zone_time += t - track.zone_enter_t
+                track.zone_enter_t = None
+
+    def _finish_track(self, track):
+        if track.hits < self.min_hits:
+            return
+        if self._zone_px is not None:
+            dwell = track.zone_time
+            if track.zone_enter_t is not None:
+                dwell += track.last_t - track.zone_enter_t
+            if dwell <= 0:
+                return
+        else:
+            dwell = track.last_t - track.first_t
+        self.dwell_hist[np.searchsorted(DWELL_BINS, dwell, side='right') - 1] += 1
+        self.dwell_count += 1
+        self.dwell_total += dwell
+        self.dwell_max = max(self.dwell_max, dwell)
+
+    def _roll_bucket(self, t):
+        bucket = int((t - self.t_start) // self.bucket_s)
+        if self._bucket is None:
+            self._bucket = bucket
+        elif bucket != self._bucket:
+            self._close_bucket()
+            self._bucket = bucket
+
+    def _close_bucket(self):
+        if not self._bucket_frames:
+            return
+        self.buckets.append({
+            't_start': self.t_start + self._bucket * self.bucket_s,
+            'crossings': list(self._bucket_crossings),
+            'mean_in_view': self._bucket_in_view / self._bucket_frames,
+        })
+        self._bucket_frames = 0
+        self._bucket_in_view = 0
+        self._bucket_crossings = [0, 0]
+
+    # ----- reporting ------------------------------------------------------
+
+    def summary(self, t):
+        return {
+            't': t,
+            'frames': self.frames,
+            'active_tracks': sum(1 for tr in self.tracks if tr.hits >= self.min_hits),
+            'crossings': {'forward': self.crossings[0], 'backward': self.crossings[1]},
+            'current_bucket': {
+                'crossings': list(self._bucket_crossings),
+                'mean_in_view': self._bucket_in_view / self._bucket_frames if self._bucket_frames else 0.0,
+            },
+            'dwell': {
+                'count': self.dwell_count,
+                'mean_s': self.dwell_total / self.dwell_count if self.dwell_count else 0.0,
+                'max_s': self.dwell_max,
+                'histogram': {f"{lo}+": int(n) for lo, n in zip(DWELL_BINS, self.dwell_hist)},
+            },
+        }
+
+    def _emit(self, t):
+        summary = self.summary(t)
+        print(f"📈 [{_format_time(t)}] crossings →{summary['crossings']['forward']} "
+              f"←{summary['crossings']['backward']} | in view {summary['current_bucket']['mean_in_view']:.2f} avg | "
+              f"dwell {summary['dwell']['count']} × {summary['dwell']['mean_s']:.1f}s mean | "
+              f"{summary['active_tracks']} active")
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(summary) + "\n")
+        return summary
+
+    def finish(self, t=None):
+        """Close every open track and bucket and emit the final summary"""
+        t = t if t is not None else max((tr.last_t for tr in self.tracks), default=self.t_start or 0.0)
+        for track in self.tracks:
+            self._finish_track(track)
+        self.tracks = []
+        self._close_bucket()
+        summary = self._emit(t)
+
+        print("\n🚦 Traffic summary")
+        print("=" * 40)
+        for b in self.buckets:
+            print(f"  {_format_time(b['t_start'])}  →{b['crossings'][0]:>3} ←{b['crossings'][1]:>3}  "
+                  f"in view {b['mean_in_view']:.2f}")
+        print("  Dwell histogram:")
+        for lo, n in zip(DWELL_BINS, self.dwell_hist):
+            print(f"    {lo:>4}s+ {n:>5} {'█' * min(int(n), 50)}")
+        return summary
+
+
+def _format_time(t):
+    if t > 1e9:
+        return datetime.datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S')
+    return f"{int(t // 60):02d}:{t % 60:05.2f}"
+
+
+def _parse_coords(value):
+    return tuple(float(v) for v in value.split(','))
+
+
+def replay_store(store_path, frame_size, **kwargs):
+    """
+    Run the analytics over an existing detection store (see detection_store.py)
+
+    Frames without any stored detection are replayed as empty frames, so
+    tracks age out and occupancy is averaged over every frame.
+    """
+    from detection_store import DetectionStore
+
+    store = DetectionStore(store_path)
+    width, height = frame_size
+    analytics = TrafficAnalytics(store.names, **kwargs)
+    frame_period = 1.0 / store.fps if store.fps else 1.0
+    empty = DetectionResult.empty(store.names, (height, width))
+
+    last_frame, last_t = None, None
+    for seg in store.index['segments']:
+        rows = np.load(os.path.join(store_path, seg['file']), mmap_mode='r')
+        bounds = np.flatnonzero(np.diff(rows['frame'].astype(np.int64))) + 1
+        for part in np.split(np.arange(len(rows)), bounds):
+            if not len(part):
+                continue
+            frame = rows[part]
+            index, t = int(frame['frame'][0]), float(frame['timestamp'][0])
+            if last_frame is not None:
+                for k in range(1, index - last_frame):
+                    analytics.update(last_t + k * frame_period, empty)
+            analytics.update(t, DetectionResult(frame['box'].astype(np.float32), frame['score'].astype(np.float32),
+                                                frame['class_id'].astype(np.int64), store.names, (height, width)))
+            last_frame, last_t = index, t
+    return analytics.finish()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python traffic_analytics.py <store_dir> <width>x<height> "
+              "[--line x1,y1,x2,y2] [--zone x1,y1,x2,y2] [--per 60]")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    options = {}
+    if '--line' in args:
+        options['line'] = _parse_coords(args[args.index('--line') + 1])
+    if '--zone' in args:
+        options['stop_zone'] = _parse_coords(args[args.index('--zone') + 1])
+    if '--per' in args:
+        options['bucket_s'] = options['summary_every_s'] = float(args[args.index('--per') + 1])
+    width, height = (int(v) for v in args[1].lower().split('x'))
+    replay_store(args[0], (width, height), **options)
@@ -1,8 +1,104 @@
 import yt_dlp
+import subprocess
+import tempfile
+import time
 import os
 from pathlib import Path
 
-def download_youtube_video(url, output_path="downloads", quality="best", format="mp4"):
+def _format_size(f, duration=None):
+    """Best available byte-size estimate for a yt-dlp format dict"""
+    size = f.get('filesize') or f.get('filesize_approx')
+    if not size and f.get('tbr') and duration:
+        size = f['tbr'] * 1000 / 8 * duration  # tbr is in kbit/s
+    return size or 0
+
+def select_detection_format(formats, imgsz=640, tiles=1, ext=None, video_only=True, duration=None):
+    """
+    Pick the smallest video stream that still feeds the detector at full resolution
+
+    YOLO letterboxes every frame so its long side becomes `imgsz`; anything
+    above that is decoded only to be thrown away. With tiled inference each
+    tile is `imgsz`, so the long side should reach `imgsz * tiles`.
+
+    Args:
+        formats (list): yt-dlp format dicts (info['formats'])
+        imgsz (int): Model input size
+        tiles (int): Tiles per image side (1 = no tiling)
+        ext (str): Optional container filter ('mp4', 'webm', ...)
+        video_only (bool): Prefer streams without audio
+        duration (float): Video duration, used to estimate sizes from bitrate
+
+    Returns:
+        dict: The chosen format, or None if no video format is available
+    """
+    needed = imgsz * tiles
+    candidates = [
+        f for f in formats
+        if f.get('vcodec') not in (None, 'none') and f.get('width') and f.get('height')
+        and (ext is None or f.get('ext') == ext)
+    ]
+    if video_only and any(f.get('acodec') == 'none' for f in candidates):
+        candidates = [f for f in candidates if f.get('acodec') == 'none']
+    if not candidates:
+        return None
+
+    def cost(f):
+        return (f['width'] * f['height'], _format_size(f, duration) or float('inf'))
+
+    big_enough = [f for f in candidates if max(f['width'], f['height']) >= needed]
+    if big_enough:
+        return min(big_enough, key=cost)
+    # Nothing reaches the model size: take the largest stream there is
+    return max(candidates, key=cost)
+
+def _best_single_file_format(formats, ext):
+    """The stream `best[ext=...]` would pick: highest resolution with audio and video"""
+    combined = [
+        f for f in formats
+        if f.get('vcodec') not in (None, 'none') and f.get('acodec') not in (None, 'none')
+        and f.get('ext') == ext and f.get('height')
+    ]
+    if not combined:
+        return None
+    return max(combined, key=lambda f: (f['height'], f.get('tbr') or 0))
+
+def measure_decode_fps(video_path, max_frames=300):
+    """Decode up to `max_frames` frames with OpenCV and return frames per second"""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    frames = 0
+    start = time.perf_counter()
+    while frames < max_frames:
+        ret, _ = cap.read()
+        if not ret:
+            break
+        frames += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return frames / elapsed if frames and elapsed > 0 else None
+
+def sample_stream(fmt, dest_path, seconds=10):
+    """
+    Copy the first `seconds` of a yt-dlp format to `dest_path` without re-encoding
+
+    Returns:
+        bool: True if ffmpeg wrote the sample
+    """
+    cmd = ['ffmpeg', '-v', 'error', '-y']
+    if fmt.get('http_headers'):
+        cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in fmt['http_headers'].items())]
+    cmd += ['-t', str(seconds), '-i', fmt['url'], '-map', '0:v:0', '-c', 'copy', dest_path]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True, timeout=120)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return os.path.exists(dest_path) and os.path.getsize(dest_path) > 0
+
+def download_youtube_video(url, output_path="downloads", quality="best", format="mp4",
+                           imgsz=640, tiles=1, skip_extras=False):
     """
     Download YouTube video with specified quality and format
     
@@ -10,23 +106,35 @@ def download_youtube_video(url, output_path="downloads", quality="best", format=
         url (str): YouTube video URL
         output_path (str): Directory to save the video
         quality (str): Video quality ('best', 'worst', '720p', '1080p', etc.)
+                       or 'detect' for the smallest stream that still covers
+                       the model input size (see select_detection_format)
         format (str): Video format ('mp4', 'webm', 'mkv', etc.)
+        imgsz (int): Model input size used by quality='detect'
+        tiles (int): Tiles per image side used by quality='detect'
+        skip_extras (bool): Skip subtitles and metadata (always on for 'detect')
     """
     
     # Create output directory if it doesn't exist
     Path(output_path).mkdir(parents=True, exist_ok=True)
     
+    detect_mode = quality == "detect"
+    skip_extras = skip_extras or detect_mode
+    downloaded_files = []
+    
     # Configure yt-dlp options
     ydl_opts = {
         'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
-        'format': f'best[ext={format}]' if quality == "best" else f'best[height<={quality[:-1]}][ext={format}]',
-        'writeinfojson': True,  # Save video metadata
-        'writesubtitles': True,  # Download subtitles if available
-        'writeautomaticsub': True,  # Download auto-generated subtitles
+        'format': f'best[ext={format}]' if quality in ("best", "detect") else f'best[height<={quality[:-1]}][ext={format}]',
+        'writeinfojson': not skip_extras,  # Save video metadata
+        'writesubtitles': not skip_extras,  # Download subtitles if available
+        'writeautomaticsub': not skip_extras,  # Download auto-generated subtitles
         'subtitleslangs': ['en', 'es'],  # Preferred subtitle languages
         'ignoreerrors': True,  # Continue on download errors
         'no_warnings': False,
-        'progress_hooks': [progress_hook],  # Show download progress
+        'progress_hooks': [
+            progress_hook,  # Show download progress
+            lambda d: downloaded_files.append(d['filename']) if d['status'] == 'finished' else None,
+        ],
     }
     
     try:
@@ -39,14 +147,63 @@ def download_youtube_video(url, output_path="downloads", quality="best", format=
             print(f"👁️  Views: {info.get('view_count', 0):,}")
             print(f"📅 Upload Date: {info.get('upload_date', 'Unknown')}")
             
+            chosen = best = None
+            if detect_mode:
+                formats = info.get('formats', [])
+                duration = info.get('duration')
+                chosen = select_detection_format(formats, imgsz, tiles, ext=format, duration=duration) \
+                    or select_detection_format(formats, imgsz, tiles, duration=duration)
+                best = _best_single_file_format(formats, format)
+                if chosen is None:
+                    print("⚠️  No video-only stream found, falling back to best")
+                else:
+                    ydl_opts['format'] = chosen['format_id']
+                    print(f"🎯 Detection format: {chosen['format_id']} "
+                          f"({chosen['width']}x{chosen['height']}, {chosen.get('ext')}, no audio/subtitles) "
+                          f"for imgsz={imgsz}, tiles={tiles}")
+            
             print(f"\n⬇️  Starting download...")
-            ydl.download([url])
+            with yt_dlp.YoutubeDL(ydl_opts) as downloader:
+                downloader.download([url])
             
             print(f"✅ Download completed! Saved to: {output_path}")
             
+            if chosen is not None and best is not None:
+                _report_savings(chosen, best, info.get('duration'), downloaded_files)
+            
     except Exception as e:
         print(f"❌ Error downloading video: {str(e)}")
 
+def _report_savings(chosen, best, duration, downloaded_files):
+    """
+    Print bytes saved and decode throughput against the 'best' stream
+
+    The downloaded stream is decoded from disk; for 'best' a short sample is
+    copied with ffmpeg and decoded the same way, so both rates are measured.
+    """
+    chosen_size = _format_size(chosen, duration)
+    best_size = _format_size(best, duration)
+    print(f"\n📊 Detection format vs best ({best['width']}x{best['height']}):")
+    if chosen_size and best_size:
+        saved = best_size - chosen_size
+        print(f"💾 Bytes: {chosen_size / 1024 / 1024:.1f} MB instead of {best_size / 1024 / 1024:.1f} MB "
+              f"({saved / 1024 / 1024:.1f} MB, {saved / best_size:.0%} saved)")
+    
+    fps = None
+    if downloaded_files and os.path.exists(downloaded_files[-1]):
+        fps = measure_decode_fps(downloaded_files[-1])
+    if fps:
+        print(f"🎞️  Decode ({chosen['width']}x{chosen['height']}): {fps:.0f} frames/s")
+    
+    with tempfile.TemporaryDirectory(prefix="best_sample_") as workdir:
+        sample = os.path.join(workdir, f"sample.{best.get('ext') or 'mp4'}")
+        best_fps = measure_decode_fps(sample) if best.get('url') and sample_stream(best, sample) else None
+    if best_fps:
+        speedup = f" ({fps / best_fps:.1f}x with the detection format)" if fps else ""
+        print(f"🎞️  Decode (best, {best['width']}x{best['height']}): {best_fps:.0f} frames/s{speedup}")
+    else:
+        print("🎞️  Decode (best): not measured (could not sample the stream with ffmpeg)")
+
 def progress_hook(d):
     """Show download progress"""
     if d['status'] == 'downloading':
@@ -115,6 +272,7 @@ def main():
             print("- 720p: 720p or lower")
             print("- 480p: 480p or lower")
             print("- worst: Worst quality available")
+            print("- detect: Smallest stream the detector can use (no audio/subtitles)")
             
             quality = input("Select quality (default: best): ").strip() or "best"
             